@@ -3,7 +3,7 @@ from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_mail import Mail
-from .config import Config
+from .config import Config, INSECURE_SECRET_KEYS
 
 db = SQLAlchemy()
 migrate = Migrate()
@@ -13,6 +13,9 @@ mail = Mail()
 def create_app(config_class: type[Config] = Config) -> Flask:
     app = Flask(__name__)
     app.config.from_object(config_class)
+    # Les tokens de session sont signés avec SECRET_KEY : une clé connue permettrait d'en forger
+    if not app.config.get("TESTING") and (app.config.get("SECRET_KEY") or "") in INSECURE_SECRET_KEYS:
+        raise RuntimeError("SECRET_KEY manquante ou par défaut : définissez une valeur secrète (voir .env.example)")
     # Autorise les routes avec ou sans slash final pour éviter les 308 (CORS préflight)
     app.url_map.strict_slashes = False
 
@@ -23,7 +26,7 @@ def create_app(config_class: type[Config] = Config) -> Flask:
             "origins": "*",
             "methods": ["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS", "HEAD"],
             "allow_headers": ["Content-Type", "Authorization", "X-Requested-With", "Accept"],
-            "expose_headers": ["Content-Type", "X-Total-Count"],
+            "expose_headers": ["Content-Type", "X-Total-Count", "X-Next-Cursor"],
             "supports_credentials": True,
             "max_age": 600
         }
@@ -32,7 +35,39 @@ def create_app(config_class: type[Config] = Config) -> Flask:
     db.init_app(app)
     migrate.init_app(app, db)
     mail.init_app(app)
-    
+
+    # Pool de workers pour l'envoi des emails (connexions SMTP réutilisées)
+    from .utils.mail_pool import init_mail_pool
+    init_mail_pool(app)
+
+    # Boîte d'envoi transactionnelle : emails écrits avec l'événement, envoyés après commit
+    from .utils.email_outbox import init_email_outbox
+    init_email_outbox(app)
+
+    # Flux de changements (curseur global pour /api/changes)
+    from .utils.change_feed import init_change_feed
+    init_change_feed()
+
+    # Révocation des sessions des comptes désactivés
+    from .utils.session_tokens import init_session_tokens
+    init_session_tokens()
+
+    # Cube de coûts (véhicule x mois x catégorie) tenu à jour à chaque commit
+    from .utils.cost_cube import init_cost_cube
+    init_cost_cube()
+
+    # Compteurs de la barre latérale (badges) tenus à jour à chaque commit
+    from .utils.badge_counters import init_badge_counters
+    init_badge_counters()
+
+    # Diffusion des écritures vers les clients SSE (/api/stream)
+    from .utils.event_hub import init_event_hub
+    init_event_hub(app)
+
+    # Journal d'audit écrit par lots en arrière-plan
+    from .utils.audit_log import init_audit_log
+    init_audit_log(app)
+
     # Initialize scheduler for background tasks
     from .utils.scheduler import init_scheduler
     init_scheduler(app)
@@ -73,6 +108,12 @@ def create_app(config_class: type[Config] = Config) -> Flask:
     from .routes import logs
     app.register_blueprint(logs.bp, url_prefix="/api/logs")
 
+    from .routes import changes
+    app.register_blueprint(changes.bp, url_prefix="/api/changes")
+
+    from .routes import stream
+    app.register_blueprint(stream.bp, url_prefix="/api/stream")
+
     @app.get("/")
     def index():
         return {
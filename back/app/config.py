@@ -1,8 +1,13 @@
 import os
+from datetime import datetime
+
+# Ancienne valeur par défaut, publique : refusée au démarrage comme une clé absente
+INSECURE_SECRET_KEYS = ("", "dev-secret-key-change-me")
 
 
 class Config:
-    SECRET_KEY = os.environ.get("SECRET_KEY", "dev-secret-key-change-me")
+    # Signe les tokens de session : obligatoire hors tests (create_app refuse de démarrer sans)
+    SECRET_KEY = os.environ.get("SECRET_KEY")
 
     # Base de données PostgreSQL existante
     DB_USER = os.environ.get("DB_USER", "ceres")
@@ -17,11 +22,59 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
     # Configuration Email (SMTP Gmail)
-    MAIL_SERVER = "smtp.gmail.com"
-    MAIL_PORT = 587
-    MAIL_USE_TLS = True
-    MAIL_USERNAME = "rackoto786@gmail.com"
-    MAIL_PASSWORD = "mhoo etou mfdn yzan"
-    MAIL_DEFAULT_SENDER = "rackoto786@gmail.com"
+    # Serveur local de test : MAIL_SERVER=localhost MAIL_PORT=1025 MAIL_USE_TLS=0
+    # (ex. python -m aiosmtpd -n -l localhost:1025)
+    MAIL_SERVER = os.environ.get("MAIL_SERVER", "smtp.gmail.com")
+    MAIL_PORT = int(os.environ.get("MAIL_PORT", "587"))
+    MAIL_USE_TLS = os.environ.get("MAIL_USE_TLS", "1") not in ("0", "false", "False")
+    MAIL_USERNAME = os.environ.get("MAIL_USERNAME", "rackoto786@gmail.com")
+    MAIL_PASSWORD = os.environ.get("MAIL_PASSWORD", "mhoo etou mfdn yzan")
+    MAIL_DEFAULT_SENDER = os.environ.get("MAIL_DEFAULT_SENDER", "rackoto786@gmail.com")
+
+    # Pool d'envoi : workers, file bornée, reprises (attente MAIL_RETRY_BACKOFF * 2^n s)
+    MAIL_WORKERS = int(os.environ.get("MAIL_WORKERS", "2"))
+    MAIL_QUEUE_SIZE = int(os.environ.get("MAIL_QUEUE_SIZE", "1000"))
+    MAIL_IDLE_TIMEOUT = int(os.environ.get("MAIL_IDLE_TIMEOUT", "30"))
+    MAIL_RETRY_ATTEMPTS = int(os.environ.get("MAIL_RETRY_ATTEMPTS", "3"))
+    MAIL_RETRY_BACKOFF = float(os.environ.get("MAIL_RETRY_BACKOFF", "2"))
+
+    # Boîte d'envoi (email_outbox) : lots réservés par le dispatcher, tentatives max,
+    # reprise des lignes réservées depuis plus de EMAIL_OUTBOX_CLAIM_TIMEOUT s, rétention des lignes traitées
+    EMAIL_OUTBOX_BATCH = int(os.environ.get("EMAIL_OUTBOX_BATCH", "50"))
+    EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.environ.get("EMAIL_OUTBOX_MAX_ATTEMPTS", "5"))
+    EMAIL_OUTBOX_CLAIM_TIMEOUT = int(os.environ.get("EMAIL_OUTBOX_CLAIM_TIMEOUT", "600"))
+    EMAIL_OUTBOX_RETENTION_DAYS = int(os.environ.get("EMAIL_OUTBOX_RETENTION_DAYS", "30"))
+
+    # Tâches planifiées (échéances, relances, purges) : désactivées pour les tests automatisés
+    SCHEDULER_ENABLED = os.environ.get("SCHEDULER_ENABLED", "1") not in ("0", "false", "False")
+
+    # Rapports calculés en arrière-plan (/api/reports/jobs)
+    REPORT_WORKERS = int(os.environ.get("REPORT_WORKERS", "2"))
+
+    # Rétention des notifications : au-delà, déplacées vers les tables d'archive (par lots)
+    NOTIFICATION_RETENTION_DAYS = int(os.environ.get("NOTIFICATION_RETENTION_DAYS", "90"))
+    # Suppression définitive des archives (0 = conserver indéfiniment)
+    NOTIFICATION_ARCHIVE_DAYS = int(os.environ.get("NOTIFICATION_ARCHIVE_DAYS", "0"))
+    NOTIFICATION_ARCHIVE_BATCH = int(os.environ.get("NOTIFICATION_ARCHIVE_BATCH", "1000"))
+
+    # Journal d'audit : lots insérés toutes les AUDIT_LOG_FLUSH_MS ms ou dès AUDIT_LOG_BATCH entrées
+    AUDIT_LOG_FLUSH_MS = int(os.environ.get("AUDIT_LOG_FLUSH_MS", "500"))
+    AUDIT_LOG_BATCH = int(os.environ.get("AUDIT_LOG_BATCH", "200"))
+    AUDIT_LOG_BUFFER = int(os.environ.get("AUDIT_LOG_BUFFER", "10000"))
+
+    # Cache d'authentification token -> (id, rôle, statut) par worker
+    AUTH_CACHE_TTL = int(os.environ.get("AUTH_CACHE_TTL", "30"))
+    AUTH_CACHE_SIZE = int(os.environ.get("AUTH_CACHE_SIZE", "5000"))
 
+    # Tokens de session signés (SECRET_KEY) : durée de vie, rechargement des révocations par worker
+    AUTH_TOKEN_MAX_AGE = int(os.environ.get("AUTH_TOKEN_MAX_AGE", str(12 * 3600)))
+    TOKEN_REVOCATION_REFRESH = int(os.environ.get("TOKEN_REVOCATION_REFRESH", "15"))
+    # Anciens tokens aléatoires (users.token, sans expiration) : acceptés jusqu'à cette date UTC
+    # (ISO 8601, ex. 2026-11-30T00:00:00) puis refusés ; non renseignée = refusés dès maintenant
+    _LEGACY_UNTIL = os.environ.get("AUTH_LEGACY_TOKENS_UNTIL")
+    AUTH_LEGACY_TOKENS_UNTIL = datetime.fromisoformat(_LEGACY_UNTIL) if _LEGACY_UNTIL else None
 
+    # Statut « en ligne » : activité depuis moins de USER_ONLINE_WINDOW secondes,
+    # enregistrée au plus une fois par USER_ACTIVITY_INTERVAL secondes et par utilisateur
+    USER_ONLINE_WINDOW = int(os.environ.get("USER_ONLINE_WINDOW", "600"))
+    USER_ACTIVITY_INTERVAL = int(os.environ.get("USER_ACTIVITY_INTERVAL", "60"))
@@ -1,5 +1,7 @@
 from datetime import datetime
 
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import validates
 from . import db
 
 
@@ -14,12 +16,32 @@ class User(db.Model):
     avatar = db.Column(db.String(255))
     created_at = db.Column(db.Date, nullable=False)
     last_login = db.Column(db.DateTime)
-    token = db.Column(db.String(255))
+    last_logout = db.Column(db.DateTime)
+    # Dernière requête authentifiée (UTC) et expiration du token utilisé (NULL : ancien token) : statut « en ligne »
+    last_seen_at = db.Column(db.DateTime)
+    session_expires_at = db.Column(db.DateTime)
+    token = db.Column(db.String(255)) # Ancien token aléatoire (sessions antérieures aux tokens signés)
     status = db.Column(db.String(50), default='pending')
     profile_email = db.Column(db.String(255))
+    email_digest = db.Column(db.String(20), nullable=False, default='immediate', server_default='immediate') # immediate, hourly, daily
 
-    action_logs = db.relationship("ActionLog", back_populates="user", lazy="selectin")
-    fuel_entries = db.relationship("FuelEntry", back_populates="demandeur", lazy="selectin")
+    action_logs = db.relationship("ActionLog", back_populates="user", lazy="select")
+    fuel_entries = db.relationship("FuelEntry", back_populates="demandeur", lazy="select")
+
+
+class TokenRevocation(db.Model):
+    """
+    Révocation de tokens signés : un token précis (jti) ou, si jti est vide, tous les
+    tokens de user_id émis avant not_before. Conservée jusqu'à expiration des tokens visés.
+    """
+    __tablename__ = "token_revocations"
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    jti = db.Column(db.String(64), unique=True)
+    user_id = db.Column(db.String, nullable=False)
+    not_before = db.Column(db.DateTime)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
 
 
 class Vehicle(db.Model):
@@ -209,6 +231,10 @@ class FuelEntry(db.Model):
     vehicle = db.relationship("Vehicle", back_populates="fuel_entries")
     demandeur = db.relationship("User", back_populates="fuel_entries")
 
+    __table_args__ = (
+        db.Index('ix_fuel_entries_vehicule_date', 'vehicule_id', 'date'),
+    )
+
 
 class Maintenance(db.Model):
     __tablename__ = "maintenances"
@@ -242,6 +268,13 @@ class Maintenance(db.Model):
     vehicle = db.relationship("Vehicle", back_populates="maintenances")
     demandeur = db.relationship("User")
 
+    __table_args__ = (
+        db.Index('ix_maintenances_vehicule_date_demande', 'vehicule_id', 'date_demande'),
+        # Index partiel du badge "maintenance" : seules les demandes en attente y figurent
+        db.Index('ix_maintenances_en_attente', 'id',
+                 postgresql_where=db.text("statut = 'en_attente'"), sqlite_where=db.text("statut = 'en_attente'")),
+    )
+
 
 
 class Mission(db.Model):
@@ -285,6 +318,12 @@ class Mission(db.Model):
     vehicle = db.relationship("Vehicle", back_populates="missions")
     driver = db.relationship("Driver", back_populates="missions")
 
+    __table_args__ = (
+        # Index partiel du badge "missions" : seules les nouvelles missions y figurent
+        db.Index('ix_missions_nouveau', 'id',
+                 postgresql_where=db.text("state = 'nouveau'"), sqlite_where=db.text("state = 'nouveau'")),
+    )
+
 
 class Planning(db.Model):
     __tablename__ = "planning"
@@ -308,6 +347,15 @@ class Planning(db.Model):
     created_by = db.relationship("User")
     mission = db.relationship("Mission", lazy="selectin")
 
+    # Fenêtres de dates du planning (vue jour/semaine) et recherche par véhicule
+    __table_args__ = (
+        db.Index('ix_planning_date_debut_date_fin', 'date_debut', 'date_fin'),
+        db.Index('ix_planning_vehicule_date_debut', 'vehicule_id', 'date_debut'),
+        # Index partiel du badge "planning"
+        db.Index('ix_planning_en_attente', 'id',
+                 postgresql_where=db.text("status = 'en_attente'"), sqlite_where=db.text("status = 'en_attente'")),
+    )
+
 
 class ActionLog(db.Model):
     __tablename__ = "action_logs"
@@ -319,9 +367,25 @@ class ActionLog(db.Model):
     entite_id = db.Column(db.String, nullable=False)
     details = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    # Heure de l'action en minutes (0-1439), pour filtrer par plage horaire sans calcul
+    minute_of_day = db.Column(db.SmallInteger)
+    # Données structurées (ex. {"vehicleIds": [...]}), JSONB indexé (GIN) sur PostgreSQL.
+    # La colonne générée search_vector (tsvector, GIN) n'existe que sur PostgreSQL : voir la migration.
+    payload = db.Column(db.JSON().with_variant(JSONB(), "postgresql"))
 
     user = db.relationship("User", back_populates="action_logs")
 
+    __table_args__ = (
+        db.Index('ix_action_logs_timestamp_id', 'timestamp', 'id'),
+        db.Index('ix_action_logs_user_timestamp', 'user_id', 'timestamp'),
+        db.Index('ix_action_logs_entite', 'entite', 'entite_id', 'timestamp'),
+    )
+
+    @validates("timestamp")
+    def _set_minute_of_day(self, key, value):
+        self.minute_of_day = value.hour * 60 + value.minute if value else None
+        return value
+
 
 
 class Notification(db.Model):
@@ -338,6 +402,10 @@ class Notification(db.Model):
 
     target_user = db.relationship("User", foreign_keys=[target_user_id])
 
+    __table_args__ = (
+        db.Index('ix_notifications_timestamp', 'timestamp'),
+    )
+
 
 class NotificationRead(db.Model):
     __tablename__ = "notification_reads"
@@ -350,6 +418,57 @@ class NotificationRead(db.Model):
     notification = db.relationship("Notification")
 
 
+class NotificationInbox(db.Model):
+    __tablename__ = "notification_inbox"
+
+    # Une ligne par destinataire, créée avec la notification (fan-out à l'écriture)
+    user_id = db.Column(db.String, db.ForeignKey("users.id"), primary_key=True)
+    notification_id = db.Column(db.String, db.ForeignKey("notifications.id"), primary_key=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False) # = Notification.timestamp
+    is_read = db.Column(db.Boolean, default=False, nullable=False)
+    read_at = db.Column(db.DateTime)
+
+    notification = db.relationship("Notification")
+
+    __table_args__ = (
+        db.Index('ix_notification_inbox_user_created', 'user_id', 'created_at'),
+        db.Index('ix_notification_inbox_user_unread', 'user_id', 'is_read'),
+    )
+
+
+class NotificationArchive(db.Model):
+    __tablename__ = "notifications_archive"
+
+    # Notifications sorties de la table chaude par la tâche de rétention
+    id = db.Column(db.String, primary_key=True)
+    title = db.Column(db.String(255), nullable=False)
+    message = db.Column(db.Text, nullable=False)
+    type = db.Column(db.String(50))
+    target_role = db.Column(db.String(50))
+    target_user_id = db.Column(db.String)
+    link = db.Column(db.String(255))
+    timestamp = db.Column(db.DateTime, nullable=False)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_notifications_archive_timestamp', 'timestamp'),
+    )
+
+
+class NotificationInboxArchive(db.Model):
+    __tablename__ = "notification_inbox_archive"
+
+    user_id = db.Column(db.String, primary_key=True)
+    notification_id = db.Column(db.String, primary_key=True)
+    created_at = db.Column(db.DateTime, nullable=False)
+    is_read = db.Column(db.Boolean, default=False, nullable=False)
+    read_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_notification_inbox_archive_user_created', 'user_id', 'created_at'),
+    )
+
+
 class Compliance(db.Model):
     __tablename__ = "compliance"
 
@@ -371,6 +490,10 @@ class Compliance(db.Model):
 
     vehicle = db.relationship("Vehicle", back_populates="compliance_entries")
 
+    __table_args__ = (
+        db.Index('ix_compliance_date_expiration_statut', 'date_expiration', 'statut'),
+    )
+
 
 class FuelMonthlyBudget(db.Model):
     __tablename__ = "fuel_monthly_budgets"
@@ -391,3 +514,110 @@ class FuelMonthlyBudget(db.Model):
     __table_args__ = (
         db.UniqueConstraint('vehicle_id', 'year', 'month', name='unique_vehicle_year_month'),
     )
+
+
+class ChangeFeedEntry(db.Model):
+    __tablename__ = "change_feed"
+
+    # Ordered cursor consumed by /api/changes (one row per insert/update/delete)
+    seq = db.Column(db.BigInteger().with_variant(db.Integer, "sqlite"), primary_key=True, autoincrement=True)
+    entity = db.Column(db.String(50), nullable=False) # planning, missions, maintenance, ...
+    entity_id = db.Column(db.String, nullable=False)
+    op = db.Column(db.String(10), nullable=False) # upsert, delete
+    changed_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_change_feed_entity_seq', 'entity', 'seq'),
+        # Dernière version d'une entité (clé de dédoublonnage des emails de statut)
+        db.Index('ix_change_feed_entity_id_seq', 'entity', 'entity_id', 'seq'),
+    )
+
+
+class CostCube(db.Model):
+    __tablename__ = "cost_cube"
+
+    # Coûts agrégés par véhicule / année / mois / catégorie (fuel, maintenance, compliance)
+    # Pas de clé étrangère : les cellules d'un véhicule supprimé sont purgées au commit
+    vehicle_id = db.Column(db.String, primary_key=True)
+    year = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.Integer, primary_key=True)
+    category = db.Column(db.String(20), primary_key=True)
+    amount = db.Column(db.Float, nullable=False, default=0.0)
+    quantity = db.Column(db.Float, nullable=False, default=0.0) # Litres pour le carburant
+    entries = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_cost_cube_year_month', 'year', 'month'),
+    )
+
+
+class ReportJob(db.Model):
+    __tablename__ = "report_jobs"
+
+    id = db.Column(db.String, primary_key=True)
+    report = db.Column(db.String(50), nullable=False)
+    params = db.Column(db.Text, nullable=False, default="{}") # JSON
+    params_hash = db.Column(db.String(64), nullable=False)
+    data_version = db.Column(db.BigInteger, nullable=False, default=0) # Curseur du flux de changements
+    status = db.Column(db.String(20), nullable=False, default="pending") # pending, running, done, failed
+    result = db.Column(db.Text) # JSON
+    error = db.Column(db.Text)
+    requested_by_id = db.Column(db.String)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_report_jobs_lookup', 'report', 'params_hash', 'data_version'),
+    )
+
+
+class BadgeCounter(db.Model):
+    __tablename__ = "badge_counters"
+
+    # Une ligne par badge de la barre latérale, tenue à jour à chaque commit (count = count + écart)
+    badge = db.Column(db.String(20), primary_key=True) # missions, maintenance, compliance, planning
+    count = db.Column(db.Integer, nullable=False, default=0)
+    reconciled_at = db.Column(db.DateTime)
+
+
+class EmailOutbox(db.Model):
+    __tablename__ = "email_outbox"
+
+    # Emails écrits dans la transaction de l'événement métier, envoyés après commit
+    id = db.Column(db.BigInteger().with_variant(db.Integer, "sqlite"), primary_key=True, autoincrement=True)
+    kind = db.Column(db.String(50), nullable=False) # maintenance_created, abnormal_fuel, ...
+    dedupe_key = db.Column(db.String(255), nullable=False, unique=True) # Une ligne par événement
+    params = db.Column(db.Text, nullable=False, default="{}") # JSON, lu à la construction du message
+    status = db.Column(db.String(20), nullable=False, default="pending") # pending, sending, sent, digested, skipped, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    recipients = db.Column(db.Text) # Adresses effectivement visées, renseignées à l'envoi
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    claimed_at = db.Column(db.DateTime)
+    sent_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_email_outbox_status_id', 'status', 'id'),
+    )
+
+
+class DigestEvent(db.Model):
+    __tablename__ = "digest_events"
+
+    # Alerte en attente du récapitulatif (horaire ou quotidien) d'un destinataire
+    id = db.Column(db.BigInteger().with_variant(db.Integer, "sqlite"), primary_key=True, autoincrement=True)
+    recipient = db.Column(db.String(255), nullable=False)
+    frequency = db.Column(db.String(20), nullable=False) # hourly, daily
+    kind = db.Column(db.String(50), nullable=False) # Type de la ligne email_outbox d'origine
+    outbox_id = db.Column(db.BigInteger, nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    body = db.Column(db.Text, nullable=False) # HTML de l'email individuel
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    digested_at = db.Column(db.DateTime) # Inclus dans un récapitulatif
+
+    __table_args__ = (
+        db.Index('ix_digest_events_pending', 'frequency', 'digested_at', 'recipient'),
+        db.Index('ix_digest_events_outbox_id', 'outbox_id'),
+    )
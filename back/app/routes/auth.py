@@ -2,10 +2,12 @@ from werkzeug.security import generate_password_hash, check_password_hash
 import uuid
 from datetime import date, datetime
 from flask import Blueprint, jsonify, request
+from sqlalchemy import update
 
 from .. import db
 from ..models import User
-from ..utils.auth_utils import token_required
+from ..utils.auth_utils import token_required, invalidate_user, session_activity
+from ..utils.session_tokens import issue_token, revocations
 
 bp = Blueprint("auth", __name__)
 
@@ -76,12 +78,12 @@ def login():
     # Update last login
     user.last_login = datetime.now()
     
-    # Générer un token simple et le stocker
-    import secrets
-    token = secrets.token_hex(32)
-    user.token = token
+    # Token signé (id, rôle, expiration) : une session de plus, sans écraser les autres
+    token = issue_token(user)
 
     db.session.commit()
+    # La première requête de la nouvelle session met à jour le statut « en ligne »
+    session_activity.forget(user.id)
 
     # Conversion en format proche de celui utilisé côté frontend
     user_dict = {
@@ -92,6 +94,7 @@ def login():
         "status": user.status,
         "avatar": user.avatar,
         "profileEmail": user.profile_email,
+        "emailDigest": user.email_digest,
         "createdAt": user.created_at.isoformat(),
         "lastLogin": user.last_login.isoformat() if user.last_login else None,
     }
@@ -113,11 +116,18 @@ def login():
 def logout():
     from flask import g
     try:
-        g.user.token = None
-        from datetime import datetime
-        # Optionally store a last logout time if needed in future
-        # g.user.last_logout = datetime.now()
+        user = g.user.load()
+        if g.user.claims:
+            revocations.revoke_token(g.user.claims)
+        else:
+            user.token = None
+        user.last_logout = datetime.now()
+        # Hors ligne jusqu'à la prochaine requête d'une autre session encore ouverte.
+        # last_seen_at est écrit hors ORM (session_activity) : UPDATE explicite
+        db.session.execute(update(User).where(User.id == user.id).values(last_seen_at=None))
         db.session.commit()
+        invalidate_user(user.id)
+        session_activity.forget(user.id)
         from ..utils import log_action
         log_action(user_id=g.user.id, action="Déconnexion", entite="Auth", entite_id=g.user.id, details=f"Déconnexion de {g.user.name}")
         return jsonify({"success": True, "message": "Déconnexion réussie"}), 200
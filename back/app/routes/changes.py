@@ -0,0 +1,89 @@
+from flask import Blueprint, jsonify, request
+
+from ..models import ChangeFeedEntry, Planning, Mission, Maintenance, Vehicle, Driver, FuelEntry, Compliance, FuelMonthlyBudget
+from ..utils.auth_utils import token_required
+from ..utils.change_feed import FEED_ENTITIES, latest_seq
+from .planning import planning_to_dict
+from .missions import mission_to_dict
+from .maintenance import maintenance_to_dict
+from .vehicles import vehicle_to_dict
+from .drivers import driver_to_dict
+from .fuel import fuel_to_dict, budget_to_dict
+from .compliance import compliance_to_dict
+
+bp = Blueprint("changes", __name__)
+
+# Entité -> (modèle, sérialiseur de la route correspondante)
+SERIALIZERS = {
+    "planning": (Planning, planning_to_dict),
+    "missions": (Mission, mission_to_dict),
+    "maintenance": (Maintenance, maintenance_to_dict),
+    "vehicles": (Vehicle, vehicle_to_dict),
+    "drivers": (Driver, driver_to_dict),
+    "fuel": (FuelEntry, fuel_to_dict),
+    "compliance": (Compliance, compliance_to_dict),
+    "fuel_budgets": (FuelMonthlyBudget, budget_to_dict),
+}
+
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 2000
+
+
+@bp.get("")
+@token_required
+def get_changes():
+    """
+    Flux de changements ordonné : /api/changes?since=<cursor>&entities=planning,missions
+    Sans `since`, renvoie seulement le curseur courant (à utiliser après un chargement complet).
+    """
+    entities = [e.strip() for e in (request.args.get("entities") or "").split(",") if e.strip()]
+    unknown = [e for e in entities if e not in FEED_ENTITIES.values()]
+    if unknown:
+        return jsonify({"error": f"Entités inconnues: {', '.join(unknown)}"}), 400
+
+    since = request.args.get("since", type=int)
+    if since is None:
+        return jsonify({"cursor": latest_seq(entities), "hasMore": False, "changes": []}), 200
+
+    limit = min(request.args.get("limit", DEFAULT_LIMIT, type=int), MAX_LIMIT)
+
+    query = ChangeFeedEntry.query.filter(ChangeFeedEntry.seq > since)
+    if entities:
+        query = query.filter(ChangeFeedEntry.entity.in_(entities))
+    rows = query.order_by(ChangeFeedEntry.seq.asc()).limit(limit + 1).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    cursor = rows[-1].seq if rows else since
+
+    # Ne garder que le dernier changement de chaque ligne dans cette page
+    latest = {}
+    for row in rows:
+        latest[(row.entity, row.entity_id)] = row
+
+    # Charger les lignes encore présentes, une requête par entité
+    upserts = {}
+    for (entity, entity_id), row in latest.items():
+        if row.op != "delete":
+            upserts.setdefault(entity, []).append(entity_id)
+
+    loaded = {}
+    for entity, ids in upserts.items():
+        model, serializer = SERIALIZERS[entity]
+        for obj in model.query.filter(model.id.in_(ids)).all():
+            loaded[(entity, obj.id)] = serializer(obj)
+
+    changes = []
+    for (entity, entity_id), row in sorted(latest.items(), key=lambda item: item[1].seq):
+        data = loaded.get((entity, entity_id))
+        # Une ligne supprimée depuis ce changement est renvoyée comme tombstone
+        op = "upsert" if data is not None else "delete"
+        changes.append({
+            "seq": row.seq,
+            "entity": entity,
+            "id": entity_id,
+            "op": op,
+            "data": data,
+        })
+
+    return jsonify({"cursor": cursor, "hasMore": has_more, "changes": changes}), 200
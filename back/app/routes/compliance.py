@@ -1,17 +1,27 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, g
 import uuid
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
+from sqlalchemy import func, cast, Integer, extract
 from .. import db
 from ..models import Compliance, Vehicle
 from ..utils.auth_utils import token_required
 
 bp = Blueprint("compliance", __name__)
 
-def compliance_to_dict(c: Compliance) -> dict:
+DEFAULT_ALERT_DAYS = 30
+MAX_ALERT_DAYS = 3650
+DEFAULT_FORECAST_MONTHS = 12
+MAX_FORECAST_MONTHS = 60
+# Documents encore en vigueur (un document renouvelé passe à 'expiré')
+ACTIVE_STATUSES = ('valide', 'à_renouveler')
+
+def compliance_to_dict(c: Compliance, immatriculation=None) -> dict:
+    if immatriculation is None:
+        immatriculation = c.vehicle.immatriculation if c.vehicle else "N/A"
     return {
         "id": c.id,
         "vehiculeId": c.vehicule_id,
-        "vehicule_immatriculation": c.vehicle.immatriculation if c.vehicle else "N/A",
+        "vehicule_immatriculation": immatriculation,
         "type": c.type,
         "numeroDocument": c.numero_document,
         "dateEmission": c.date_emission.isoformat() if c.date_emission else None,
@@ -23,29 +33,207 @@ def compliance_to_dict(c: Compliance) -> dict:
         "createdAt": c.created_at.isoformat() if c.created_at else None
     }
 
+
+def days_until(column, today):
+    """Nombre de jours entre `today` et une colonne date, calculé par la base."""
+    if db.engine.dialect.name == "postgresql":
+        return column - today  # date - date = entier (jours)
+    return cast(func.julianday(column) - func.julianday(today), Integer)
+
+
+def parse_date(d_str):
+    if not d_str: return None
+    return datetime.fromisoformat(d_str.replace("Z", "+00:00")).date()
+
+
+def add_years(d, years=1):
+    """Même jour `years` ans plus tard (29 février -> 28 février)."""
+    try:
+        return d.replace(year=d.year + years)
+    except ValueError:
+        return d.replace(year=d.year + years, day=28)
+
+
+def with_immatriculation(query):
+    """Ajoute l'immatriculation par jointure (évite de charger chaque véhicule et ses collections)."""
+    return query.add_columns(
+        func.coalesce(Vehicle.immatriculation, "N/A")
+    ).outerjoin(Vehicle, Vehicle.id == Compliance.vehicule_id)
+
 @bp.get("")
 @token_required
 def list_compliance():
-    entries = Compliance.query.order_by(Compliance.date_expiration.asc()).all()
-    return jsonify([compliance_to_dict(e) for e in entries]), 200
+    rows = with_immatriculation(Compliance.query).order_by(Compliance.date_expiration.asc()).all()
+    return jsonify([compliance_to_dict(e, immat) for e, immat in rows]), 200
 
 @bp.get("/alerts")
 @token_required
 def get_compliance_alerts():
+    """
+    Documents expirant dans les `days` prochains jours (défaut 30) : ?days=60&statut=valide,à_renouveler
+    Filtre et jours restants calculés en SQL (index (date_expiration, statut)).
+    """
+    days = request.args.get("days", DEFAULT_ALERT_DAYS, type=int)
+    if days is None or days < 0 or days > MAX_ALERT_DAYS:
+        return jsonify({"error": f"Paramètre 'days' invalide (0 à {MAX_ALERT_DAYS})"}), 400
+
     today = date.today()
-    # Find entries expiring in the next 30 days
-    entries = Compliance.query.filter(Compliance.date_expiration >= today).order_by(Compliance.date_expiration.asc()).all()
-    
-    alerts = []
-    for e in entries:
-        diff = (e.date_expiration - today).days
-        if diff <= 30:
-            alerts.append({
-                **compliance_to_dict(e),
-                "daysRemaining": diff
-            })
+    days_remaining = days_until(Compliance.date_expiration, today).label("days_remaining")
+    query = with_immatriculation(Compliance.query.add_columns(days_remaining)).filter(
+        Compliance.date_expiration >= today,
+        Compliance.date_expiration <= today + timedelta(days=days)
+    )
+
+    statuts = [s.strip() for s in (request.args.get("statut") or "").split(",") if s.strip()]
+    if statuts:
+        query = query.filter(Compliance.statut.in_(statuts))
+
+    rows = query.order_by(Compliance.date_expiration.asc()).all()
+    alerts = [{
+        **compliance_to_dict(e, immat),
+        "daysRemaining": remaining
+    } for e, remaining, immat in rows]
     return jsonify(alerts), 200
 
+@bp.get("/forecast")
+@token_required
+def get_renewal_forecast():
+    """
+    Coûts de renouvellement attendus par mois : ?months=12&type=assurance,vignette
+    Une requête groupée (année, mois, type) sur date_expiration/cout des documents en vigueur ;
+    les documents déjà expirés non renouvelés sont regroupés dans "overdue".
+    """
+    months = request.args.get("months", DEFAULT_FORECAST_MONTHS, type=int)
+    if months is None or months < 1 or months > MAX_FORECAST_MONTHS:
+        return jsonify({"error": f"Paramètre 'months' invalide (1 à {MAX_FORECAST_MONTHS})"}), 400
+
+    today = date.today()
+    start = today.replace(day=1)
+    end_year, end_month = divmod(start.month - 1 + months, 12)
+    end = date(start.year + end_year, end_month + 1, 1)
+
+    year = extract('year', Compliance.date_expiration)
+    month = extract('month', Compliance.date_expiration)
+    query = db.session.query(
+        year, month, Compliance.type,
+        func.count(Compliance.id), func.coalesce(func.sum(Compliance.cout), 0)
+    ).filter(
+        Compliance.statut.in_(ACTIVE_STATUSES),
+        Compliance.date_expiration < end
+    )
+    types = [t.strip() for t in (request.args.get("type") or "").split(",") if t.strip()]
+    if types:
+        query = query.filter(Compliance.type.in_(types))
+    rows = query.group_by(year, month, Compliance.type).all()
+
+    buckets = {}
+    overdue = {"count": 0, "total": 0.0, "byType": {}}
+    for y, m, doc_type, count, total in rows:
+        y, m = int(y), int(m)
+        bucket = overdue if (y, m) < (start.year, start.month) else buckets.setdefault(
+            (y, m), {"year": y, "month": m, "count": 0, "total": 0.0, "byType": {}}
+        )
+        bucket["count"] += count
+        bucket["total"] += float(total)
+        by_type = bucket["byType"].setdefault(doc_type, {"count": 0, "total": 0.0})
+        by_type["count"] += count
+        by_type["total"] += float(total)
+
+    forecast = []
+    y, m = start.year, start.month
+    for _ in range(months):
+        forecast.append(buckets.get((y, m), {"year": y, "month": m, "count": 0, "total": 0.0, "byType": {}}))
+        y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+
+    return jsonify({
+        "months": forecast,
+        "overdue": overdue,
+        "total": sum(b["total"] for b in forecast)
+    }), 200
+
+@bp.post("/bulk-renew")
+@token_required
+def bulk_renew_compliance():
+    """
+    Renouvelle un type de document pour plusieurs véhicules en une transaction :
+    {"type": "vignette", "vehiculeIds": [...], "dateEmission"?, "dateExpiration"?, "cout"?, "prestataire"?, "notes"?}
+    Sans vehiculeIds, tous les véhicules ayant déjà un document de ce type sont renouvelés.
+    Par défaut la nouvelle période commence le lendemain de l'échéance précédente et dure un an ;
+    coût et prestataire reprennent ceux du document précédent, qui passe à 'expiré'.
+    """
+    if g.user.role not in ['admin', 'technician']:
+        return jsonify({"error": "Accès non autorisé"}), 403
+
+    data = request.get_json() or {}
+    doc_type = data.get("type")
+    if not doc_type:
+        return jsonify({"error": "Champs manquants: type"}), 400
+    vehicle_ids = data.get("vehiculeIds")
+    if vehicle_ids is not None and (not isinstance(vehicle_ids, list) or not vehicle_ids):
+        return jsonify({"error": "vehiculeIds doit être une liste non vide"}), 400
+
+    try:
+        date_emission = parse_date(data.get("dateEmission"))
+        date_expiration = parse_date(data.get("dateExpiration"))
+        cout = float(data["cout"]) if data.get("cout") is not None else None
+    except (ValueError, TypeError):
+        return jsonify({"error": "Date ou coût invalide"}), 400
+
+    # Document en vigueur le plus récent de ce type, par véhicule (une requête)
+    query = Compliance.query.filter(Compliance.type == doc_type, Compliance.statut.in_(ACTIVE_STATUSES))
+    if vehicle_ids is not None:
+        query = query.filter(Compliance.vehicule_id.in_(vehicle_ids))
+    previous = {}
+    for doc in query.order_by(Compliance.date_expiration.asc()).all():
+        previous[doc.vehicule_id] = doc
+
+    if vehicle_ids is None:
+        vehicle_ids = list(previous)
+    else:
+        vehicle_ids = list(dict.fromkeys(vehicle_ids))
+        known = {vid for (vid,) in db.session.query(Vehicle.id).filter(Vehicle.id.in_(vehicle_ids)).all()}
+        unknown = [vid for vid in vehicle_ids if vid not in known]
+        if unknown:
+            return jsonify({"error": f"Véhicules introuvables: {', '.join(unknown)}"}), 404
+    if not vehicle_ids:
+        return jsonify({"error": f"Aucun document '{doc_type}' à renouveler"}), 404
+
+    missing = [vid for vid in vehicle_ids if vid not in previous and date_expiration is None]
+    if missing:
+        return jsonify({"error": f"dateExpiration requise pour les véhicules sans document précédent: {', '.join(missing)}"}), 400
+
+    created = []
+    for vid in vehicle_ids:
+        prev = previous.get(vid)
+        emission = date_emission or (prev.date_expiration + timedelta(days=1) if prev else date.today())
+        entry = Compliance(
+            id=str(uuid.uuid4()),
+            vehicule_id=vid,
+            type=doc_type,
+            numero_document=data.get("numeroDocument"),
+            date_emission=emission,
+            date_expiration=date_expiration or add_years(prev.date_expiration),
+            prestataire=data.get("prestataire") or (prev.prestataire if prev else None),
+            cout=cout if cout is not None else ((prev.cout or 0.0) if prev else 0.0),
+            statut="valide",
+            notes=data.get("notes")
+        )
+        if prev:
+            prev.statut = "expiré"
+        created.append(entry)
+
+    db.session.add_all(created)
+    db.session.commit()
+
+    from ..utils import log_action
+    log_action(action="Renouvellement", entite="Échéance", entite_id=",".join(e.id for e in created), details=f"Renouvellement groupé {doc_type} pour {len(created)} véhicule(s)", payload={"vehicleIds": vehicle_ids})
+
+    immatriculations = dict(db.session.query(Vehicle.id, Vehicle.immatriculation).filter(Vehicle.id.in_(vehicle_ids)).all())
+    return jsonify({
+        "renewed": len(created),
+        "items": [compliance_to_dict(e, immatriculations.get(e.vehicule_id, "N/A")) for e in created]
+    }), 201
+
 @bp.post("")
 @token_required
 def create_compliance():
@@ -58,10 +246,6 @@ def create_compliance():
 
     new_id = str(uuid.uuid4())
     
-    def parse_date(d_str):
-        if not d_str: return None
-        return datetime.fromisoformat(d_str.replace("Z", "+00:00")).date()
-
     entry = Compliance(
         id=new_id,
         vehicule_id=data["vehiculeId"],
@@ -80,7 +264,7 @@ def create_compliance():
     
     from ..utils import log_action
     vehicle = Vehicle.query.get(entry.vehicule_id)
-    log_action(action="Création", entite="Échéance", entite_id=entry.id, details=f"Nouvelle échéance {entry.type} pour {vehicle.immatriculation if vehicle else '???'} (Expire le {entry.date_expiration})")
+    log_action(action="Création", entite="Échéance", entite_id=entry.id, details=f"Nouvelle échéance {entry.type} pour {vehicle.immatriculation if vehicle else '???'} (Expire le {entry.date_expiration})", payload={"vehicleIds": [entry.vehicule_id]})
 
     return jsonify(compliance_to_dict(entry)), 201
 
@@ -90,10 +274,6 @@ def update_compliance(id: str):
     entry = Compliance.query.get_or_404(id)
     data = request.get_json() or {}
     
-    def parse_date(d_str):
-        if not d_str: return None
-        return datetime.fromisoformat(d_str.replace("Z", "+00:00")).date()
-
     if "type" in data: entry.type = data["type"]
     if "numeroDocument" in data: entry.numero_document = data["numeroDocument"]
     if "dateEmission" in data: entry.date_emission = parse_date(data["dateEmission"])
@@ -118,7 +298,6 @@ def delete_compliance(id: str):
 @token_required
 def test_expiry_alerts():
     """Manually trigger document expiry alert check (for testing)."""
-    from flask import g
     from ..utils.scheduler import check_expiring_documents
     from flask import current_app
     
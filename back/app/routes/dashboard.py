@@ -1,31 +1,20 @@
 from flask import Blueprint, jsonify
-from sqlalchemy import func, extract
+from sqlalchemy import func, extract, select, literal
 from datetime import datetime, timedelta
 from .. import db
 from ..models import Vehicle, Driver, Maintenance, Mission, FuelEntry
+from ..utils.cache import get_or_compute
+from ..utils.auth_utils import current_user_from_request
 
 bp = Blueprint("dashboard", __name__)
 
-@bp.get("/stats")
-def get_dashboard_stats():
-    """Get comprehensive dashboard statistics based on user role."""
-    from flask import request
-    from ..models import User
-
-    auth_header = request.headers.get('Authorization')
-    user = None
-    if auth_header:
-        token = auth_header.split(" ")[1] if " " in auth_header else auth_header
-        user = User.query.filter_by(token=token).first()
-    
-    if not user:
-        return jsonify({"error": "Unauthorized"}), 401
-    
-    # Common helper for charts (Admins/Techs see all, others might see filtered or none)
-    # For simplicity, we keep charts global or empty for now, or filter if requested.
-    # The user asked for "KPIs specific to pages", usually meaning the top cards.
-    
-    # Chart Data (Global for now, can be optimized later)
+# Les graphiques sont globaux : un seul calcul partagé par tous les utilisateurs
+CHARTS_CACHE_KEY = "dashboard:charts"
+CHARTS_CACHE_TTL = 300
+CHARTS_TABLES = ("fuel_entries", "maintenances", "missions", "vehicles")
+
+
+def compute_charts() -> dict:
     # Fuel data by month (last 6 months)
     six_months_ago = datetime.now() - timedelta(days=180)
     fuel_by_month = db.session.query(
@@ -36,7 +25,7 @@ def get_dashboard_stats():
     ).filter(
         FuelEntry.date >= six_months_ago
     ).group_by('year', 'month').order_by('year', 'month').all()
-    
+
     fuel_chart_data = []
     for entry in fuel_by_month:
         month_name = datetime(int(entry.year), int(entry.month), 1).strftime('%B')
@@ -45,15 +34,15 @@ def get_dashboard_stats():
             'liters': float(entry.total_liters or 0),
             'cost': float(entry.total_cost or 0)
         })
-    
+
     # Maintenance by type
     maintenance_by_type = db.session.query(
         Maintenance.type,
         func.count(Maintenance.id).label('count')
     ).group_by(Maintenance.type).all()
-    
+
     maintenance_chart_data = [{'type': m.type, 'count': m.count} for m in maintenance_by_type]
-    
+
     # Vehicle usage
     vehicle_usage = db.session.query(
         Vehicle.immatriculation,
@@ -62,90 +51,129 @@ def get_dashboard_stats():
     ).group_by(Vehicle.id, Vehicle.immatriculation
     ).order_by(func.count(Mission.id).desc()
     ).limit(10).all()
-    
+
     vehicle_usage_data = [{'vehicle': v.immatriculation, 'missions': v.mission_count} for v in vehicle_usage]
-    
-    charts = {
+
+    return {
         'fuelByMonth': fuel_chart_data,
         'maintenanceByType': maintenance_chart_data,
         'vehicleUsage': vehicle_usage_data
     }
 
+
+def count_where(condition):
+    """COUNT(*) FILTER (WHERE condition)"""
+    return func.count().filter(condition)
+
+
+def run_kpi_query(*subqueries):
+    """Exécute plusieurs agrégats conditionnels (un par table) en une seule requête."""
+    subqueries = [s.subquery() for s in subqueries]
+    joined = subqueries[0]
+    for sub in subqueries[1:]:
+        joined = joined.join(sub, literal(True))
+    return db.session.execute(select(*subqueries).select_from(joined)).one()
+
+
+@bp.get("/stats")
+def get_dashboard_stats():
+    """Get comprehensive dashboard statistics based on user role."""
+    user = current_user_from_request()
+
+    if not user:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    charts = get_or_compute(CHARTS_CACHE_KEY, compute_charts, CHARTS_CACHE_TTL, CHARTS_TABLES)
+
     # --- Role Specific KPIs ---
-    
+
     if user and user.role == 'driver':
         # Driver KPIs - Case-insensitive email matching for more robust link
-        driver = Driver.query.filter(func.lower(Driver.email) == func.lower(user.email)).first()
-        
-        assigned_vehicle = driver.vehicle if driver else None
-        
-        my_missions_active = 0
-        my_missions_planifie = 0
-        if driver:
-             my_missions_active = Mission.query.filter_by(conducteur_id=driver.id, state='en_cours').count()
-             my_missions_planifie = Mission.query.filter_by(conducteur_id=driver.id, state='planifie').count()
-        
-        vehicle_status = assigned_vehicle.statut if assigned_vehicle else 'Non assigné'
-        
-        # Consumption for this driver (avg)
-        avg_cons = 0
-        if user:
-            avg_cons = db.session.query(func.avg(FuelEntry.consommation_100))\
-                .filter(FuelEntry.demandeur_id == user.id).scalar() or 0
-        
+        # Le conducteur et son véhicule sont lus dans la même requête que les agrégats
+        driver = select(Driver.id, Vehicle.immatriculation, Vehicle.statut).outerjoin(
+            Vehicle, Vehicle.id == Driver.vehicule_assigne_id
+        ).where(func.lower(Driver.email) == func.lower(user.email)).order_by(Driver.id).limit(1).subquery()
+
+        kpis = run_kpi_query(
+            select(
+                func.max(driver.c.immatriculation).label('immatriculation'),
+                func.max(driver.c.statut).label('vehicle_status'),
+            ),
+            select(
+                count_where(Mission.state == 'en_cours').label('active'),
+                count_where(Mission.state == 'planifie').label('planifie'),
+            ).where(Mission.conducteur_id.in_(select(driver.c.id))),
+            select(
+                func.avg(FuelEntry.consommation_100).label('avg_cons'),
+            ).where(FuelEntry.demandeur_id == user.id),
+        )
+
         return jsonify({
             'role': 'driver',
-            'myVehicle': assigned_vehicle.immatriculation if assigned_vehicle else 'N/A',
-            'vehicleStatus': vehicle_status,
-            'activeMissions': my_missions_active,
-            'upcomingMissions': my_missions_planifie,
-            'avgConsumption': round(float(avg_cons or 0), 2),
+            'myVehicle': kpis.immatriculation or 'N/A',
+            'vehicleStatus': kpis.vehicle_status or 'Non assigné',
+            'activeMissions': kpis.active,
+            'upcomingMissions': kpis.planifie,
+            'avgConsumption': round(float(kpis.avg_cons or 0), 2),
             **charts
         }), 200
 
     elif user and user.role == 'collaborator':
-        # Collaborator KPIs
-        my_missions_total = Mission.query.filter_by(created_by_id=user.id).count()
-        my_missions_pending = Mission.query.filter_by(created_by_id=user.id, state='nouveau').count()
-        my_missions_active = Mission.query.filter_by(created_by_id=user.id, state='en_cours').count()
-        
-        # Maintenance requests by me
-        my_maintenance_requests = Maintenance.query.filter_by(demandeur_id=user.id).count()
-        my_maintenance_pending = Maintenance.query.filter_by(demandeur_id=user.id, statut='en_attente').count()
-        
+        # Collaborator KPIs: my missions and my maintenance requests
+        kpis = run_kpi_query(
+            select(
+                func.count().label('missions_total'),
+                count_where(Mission.state == 'nouveau').label('missions_pending'),
+                count_where(Mission.state == 'en_cours').label('missions_active'),
+            ).where(Mission.created_by_id == user.id),
+            select(
+                func.count().label('requests_total'),
+                count_where(Maintenance.statut == 'en_attente').label('requests_pending'),
+            ).where(Maintenance.demandeur_id == user.id),
+        )
+
         return jsonify({
             'role': 'collaborator',
-            'totalMissions': my_missions_total,
-            'pendingMissions': my_missions_pending,
-            'activeMissions': my_missions_active,
-            'totalRequests': my_maintenance_requests,
-            'pendingRequests': my_maintenance_pending,
+            'totalMissions': kpis.missions_total,
+            'pendingMissions': kpis.missions_pending,
+            'activeMissions': kpis.missions_active,
+            'totalRequests': kpis.requests_total,
+            'pendingRequests': kpis.requests_pending,
              **charts
         }), 200
 
     else:
         # Default: Admin / Technician / Direction
-        total_vehicles = Vehicle.query.count()
-        vehicles_in_service = Vehicle.query.filter_by(statut='en_service').count()
-        vehicles_in_maintenance = Vehicle.query.filter_by(statut='en_maintenance').count()
-        total_drivers = Driver.query.count()
-        active_drivers = Driver.query.filter_by(statut='actif').count()
-        pending_maintenance = Maintenance.query.filter_by(statut='en_attente').count()
-        ongoing_missions = Mission.query.filter_by(state='en_cours').count()
-        
-        avg_consumption = db.session.query(
-            func.avg(FuelEntry.consommation_100)
-        ).filter(FuelEntry.consommation_100.isnot(None)).scalar()
+        kpis = run_kpi_query(
+            select(
+                func.count().label('total_vehicles'),
+                count_where(Vehicle.statut == 'en_service').label('vehicles_in_service'),
+                count_where(Vehicle.statut == 'en_maintenance').label('vehicles_in_maintenance'),
+            ).select_from(Vehicle),
+            select(
+                func.count().label('total_drivers'),
+                count_where(Driver.statut == 'actif').label('active_drivers'),
+            ).select_from(Driver),
+            select(
+                count_where(Maintenance.statut == 'en_attente').label('pending_maintenance'),
+            ).select_from(Maintenance),
+            select(
+                count_where(Mission.state == 'en_cours').label('ongoing_missions'),
+            ).select_from(Mission),
+            select(
+                func.avg(FuelEntry.consommation_100).label('avg_consumption'),
+            ).where(FuelEntry.consommation_100.isnot(None)),
+        )
 
         return jsonify({
             'role': 'admin',
-            'totalVehicules': total_vehicles,
-            'vehiculesEnService': vehicles_in_service,
-            'vehiculesEnMaintenance': vehicles_in_maintenance,
-            'totalChauffeurs': total_drivers,
-            'chauffeursActifs': active_drivers,
-            'entretiensEnAttente': pending_maintenance,
-            'missionsEnCours': ongoing_missions,
-            'consommationMoyenne': round(float(avg_consumption or 0), 2),
+            'totalVehicules': kpis.total_vehicles,
+            'vehiculesEnService': kpis.vehicles_in_service,
+            'vehiculesEnMaintenance': kpis.vehicles_in_maintenance,
+            'totalChauffeurs': kpis.total_drivers,
+            'chauffeursActifs': kpis.active_drivers,
+            'entretiensEnAttente': kpis.pending_maintenance,
+            'missionsEnCours': kpis.ongoing_missions,
+            'consommationMoyenne': round(float(kpis.avg_consumption or 0), 2),
             **charts
         }), 200
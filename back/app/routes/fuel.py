@@ -8,8 +8,9 @@ import traceback
 
 from .. import db
 from ..models import FuelEntry, Vehicle, Driver, FuelMonthlyBudget, User
-from ..utils.email_utils import send_mileage_limit_alert, send_fuel_creation_alert, send_abnormal_fuel_alert
+from ..utils.email_utils import send_mileage_limit_alert, send_fuel_creation_alert, send_abnormal_fuel_alert, send_budget_overrun_alert
 from ..utils.auth_utils import token_required
+from ..utils.report_jobs import register_report, report_response
 import re
 import unicodedata
 import io
@@ -380,24 +381,17 @@ def create_fuel_entry():
             if entry.quantite_achetee > (vehicle.capacite_reservoir or 0):
                 entry.alerte = "Carburant anormal - Quantité supérieure à la capacité du réservoir"
                 entry.statut_carburant = "Dépassement"
-                try:
-                    demandeur_name = entry.demandeur.name if entry.demandeur else "Inconnu"
-                    send_abnormal_fuel_alert(entry, vehicle, demandeur_name)
-                except Exception as e:
-                    print(f"Error triggering abnormal fuel alert: {e}")
+                demandeur_name = entry.demandeur.name if entry.demandeur else "Inconnu"
+                send_abnormal_fuel_alert(entry, vehicle, demandeur_name)
             else:
                 entry.statut_carburant = "Normal"
         
+        # Emails written in the same transaction, sent after commit
+        send_fuel_creation_alert(entry)
         db.session.commit()
-        
-        # Trigger email notification
-        try:
-            send_fuel_creation_alert(entry, vehicle)
-        except Exception as e:
-            print(f"Error triggering fuel alert: {e}")
 
         from ..utils import log_action
-        log_action(action="Création", entite="Carburant", entite_id=entry.id, details=f"Plein carburant enregistré pour {vehicle.immatriculation} ({entry.quantite_rechargee}L)")
+        log_action(action="Création", entite="Carburant", entite_id=entry.id, details=f"Plein carburant enregistré pour {vehicle.immatriculation} ({entry.quantite_rechargee}L)", payload={"vehicleIds": [entry.vehicule_id]})
 
         return jsonify(fuel_to_dict(entry)), 201
 
@@ -483,11 +477,8 @@ def update_fuel_entry(id):
             if entry.quantite_achetee > (vehicle.capacite_reservoir or 0):
                 entry.alerte = "Carburant anormal - Quantité supérieure à la capacité du réservoir"
                 entry.statut_carburant = "Dépassement"
-                try:
-                    demandeur_name = entry.demandeur.name if entry.demandeur else "Inconnu"
-                    send_abnormal_fuel_alert(entry, vehicle, demandeur_name)
-                except Exception as e:
-                    print(f"Error triggering abnormal fuel alert (update): {e}")
+                demandeur_name = entry.demandeur.name if entry.demandeur else "Inconnu"
+                send_abnormal_fuel_alert(entry, vehicle, demandeur_name)
             else:
                 entry.statut_carburant = "Normal"
                 # Clear alert if it was corrected (optional, but cleaner)
@@ -496,7 +487,7 @@ def update_fuel_entry(id):
 
         db.session.commit()
         from ..utils import log_action
-        log_action(action="Modification", entite="Carburant", entite_id=entry.id, details=f"Mise à jour plein carburant pour {vehicle.immatriculation}")
+        log_action(action="Modification", entite="Carburant", entite_id=entry.id, details=f"Mise à jour plein carburant pour {vehicle.immatriculation}", payload={"vehicleIds": [entry.vehicule_id]})
 
         return jsonify(fuel_to_dict(entry)), 200
 
@@ -974,6 +965,17 @@ New endpoints for fuel budget management
 
 # Append to fuel.py after line 763
 
+def budget_to_dict(b: FuelMonthlyBudget) -> Dict[str, Any]:
+    return {
+        'id': b.id,
+        'vehicle_id': b.vehicle_id,
+        'year': b.year,
+        'month': b.month,
+        'forecast_amount': b.forecast_amount,
+        'alert_sent': b.alert_sent
+    }
+
+
 @bp.get("/budgets")
 def get_budgets():
     """Get monthly budgets for a specific year and optional vehicle"""
@@ -986,14 +988,7 @@ def get_budgets():
     
     budgets = query.all()
     
-    return jsonify([{
-        'id': b.id,
-        'vehicle_id': b.vehicle_id,
-        'year': b.year,
-        'month': b.month,
-        'forecast_amount': b.forecast_amount,
-        'alert_sent': b.alert_sent
-    } for b in budgets]), 200
+    return jsonify([budget_to_dict(b) for b in budgets]), 200
 
 
 @bp.post("/budgets")
@@ -1055,118 +1050,125 @@ def create_or_update_budget():
         return jsonify({'error': str(e)}), 500
 
 
-@bp.get("/year-end-balance-with-budgets")
-def get_year_end_balance_with_budgets():
+@register_report("fuel_year_end_budgets", entities=("vehicles", "fuel", "fuel_budgets"))
+def build_year_end_balance_with_budgets(params):
     """
     Enhanced version with budget tracking.
     Returns monthly forecast, consumed, and balance for each vehicle.
     """
-    try:
-        year = request.args.get('year', type=int) or datetime.now().year
-        
-        vehicles = Vehicle.query.all()
-        vehicles_data = []
-        total_overruns = 0
-        
-        for vehicle in vehicles:
-            # Get fuel entries for this year
-            entries = FuelEntry.query.filter(
-                db.extract('year', FuelEntry.date) == year,
-                FuelEntry.vehicule_id == vehicle.id
-            ).order_by(FuelEntry.date.asc()).all()
-            
-            # Get budgets for this year
-            budgets = FuelMonthlyBudget.query.filter_by(
-                vehicle_id=vehicle.id,
-                year=year
-            ).all()
-            budget_map = {b.month: b for b in budgets}
-            
-            # Calculate monthly data
-            monthly_data = {}
-            for m in range(1, 13):
-                monthly_data[m] = {
-                    'month': m,
-                    'forecast': 0,
-                    'consumed': 0,
-                    'balance': 0,
-                    'date': None,
-                    'exceeded': False
-                }
-            
-            # Calculate consumed amounts per month
-            for entry in entries:
-                month = entry.date.month
-                monthly_data[month]['consumed'] += (entry.total_achete or 0)
-                
-                # Update balance with last entry of month
-                if monthly_data[month]['date'] is None or entry.date > monthly_data[month]['date']:
-                    monthly_data[month]['balance'] = entry.nouveau_solde or 0
-                    monthly_data[month]['date'] = entry.date
-            
-            # Add forecast data
-            vehicle_overruns = 0
-            for month, budget in budget_map.items():
-                monthly_data[month]['forecast'] = budget.forecast_amount
-                
-                # Check if exceeded
-                if budget.forecast_amount > 0 and monthly_data[month]['consumed'] > budget.forecast_amount:
-                    monthly_data[month]['exceeded'] = True
-                    vehicle_overruns += 1
-            
-            total_overruns += vehicle_overruns
-            
-            # Format for response
-            monthly_list = [
-                {
-                    'month': m['month'],
-                    'forecast': m['forecast'],
-                    'consumed': m['consumed'],
-                    'balance': m['balance'],
-                    'date': m['date'].isoformat() if m['date'] else None,
-                    'exceeded': m['exceeded']
-                }
-                for m in sorted(monthly_data.values(), key=lambda x: x['month'])
-            ]
+    year = params["year"]
+    
+    vehicles = Vehicle.query.options(db.lazyload("*")).all()
+    vehicles_data = []
+    total_overruns = 0
+
+    # Fuel entries and budgets for the year, loaded once and grouped by vehicle
+    entries_by_vehicle = {}
+    for entry in FuelEntry.query.options(db.lazyload("*")).filter(
+        db.extract('year', FuelEntry.date) == year
+    ).order_by(FuelEntry.date.asc()).all():
+        entries_by_vehicle.setdefault(entry.vehicule_id, []).append(entry)
+
+    budgets_by_vehicle = {}
+    for budget in FuelMonthlyBudget.query.options(db.lazyload("*")).filter_by(year=year).all():
+        budgets_by_vehicle.setdefault(budget.vehicle_id, {})[budget.month] = budget
+    
+    for vehicle in vehicles:
+        entries = entries_by_vehicle.get(vehicle.id, [])
+        budget_map = budgets_by_vehicle.get(vehicle.id, {})
+        
+        # Calculate monthly data
+        monthly_data = {}
+        for m in range(1, 13):
+            monthly_data[m] = {
+                'month': m,
+                'forecast': 0,
+                'consumed': 0,
+                'balance': 0,
+                'date': None,
+                'exceeded': False
+            }
+        
+        # Calculate consumed amounts per month
+        for entry in entries:
+            month = entry.date.month
+            monthly_data[month]['consumed'] += (entry.total_achete or 0)
             
-            # Year-end balance logic (same as before)
-            year_end_balance = 0
-            if monthly_data[12]['date']:
-                year_end_balance = monthly_data[12]['balance']
-            else:
-                for m_data in reversed(sorted(monthly_data.values(), key=lambda x: x['month'])):
-                    if m_data['date']:
-                        year_end_balance = m_data['balance']
-                        break
+            # Update balance with last entry of month
+            if monthly_data[month]['date'] is None or entry.date > monthly_data[month]['date']:
+                monthly_data[month]['balance'] = entry.nouveau_solde or 0
+                monthly_data[month]['date'] = entry.date
+        
+        # Add forecast data
+        vehicle_overruns = 0
+        for month, budget in budget_map.items():
+            monthly_data[month]['forecast'] = budget.forecast_amount
             
-            vehicles_data.append({
-                'vehicle_id': vehicle.id,
-                'immatriculation': vehicle.immatriculation,
-                'marque': vehicle.marque,
-                'monthly_data': monthly_list,
-                'last_balance': year_end_balance,
-                'overrun_months': vehicle_overruns
-            })
+            # Check if exceeded
+            if budget.forecast_amount > 0 and monthly_data[month]['consumed'] > budget.forecast_amount:
+                monthly_data[month]['exceeded'] = True
+                vehicle_overruns += 1
+        
+        total_overruns += vehicle_overruns
+        
+        # Format for response
+        monthly_list = [
+            {
+                'month': m['month'],
+                'forecast': m['forecast'],
+                'consumed': m['consumed'],
+                'balance': m['balance'],
+                'date': m['date'].isoformat() if m['date'] else None,
+                'exceeded': m['exceeded']
+            }
+            for m in sorted(monthly_data.values(), key=lambda x: x['month'])
+        ]
         
-        # Calculate grand totals
-        grand_total_forecast = sum(
-            sum(m['forecast'] for m in v['monthly_data'])
-            for v in vehicles_data
-        )
-        grand_total_consumed = sum(
-            sum(m['consumed'] for m in v['monthly_data'])
-            for v in vehicles_data
-        )
-        grand_total_balance = sum(v['last_balance'] for v in vehicles_data)
+        # Year-end balance logic (same as before)
+        year_end_balance = 0
+        if monthly_data[12]['date']:
+            year_end_balance = monthly_data[12]['balance']
+        else:
+            for m_data in reversed(sorted(monthly_data.values(), key=lambda x: x['month'])):
+                if m_data['date']:
+                    year_end_balance = m_data['balance']
+                    break
         
-        return jsonify({
-            'year': year,
-            'vehicles_data': vehicles_data,
-            'grand_total_forecast': grand_total_forecast,
-            'grand_total_consumed': grand_total_consumed,
-            'grand_total_balance': grand_total_balance,
-            'total_overruns': total_overruns
-        }), 200
+        vehicles_data.append({
+            'vehicle_id': vehicle.id,
+            'immatriculation': vehicle.immatriculation,
+            'marque': vehicle.marque,
+            'monthly_data': monthly_list,
+            'last_balance': year_end_balance,
+            'overrun_months': vehicle_overruns
+        })
+    
+    # Calculate grand totals
+    grand_total_forecast = sum(
+        sum(m['forecast'] for m in v['monthly_data'])
+        for v in vehicles_data
+    )
+    grand_total_consumed = sum(
+        sum(m['consumed'] for m in v['monthly_data'])
+        for v in vehicles_data
+    )
+    grand_total_balance = sum(v['last_balance'] for v in vehicles_data)
+    
+    return {
+        'year': year,
+        'vehicles_data': vehicles_data,
+        'grand_total_forecast': grand_total_forecast,
+        'grand_total_consumed': grand_total_consumed,
+        'grand_total_balance': grand_total_balance,
+        'total_overruns': total_overruns
+    }
+
+
+@bp.get("/year-end-balance-with-budgets")
+def get_year_end_balance_with_budgets():
+    try:
+        year = request.args.get('year', type=int) or datetime.now().year
+        return report_response("fuel_year_end_budgets", {"year": year})
         
     except Exception as e:
         traceback.print_exc()
@@ -1238,67 +1240,12 @@ def check_budget_overrun(vehicle_id, year, month):
             # Send alert
             vehicle = Vehicle.query.get(vehicle_id)
             if vehicle:
+                # Alert and flag committed together: one alert per vehicle and month
                 send_budget_overrun_alert(vehicle, year, month, budget.forecast_amount, consumed)
-                
-                # Mark alert as sent
                 budget.alert_sent = True
                 db.session.commit()
     
     except Exception as e:
+        db.session.rollback()
         print(f"Error checking budget overrun: {e}")
         traceback.print_exc()
-
-
-def send_budget_overrun_alert(vehicle, year, month, forecast, consumed):
-    """Send email alert when budget is exceeded"""
-    from ..models import User
-    
-    recipients = [u.profile_email for u in User.query.filter(
-        User.role.in_(['admin', 'technician'])
-    ).all() if u.profile_email]
-    
-    if not recipients:
-        return
-    
-    month_names = ['', 'Janvier', 'Février', 'Mars', 'Avril', 'Mai', 'Juin',
-                   'Juillet', 'Août', 'Septembre', 'Octobre', 'Novembre', 'Décembre']
-    month_name = month_names[month]
-    
-    overrun_amount = consumed - forecast
-    overrun_percent = ((consumed / forecast) - 1) * 100 if forecast > 0 else 0
-    
-    subject = f"⚠️ BUDGET DÉPASSÉ : {vehicle.immatriculation} - {month_name} {year}"
-    
-    html_content = f"""
-    <h3 style="color: #e74c3c;">⚠️ Dépassement Budgétaire Détecté</h3>
-    <p>Le véhicule <b>{vehicle.immatriculation}</b> ({vehicle.marque} {vehicle.modele}) a dépassé son budget carburant.</p>
-    <div style="background-color: #fcebea; padding: 15px; border-radius: 8px; border: 1px solid #e74c3c; margin: 15px 0;">
-        <ul>
-            <li><b>Mois :</b> {month_name} {year}</li>
-            <li><b>Budget prévu :</b> {forecast:,.0f} Ar</li>
-            <li><b>Montant consommé :</b> <span style="color: #e74c3c; font-weight: bold;">{consumed:,.0f} Ar</span></li>
-            <li><b>Dépassement :</b> <span style="color: #e74c3c; font-weight: bold;">{overrun_amount:,.0f} Ar ({overrun_percent:.1f}%)</span></li>
-        </ul>
-    </div>
-    <p><b>Action requise :</b> Veuillez vérifier la consommation de carburant et prendre les mesures appropriées.</p>
-    <p>Connectez-vous à l'application pour plus de détails.</p>
-    """
-    
-    from flask_mail import Message
-    from .. import mail
-    
-    msg = Message(subject, recipients=recipients)
-    msg.html = html_content
-    
-    from ..utils.email_utils import send_email_async
-    send_email_async(msg)
-    
-    # Also create in-app notification
-    from ..utils.notification_utils import create_notification
-    create_notification(
-        title=f"Budget dépassé: {vehicle.immatriculation}",
-        message=f"Budget {month_name}: {consumed:,.0f} Ar / {forecast:,.0f} Ar (+{overrun_percent:.1f}%)",
-        type="error",
-        target_role="admin",
-        link="/fuel/year-end-stats"
-    )
@@ -1,31 +1,66 @@
-from flask import Blueprint, jsonify
-from ..models import ActionLog
+from flask import Blueprint, jsonify, request, g, Response
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from sqlalchemy import or_, and_, func, cast, literal, literal_column, String
+from sqlalchemy.dialects.postgresql import JSONB
+from ..models import ActionLog, User
 from .. import db
 from ..utils.auth_utils import token_required
 
 bp = Blueprint("logs", __name__)
 
-@bp.get("/")
-@token_required
-def get_logs():
-    from flask import request, g
-    from datetime import datetime
-    
-    # Check if current user is admin
-    if not g.user or g.user.role != 'admin':
-        return jsonify({"success": False, "error": "Accès refusé. Seuls les administrateurs peuvent accéder aux logs."}), 403
+LOGS_PAGE_SIZE = 100
+LOGS_MAX_PAGE_SIZE = 500
+SEARCH_PAGE_SIZE = 50
+# Export : lignes lues par aller-retour du curseur serveur, octets accumulés avant envoi
+EXPORT_FETCH_SIZE = 2000
+EXPORT_CHUNK_BYTES = 64 * 1024
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+}
+EXPORT_COLUMNS = ["id", "timestamp", "userId", "userName", "action", "entite", "entiteId", "details", "payload"]
+# Dictionnaire de la colonne générée search_vector (voir la migration 0a7e3c9d5f21)
+SEARCH_CONFIG = "french"
 
-    start_date_str = request.args.get('startDate')
-    end_date_str = request.args.get('endDate')
-    start_hour = request.args.get('startHour') # format "HH:mm"
-    end_hour = request.args.get('endHour')     # format "HH:mm"
-    user_id = request.args.get('userId')
 
-    query = ActionLog.query
+def log_projection():
+    """Colonnes d'un log et de son auteur (jointure : pas de chargement par ligne)."""
+    return db.session.query(
+        ActionLog.id, ActionLog.action, ActionLog.entite, ActionLog.entite_id, ActionLog.details,
+        ActionLog.timestamp, ActionLog.user_id, ActionLog.payload, User.name, User.avatar
+    ).outerjoin(User, User.id == ActionLog.user_id)
 
+
+def log_row_to_dict(row) -> dict:
+    return {
+        "id": row.id,
+        "action": row.action,
+        "entite": row.entite,
+        "entiteId": row.entite_id,
+        "details": row.details,
+        "payload": row.payload,
+        "timestamp": row.timestamp.isoformat(),
+        "userId": row.user_id,
+        "user": {
+            "name": row.name if row.name is not None else "Utilisateur supprimé",
+            "avatar": row.avatar
+        }
+    }
+
+def apply_log_filters(query, args):
+    """
+    Filtres communs à la liste et à l'export : startDate, endDate (ISO),
+    startHour/endHour ("HH:mm", sur minute_of_day) et userId. Les valeurs invalides sont ignorées.
+    """
+    user_id = args.get('userId')
     if user_id:
         query = query.filter(ActionLog.user_id == user_id)
 
+    start_date_str = args.get('startDate')
     if start_date_str:
         try:
             start_date = datetime.fromisoformat(start_date_str.replace('Z', '+00:00'))
@@ -33,6 +68,7 @@ def get_logs():
         except ValueError:
             pass
 
+    end_date_str = args.get('endDate')
     if end_date_str:
         try:
             end_date = datetime.fromisoformat(end_date_str.replace('Z', '+00:00'))
@@ -40,36 +76,211 @@ def get_logs():
         except ValueError:
             pass
 
+    start_hour = args.get('startHour') # format "HH:mm"
     if start_hour:
         try:
             h, m = map(int, start_hour.split(':'))
-            from sqlalchemy import extract
-            query = query.filter(extract('hour', ActionLog.timestamp) * 60 + extract('minute', ActionLog.timestamp) >= h * 60 + m)
+            query = query.filter(ActionLog.minute_of_day >= h * 60 + m)
         except Exception:
             pass
 
+    end_hour = args.get('endHour')     # format "HH:mm"
     if end_hour:
         try:
             h, m = map(int, end_hour.split(':'))
-            from sqlalchemy import extract
-            query = query.filter(extract('hour', ActionLog.timestamp) * 60 + extract('minute', ActionLog.timestamp) <= h * 60 + m)
+            query = query.filter(ActionLog.minute_of_day <= h * 60 + m)
         except Exception:
             pass
 
-    logs = query.order_by(ActionLog.timestamp.desc()).all()
-    result = []
-    for log in logs:
-        result.append({
-            "id": log.id,
-            "action": log.action,
-            "entite": log.entite,
-            "entiteId": log.entite_id,
-            "details": log.details,
-            "timestamp": log.timestamp.isoformat(),
-            "userId": log.user_id,
-            "user": {
-                "name": log.user.name if log.user else "Utilisateur supprimé",
-                "avatar": log.user.avatar if log.user else None
-            }
-        })
-    return jsonify(result), 200
+    return query
+
+@bp.get("/")
+@token_required
+def get_logs():
+    """
+    Logs du plus récent au plus ancien, par pages (index (timestamp, id)).
+    ?limit=100&cursor=<X-Next-Cursor de la page précédente>, plus les filtres
+    startDate, endDate, startHour/endHour ("HH:mm") et userId.
+    L'en-tête X-Next-Cursor est absent sur la dernière page.
+    """
+    # Check if current user is admin
+    if not g.user or g.user.role != 'admin':
+        return jsonify({"success": False, "error": "Accès refusé. Seuls les administrateurs peuvent accéder aux logs."}), 403
+
+    limit = max(1, min(request.args.get('limit', LOGS_PAGE_SIZE, type=int), LOGS_MAX_PAGE_SIZE))
+    query = apply_log_filters(log_projection(), request.args)
+
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            ts, last_id = cursor.split("|", 1)
+            ts = datetime.fromisoformat(ts)
+        except ValueError:
+            return jsonify({"error": "Curseur invalide"}), 400
+        query = query.filter(or_(
+            ActionLog.timestamp < ts,
+            and_(ActionLog.timestamp == ts, ActionLog.id < last_id)
+        ))
+
+    rows = query.order_by(ActionLog.timestamp.desc(), ActionLog.id.desc()).limit(limit).all()
+    response = jsonify([log_row_to_dict(row) for row in rows])
+    if len(rows) == limit:
+        response.headers["X-Next-Cursor"] = f"{rows[-1].timestamp.isoformat()}|{rows[-1].id}"
+    return response, 200
+
+@bp.get("/search")
+@token_required
+def search_logs():
+    """
+    Recherche dans les logs : ?q=vidange&entite=Maintenance&entite_id=...&vehicleId=...&startDate=&endDate=&limit=50
+    Sur PostgreSQL, q interroge la colonne search_vector (GIN) et les résultats sont triés par
+    pertinence ; vehicleId utilise le payload JSONB (GIN). Ailleurs : ILIKE, du plus récent au plus ancien.
+    """
+    if not g.user or g.user.role != 'admin':
+        return jsonify({"success": False, "error": "Accès refusé. Seuls les administrateurs peuvent accéder aux logs."}), 403
+
+    q = (request.args.get('q') or '').strip()
+    entite = request.args.get('entite')
+    entite_id = request.args.get('entite_id') or request.args.get('entiteId')
+    vehicle_id = request.args.get('vehicleId')
+    limit = max(1, min(request.args.get('limit', SEARCH_PAGE_SIZE, type=int), LOGS_MAX_PAGE_SIZE))
+    if not (q or entite or entite_id or vehicle_id):
+        return jsonify({"error": "Au moins un critère est requis (q, entite, entite_id, vehicleId)"}), 400
+
+    is_postgres = db.engine.dialect.name == "postgresql"
+    query = log_projection()
+
+    if entite:
+        query = query.filter(ActionLog.entite == entite)
+    if entite_id:
+        query = query.filter(ActionLog.entite_id == entite_id)
+
+    if vehicle_id:
+        vehicle_ids = json.dumps({"vehicleIds": [vehicle_id]})
+        if is_postgres:
+            in_payload = ActionLog.payload.op('@>')(cast(literal(vehicle_ids), JSONB))
+        else:
+            # Valeur JSON exacte (guillemets compris) ; % et _ du paramètre ne sont pas des jokers
+            needle = json.dumps(vehicle_id).replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            in_payload = cast(ActionLog.payload, String).like(f"%{needle}%", escape="\\")
+        query = query.filter(or_(
+            and_(ActionLog.entite == "Véhicule", ActionLog.entite_id == vehicle_id),
+            in_payload
+        ))
+
+    try:
+        if request.args.get('startDate'):
+            query = query.filter(ActionLog.timestamp >= datetime.fromisoformat(request.args['startDate'].replace('Z', '+00:00')))
+        if request.args.get('endDate'):
+            query = query.filter(ActionLog.timestamp <= datetime.fromisoformat(request.args['endDate'].replace('Z', '+00:00')))
+    except ValueError:
+        return jsonify({"error": "Date invalide"}), 400
+
+    rank = None
+    if q and is_postgres:
+        search_vector = literal_column("action_logs.search_vector")
+        ts_query = func.websearch_to_tsquery(SEARCH_CONFIG, q)
+        rank = func.ts_rank_cd(search_vector, ts_query).label("rank")
+        query = query.add_columns(rank).filter(search_vector.op('@@')(ts_query))
+        query = query.order_by(rank.desc(), ActionLog.timestamp.desc())
+    else:
+        if q:
+            query = query.filter(ActionLog.details.ilike(f"%{q}%"))
+        query = query.order_by(ActionLog.timestamp.desc(), ActionLog.id.desc())
+
+    rows = query.limit(limit).all()
+    return jsonify([
+        {**log_row_to_dict(row), "rank": float(row.rank) if rank is not None else None}
+        for row in rows
+    ]), 200
+
+def export_record(row) -> dict:
+    return {
+        "id": row.id,
+        "timestamp": row.timestamp.isoformat(),
+        "userId": row.user_id,
+        "userName": row.name if row.name is not None else "Utilisateur supprimé",
+        "action": row.action,
+        "entite": row.entite,
+        "entiteId": row.entite_id,
+        "details": row.details,
+        "payload": row.payload,
+    }
+
+
+def export_lines(engine, statement, fmt):
+    """
+    Lignes de l'export, lues par paquets sur un curseur côté serveur (stream_results :
+    curseur nommé sur PostgreSQL), sur une connexion dédiée : mémoire constante.
+    """
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        yield "\ufeff" + buffer.getvalue()  # BOM : accents corrects à l'ouverture dans Excel
+
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=EXPORT_FETCH_SIZE).execute(statement)
+        for row in result:
+            record = export_record(row)
+            if fmt == "csv":
+                buffer.seek(0)
+                buffer.truncate()
+                record["payload"] = json.dumps(record["payload"], ensure_ascii=False) if record["payload"] is not None else ""
+                writer.writerow([record[c] for c in EXPORT_COLUMNS])
+                yield buffer.getvalue()
+            else:
+                yield json.dumps(record, ensure_ascii=False) + "\n"
+
+
+def encode_chunks(lines, compress):
+    """Regroupe les lignes en blocs d'environ EXPORT_CHUNK_BYTES, compressés en gzip à la volée."""
+    compressor = zlib.compressobj(wbits=31) if compress else None  # wbits=31 : en-tête gzip
+    pending, size = [], 0
+    for line in lines:
+        data = line.encode("utf-8")
+        pending.append(data)
+        size += len(data)
+        if size >= EXPORT_CHUNK_BYTES:
+            chunk = b"".join(pending)
+            pending, size = [], 0
+            chunk = compressor.compress(chunk) if compressor else chunk
+            if chunk:
+                yield chunk
+    chunk = b"".join(pending)
+    if compressor:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk
+
+@bp.get("/export")
+@token_required
+def export_logs():
+    """
+    Export en flux des logs (mêmes filtres que la liste) : ?format=csv|ndjson&gzip=1
+    Du plus ancien au plus récent ; gzip activé par défaut (fichier .csv.gz / .ndjson.gz).
+    """
+    if not g.user or g.user.role != 'admin':
+        return jsonify({"success": False, "error": "Accès refusé. Seuls les administrateurs peuvent accéder aux logs."}), 403
+
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": f"Format invalide ({', '.join(EXPORT_FORMATS)})"}), 400
+    compress = request.args.get('gzip', '1') not in ('0', 'false')
+
+    statement = apply_log_filters(log_projection(), request.args).order_by(
+        ActionLog.timestamp.asc(), ActionLog.id.asc()
+    ).statement
+    # La connexion de la requête n'est pas utilisée pendant le flux
+    db.session.remove()
+
+    mimetype, extension = EXPORT_FORMATS[fmt]
+    filename = f"logs_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.{extension}"
+    if compress:
+        mimetype, filename = "application/gzip", filename + ".gz"
+
+    return Response(
+        encode_chunks(export_lines(db.engine, statement, fmt), compress),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -144,14 +144,10 @@ def create_maintenance():
             pieces_remplacees=data.get("piecesRemplacees"),
         )
         db.session.add(m)
+        # Email written in the same transaction, sent after commit
+        send_maintenance_alert(m)
         db.session.commit()
 
-        # Trigger email notification
-        try:
-            send_maintenance_alert(m, vehicle)
-        except Exception as e:
-            print(f"Erreur d'envoi d'email: {e}")
-
         from ..utils.notification_utils import create_notification
         create_notification(
             title="Nouvelle demande d'entretien",
@@ -162,7 +158,7 @@ def create_maintenance():
         )
 
         from ..utils import log_action
-        log_action(action="Création", entite="Maintenance", entite_id=m.id, details=f"Demande d'entretien {m.type} créée pour {vehicle.immatriculation}")
+        log_action(action="Création", entite="Maintenance", entite_id=m.id, details=f"Demande d'entretien {m.type} créée pour {vehicle.immatriculation}", payload={"vehicleIds": [m.vehicule_id]})
 
         return jsonify(maintenance_to_dict(m)), 201
     except Exception as e:
@@ -236,6 +232,10 @@ def update_maintenance(maintenance_id: str):
             User.query.get_or_404(data["demandeurId"])
             m.demandeur_id = data["demandeurId"]
 
+        # Email written in the same transaction as the status change, sent after commit
+        if old_status != m.statut and m.statut in ['accepte', 'rejete']:
+            send_status_update_notification(m, old_status)
+
         db.session.commit()
 
         # Trigger notification if status changed to accepte or rejete
@@ -264,11 +264,6 @@ def update_maintenance(maintenance_id: str):
             db.session.commit()
 
         if old_status != m.statut and m.statut in ['accepte', 'rejete']:
-            try:
-                send_status_update_notification(m, vehicle)
-            except Exception as e:
-                print(f"Erreur d'envoi d'email de mise à jour: {e}")
-            
             from ..utils.notification_utils import create_notification
             status_label = "acceptée" if m.statut == 'accepte' else "rejetée"
             create_notification(
@@ -290,7 +285,7 @@ def update_maintenance(maintenance_id: str):
                 db.session.commit()
 
         from ..utils import log_action
-        log_action(action="Modification", entite="Maintenance", entite_id=m.id, details=f"Mise à jour entretien {m.type} pour {vehicle.immatriculation}")
+        log_action(action="Modification", entite="Maintenance", entite_id=m.id, details=f"Mise à jour entretien {m.type} pour {vehicle.immatriculation}", payload={"vehicleIds": [m.vehicule_id]})
 
         return jsonify(maintenance_to_dict(m)), 200
     except Exception as e:
@@ -320,7 +315,7 @@ def delete_maintenance(maintenance_id: str):
         m_type = m.type
         m_id = m.id
         
-        log_action(action="Suppression", entite="Maintenance", entite_id=m_id, details=f"Suppression entretien {m_type}{vehicle_info}")
+        log_action(action="Suppression", entite="Maintenance", entite_id=m_id, details=f"Suppression entretien {m_type}{vehicle_info}", payload={"vehicleIds": [m.vehicule_id]})
         
         db.session.delete(m)
         db.session.commit()
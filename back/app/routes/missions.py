@@ -195,15 +195,10 @@ def create_mission():
             # For now, let's keep it atomic (re-raising) to be sure it's working or failing loud.
             raise e
 
+        # Email written in the same transaction, sent after commit
+        send_mission_creation_alert(m)
         db.session.commit()
 
-        # Alerting
-        try:
-            vehicle = Vehicle.query.get(data["vehiculeId"])
-            send_mission_creation_alert(m, vehicle)
-        except Exception as e:
-            print(f"Error triggering alert: { e}")
-
         from ..utils.notification_utils import create_notification
         create_notification(
             title="Nouvelle mission créée",
@@ -214,7 +209,7 @@ def create_mission():
         )
 
         from ..utils import log_action
-        log_action(action="Création", entite="Mission", entite_id=m.id, details=f"Mission {m.reference} créée ({m.lieu_depart} -> {m.lieu_destination})")
+        log_action(action="Création", entite="Mission", entite_id=m.id, details=f"Mission {m.reference} créée ({m.lieu_depart} -> {m.lieu_destination})", payload={"vehicleIds": [m.vehicule_id]})
 
         return jsonify(mission_to_dict(m)), 201
         
@@ -298,6 +293,9 @@ def update_mission(mission_id: str):
         m.kilometre_parcouru = 0
 
     try:
+        # Email written in the same transaction as the state change, sent after commit
+        if old_state != m.state:
+            send_mission_status_notification(m, old_state)
         db.session.commit()
         
         # Alerting if state changed
@@ -327,42 +325,43 @@ def update_mission(mission_id: str):
                      print(f"[MISSION DEBUG] Vehicle status updated to: disponible")
              
              if m.state in ['annule', 'rejeter']:
-                 Planning.query.filter_by(mission_id=m.id).delete()
+                 for p in Planning.query.filter_by(mission_id=m.id).all():
+                     db.session.delete(p)
                  db.session.commit()
                  print(f"[MISSION DEBUG] Associated planning entries deleted for mission {m.id}")
 
-             # Now handle notifications and emails
-             try:
-                vehicle = Vehicle.query.get(m.vehicule_id)
-                send_mission_status_notification(m, vehicle)
-             except Exception as e:
-                print(f"Error triggering mission status alert: { e}")
-
-             from ..utils.notification_utils import create_notification
+             # Now handle notifications
+             from ..utils.notification_utils import create_notifications
              # Notify direction
-             create_notification(
-                 title="Mise à jour de mission",
-                 message=f"La mission {m.reference} est désormais {m.state}.",
-                 type="info",
-                 target_role="admin,direction",
-                 link="/missions"
-             )
+             notifications = [{
+                 "title": "Mise à jour de mission",
+                 "message": f"La mission {m.reference} est désormais {m.state}.",
+                 "type": "info",
+                 "target_role": "admin,direction",
+                 "link": "/missions"
+             }]
              
              # Notify driver if user exists
              driver = Driver.query.get(m.conducteur_id)
              if driver:
                  user = User.query.filter_by(email=driver.email).first()
                  if user:
-                     create_notification(
-                         title="Statut de votre mission",
-                         message=f"Votre mission {m.reference} est passée à l'état : {m.state}.",
-                         type="info",
-                         target_user_id=user.id,
-                         link="/missions"
-                     )
+                     notifications.append({
+                         "title": "Statut de votre mission",
+                         "message": f"Votre mission {m.reference} est passée à l'état : {m.state}.",
+                         "type": "info",
+                         "target_user_id": user.id,
+                         "link": "/missions"
+                     })
+             try:
+                create_notifications(notifications)
+                db.session.commit()
+             except Exception as e:
+                db.session.rollback()
+                print(f"Error creating mission notifications: {e}")
              
              from ..utils import log_action
-             log_action(action="Changement Statut", entite="Mission", entite_id=m.id, details=f"Mission {m.reference} passée à {m.state}")
+             log_action(action="Changement Statut", entite="Mission", entite_id=m.id, details=f"Mission {m.reference} passée à {m.state}", payload={"vehicleIds": [m.vehicule_id]})
                  
         return jsonify(mission_to_dict(m)), 200
     except Exception as e:
@@ -380,14 +379,15 @@ def delete_mission(mission_id: str):
     if user and user.role not in ['admin', 'technician'] and m.created_by_id != user.id:
         return jsonify({"error": "Vous n'avez pas la permission de supprimer cette mission"}), 403
 
-    # Delete associated planning entries
-    Planning.query.filter_by(mission_id=mission_id).delete()
+    # Delete associated planning entries (ORM delete so the change feed records tombstones)
+    for p in Planning.query.filter_by(mission_id=mission_id).all():
+        db.session.delete(p)
 
     db.session.delete(m)
     db.session.commit()
     
     from ..utils import log_action
-    log_action(action="Suppression", entite="Mission", entite_id=mission_id, details=f"Mission {m.reference} supprimée")
+    log_action(action="Suppression", entite="Mission", entite_id=mission_id, details=f"Mission {m.reference} supprimée", payload={"vehicleIds": [m.vehicule_id]})
     
     return jsonify({"deleted": True}), 200
 
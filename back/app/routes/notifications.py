@@ -1,40 +1,44 @@
-from flask import Blueprint, jsonify, request
-from ..models import Notification, NotificationRead, User, db
-from datetime import datetime
-from sqlalchemy import or_, and_, outerjoin
+from flask import Blueprint, jsonify, request, current_app
+from ..models import Notification, NotificationInbox, NotificationArchive, NotificationInboxArchive, db
+from datetime import datetime, timedelta
+from sqlalchemy import func, or_, and_
+from ..utils.notification_utils import cached_badge_counts, BADGE_ROLES
+from ..utils.auth_utils import get_request_token, authenticate, current_user_from_request
 
 bp = Blueprint("notifications", __name__)
 
+ARCHIVE_PAGE_SIZE = 50
+ARCHIVE_MAX_PAGE_SIZE = 200
+
+
+def hot_cutoff():
+    """Les lectures courantes restent bornées à la période de rétention, même si l'archivage a du retard."""
+    return datetime.utcnow() - timedelta(days=current_app.config["NOTIFICATION_RETENTION_DAYS"])
+
 @bp.get("/")
 def get_notifications():
     """
     Récupère les notifications pour l'utilisateur actuel.
     """
-    auth_header = request.headers.get('Authorization')
-    if not auth_header:
+    token = get_request_token()
+    if not token:
         return jsonify({"error": "Unauthorized"}), 401
     
-    token = auth_header.split(" ")[1] if " " in auth_header else auth_header
-    user = User.query.filter_by(token=token).first()
+    user = authenticate(token)
     
     if not user:
         return jsonify({"error": "User not found"}), 404
 
-    # Les notifications ciblées sur son rôle (gestion des rôles multiples séparés par virgule) OU sur son ID utilisateur spécifique
-    notifications = Notification.query.filter(
-        or_(
-            Notification.target_role == user.role,
-            Notification.target_role.like(f"%{user.role}%"),
-            Notification.target_user_id == user.id,
-            and_(Notification.target_role.is_(None), Notification.target_user_id.is_(None)) # System-wide
-        )
-    ).order_by(Notification.timestamp.desc()).limit(50).all()
-
-    # Récupérer les IDs des notifications lues
-    read_notification_ids = [r.notification_id for r in NotificationRead.query.filter_by(user_id=user.id).all()]
+    # Boîte de réception de l'utilisateur : une seule requête sur l'index (user_id, created_at)
+    rows = db.session.query(Notification, NotificationInbox.is_read).join(
+        NotificationInbox, NotificationInbox.notification_id == Notification.id
+    ).filter(
+        NotificationInbox.user_id == user.id,
+        NotificationInbox.created_at >= hot_cutoff()
+    ).order_by(NotificationInbox.created_at.desc()).limit(50).all()
 
     result = []
-    for notif in notifications:
+    for notif, is_read in rows:
         result.append({
             "id": notif.id,
             "title": notif.title,
@@ -42,7 +46,7 @@ def get_notifications():
             "type": notif.type,
             "link": notif.link,
             "timestamp": notif.timestamp.isoformat(),
-            "isRead": notif.id in read_notification_ids
+            "isRead": is_read
         })
 
     return jsonify(result), 200
@@ -52,66 +56,128 @@ def mark_as_read(id):
     """
     Marque une notification comme lue.
     """
-    auth_header = request.headers.get('Authorization')
-    if not auth_header:
+    token = get_request_token()
+    if not token:
         return jsonify({"error": "Unauthorized"}), 401
     
-    token = auth_header.split(" ")[1] if " " in auth_header else auth_header
-    user = User.query.filter_by(token=token).first()
+    user = authenticate(token)
     
     if not user:
         return jsonify({"error": "User not found"}), 404
 
-    existing_read = NotificationRead.query.filter_by(user_id=user.id, notification_id=id).first()
-    if not existing_read:
-        new_read = NotificationRead(
-            user_id=user.id,
-            notification_id=id,
-            read_at=datetime.utcnow()
-        )
-        db.session.add(new_read)
-        db.session.commit()
+    NotificationInbox.query.filter_by(user_id=user.id, notification_id=id, is_read=False).update(
+        {"is_read": True, "read_at": datetime.utcnow()}, synchronize_session=False
+    )
+    db.session.commit()
 
     return jsonify({"success": True}), 200
 
-@bp.get("/badges")
-def get_badge_counts():
-    auth_header = request.headers.get('Authorization')
-    if not auth_header:
-        return jsonify({"missions": 0, "maintenance": 0}), 200
+@bp.post("/read-all")
+def mark_all_as_read():
+    """
+    Marque toutes les notifications de l'utilisateur comme lues (un seul UPDATE).
+    """
+    token = get_request_token()
+    if not token:
+        return jsonify({"error": "Unauthorized"}), 401
     
-    token = auth_header.split(" ")[1] if " " in auth_header else auth_header
-    user = User.query.filter_by(token=token).first()
+    user = authenticate(token)
     
     if not user:
-        return jsonify({"missions": 0, "maintenance": 0}), 200
+        return jsonify({"error": "User not found"}), 404
+
+    updated = NotificationInbox.query.filter_by(user_id=user.id, is_read=False).update(
+        {"is_read": True, "read_at": datetime.utcnow()}, synchronize_session=False
+    )
+    db.session.commit()
+
+    return jsonify({"success": True, "updated": updated}), 200
 
-    mission_count = 0
-    maintenance_count = 0
+@bp.get("/unread-count")
+def get_unread_count():
+    """
+    Nombre de notifications non lues (index (user_id, is_read)).
+    """
+    token = get_request_token()
+    if not token:
+        return jsonify({"error": "Unauthorized"}), 401
     
-    mission_count = 0
-    maintenance_count = 0
-    compliance_count = 0
-    planning_count = 0
+    user = authenticate(token)
     
-    if user.role in ['admin', 'technician']:
-        from ..models import Mission, Maintenance, Compliance, Planning
-        from datetime import date, timedelta
-        
-        mission_count = Mission.query.filter_by(state='nouveau').count()
-        maintenance_count = Maintenance.query.filter_by(statut='en_attente').count()
-        planning_count = Planning.query.filter_by(status='en_attente').count()
-        
-        # Compliance expiring in 30 days or less (including expired)
-        expiry_threshold = date.today() + timedelta(days=30)
-        compliance_count = Compliance.query.filter(
-            Compliance.statut.in_(['valide', 'à_renouveler']), # only active ones
-            Compliance.date_expiration <= expiry_threshold
-        ).count()
-        
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+
+    count = db.session.query(func.count()).select_from(NotificationInbox).filter(
+        NotificationInbox.user_id == user.id,
+        NotificationInbox.is_read.is_(False),
+        NotificationInbox.created_at >= hot_cutoff()
+    ).scalar()
+
+    return jsonify({"unread": count}), 200
+
+@bp.get("/archive")
+def get_archived_notifications():
+    """
+    Historique archivé de l'utilisateur, du plus récent au plus ancien.
+    Pagination par curseur : ?cursor=<nextCursor de la page précédente>&limit=50
+    """
+    token = get_request_token()
+    if not token:
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    user = authenticate(token)
+    
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+
+    limit = min(request.args.get("limit", ARCHIVE_PAGE_SIZE, type=int), ARCHIVE_MAX_PAGE_SIZE)
+    query = db.session.query(NotificationArchive, NotificationInboxArchive.is_read).join(
+        NotificationInboxArchive, NotificationInboxArchive.notification_id == NotificationArchive.id
+    ).filter(NotificationInboxArchive.user_id == user.id)
+
+    cursor = request.args.get("cursor")
+    if cursor:
+        try:
+            ts, last_id = cursor.split("|", 1)
+            ts = datetime.fromisoformat(ts)
+        except ValueError:
+            return jsonify({"error": "Curseur invalide"}), 400
+        query = query.filter(or_(
+            NotificationInboxArchive.created_at < ts,
+            and_(NotificationInboxArchive.created_at == ts, NotificationInboxArchive.notification_id < last_id)
+        ))
+
+    rows = query.order_by(
+        NotificationInboxArchive.created_at.desc(), NotificationInboxArchive.notification_id.desc()
+    ).limit(limit).all()
+
+    items = [{
+        "id": notif.id,
+        "title": notif.title,
+        "message": notif.message,
+        "type": notif.type,
+        "link": notif.link,
+        "timestamp": notif.timestamp.isoformat(),
+        "isRead": is_read
+    } for notif, is_read in rows]
+
+    return jsonify({
+        "items": items,
+        "nextCursor": f"{items[-1]['timestamp']}|{items[-1]['id']}" if len(items) == limit else None
+    }), 200
+
+@bp.get("/badges")
+def get_badge_counts():
+    user = current_user_from_request()
+    if not user:
+        return jsonify({"missions": 0, "maintenance": 0}), 200
+
+    if user.role in BADGE_ROLES:
+        return jsonify(cached_badge_counts()), 200
+
     return jsonify({
-        "missions": mission_count,
-        "maintenance": maintenance_count,
-        "compliance": compliance_count,
-        "planning": planning_count
+        "missions": 0,
+        "maintenance": 0,
+        "compliance": 0,
+        "planning": 0
     }), 200
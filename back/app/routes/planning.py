@@ -1,4 +1,5 @@
 from flask import Blueprint, jsonify, request
+from datetime import datetime, date, timedelta
 
 from .. import db
 from ..models import Planning, Vehicle, Driver, User, Mission
@@ -50,9 +51,91 @@ def planning_to_dict(p: Planning) -> dict:
     return d
 
 
+def parse_window_bound(value: str, end: bool = False) -> datetime:
+    """Borne de fenêtre : datetime ISO, ou date seule (journée entière incluse pour `to`)."""
+    try:
+        if "T" in value:
+            return datetime.fromisoformat(value.replace("Z", "+00:00")).replace(tzinfo=None)
+        d = date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Date invalide: {value}")
+    bound = datetime(d.year, d.month, d.day)
+    return bound + timedelta(days=1) if end else bound
+
+
+def bucket_key(day: date, group: str) -> str:
+    if group == "week":
+        year, week, _ = day.isocalendar()
+        return f"{year}-W{week:02d}"
+    return day.isoformat()
+
+
+def group_planning(items, group: str, window_start=None, window_end=None) -> list:
+    """Regroupe les réservations par jour ou semaine (une réservation multi-jours apparaît dans chaque seau)."""
+    step = timedelta(days=7 if group == "week" else 1)
+    buckets = {}
+    for p in items:
+        start = max(p.date_debut, window_start) if window_start else p.date_debut
+        end = min(p.date_fin, window_end) if window_end else p.date_fin
+        day = start.date()
+        if group == "week":
+            day -= timedelta(days=day.weekday())
+        last = max(end - timedelta(microseconds=1), start).date()
+        payload = planning_to_dict(p)
+        while day <= last:
+            key = bucket_key(day, group)
+            bucket = buckets.setdefault(key, {
+                "key": key,
+                "start": day.isoformat(),
+                "end": (day + step).isoformat(),
+                "items": [],
+            })
+            bucket["items"].append(payload)
+            day += step
+    return [buckets[k] for k in sorted(buckets)]
+
+
 @bp.get("/")
 def list_planning():
-    items = Planning.query.order_by(Planning.priorite.asc(), Planning.date_debut.asc()).all()
+    """
+    Liste du planning, éventuellement restreinte à une fenêtre :
+    /api/planning?from=&to=&vehicle=&status=a,b&group=day|week
+    Les réservations qui chevauchent la fenêtre sont renvoyées.
+    """
+    date_from = request.args.get("from")
+    date_to = request.args.get("to")
+    vehicle_id = request.args.get("vehicle")
+    status = request.args.get("status")
+    group = request.args.get("group")
+
+    if group and group not in ("day", "week"):
+        return jsonify({"error": "group doit valoir 'day' ou 'week'"}), 400
+
+    query = Planning.query
+    try:
+        window_start = parse_window_bound(date_from) if date_from else None
+        window_end = parse_window_bound(date_to, end=True) if date_to else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if window_end:
+        query = query.filter(Planning.date_debut < window_end)
+    if window_start:
+        query = query.filter(Planning.date_fin >= window_start)
+    if vehicle_id:
+        query = query.filter(Planning.vehicule_id == vehicle_id)
+    if status:
+        query = query.filter(Planning.status.in_(status.split(",")))
+
+    items = query.order_by(Planning.priorite.asc(), Planning.date_debut.asc()).all()
+
+    if group:
+        return jsonify({
+            "group": group,
+            "from": window_start.isoformat() if window_start else None,
+            "to": window_end.isoformat() if window_end else None,
+            "buckets": group_planning(items, group, window_start, window_end),
+        }), 200
     return jsonify([planning_to_dict(p) for p in items]), 200
 
 
@@ -166,14 +249,10 @@ def create_planning():
         mission_id=mission_id
     )
     db.session.add(p)
+    # Email written in the same transaction, sent after commit
+    send_planning_creation_alert(p)
     db.session.commit()
 
-    # Alerting
-    try:
-        send_planning_creation_alert(p, vehicle)
-    except Exception as e:
-        print(f"Error triggering alert: {e}")
-
     from ..utils.notification_utils import create_notification
     create_notification(
         title="Nouvelle demande de réservation",
@@ -184,7 +263,7 @@ def create_planning():
     )
 
     from ..utils import log_action
-    log_action(action="Création", entite="Planning", entite_id=p.id, details=f"Demande de réservation {p.type} pour {vehicle.immatriculation}")
+    log_action(action="Création", entite="Planning", entite_id=p.id, details=f"Demande de réservation {p.type} pour {vehicle.immatriculation}", payload={"vehicleIds": [p.vehicule_id]})
 
     return jsonify(planning_to_dict(p)), 201
 
@@ -306,6 +385,10 @@ def update_planning(planning_id: str):
             m.heure_retour = p.date_fin.hour + p.date_fin.minute / 60.0
             m.vehicule_id = p.vehicule_id
             m.conducteur_id = p.conducteur_id
+
+        # Email written in the same transaction as the status change, sent after commit
+        if old_status != p.status:
+            send_planning_status_notification(p, old_status)
         db.session.commit()
 
         vehicle = p.vehicle
@@ -323,11 +406,6 @@ def update_planning(planning_id: str):
             
             db.session.commit()
 
-            try:
-                send_planning_status_notification(p, vehicle)
-            except Exception as e:
-                print(f"Error triggering status alert: {e}")
-
         from ..utils.notification_utils import create_notification
         status_label = "acceptée" if p.status == 'acceptee' else "rejetée" if p.status == 'rejetee' else p.status
         create_notification(
@@ -339,7 +417,7 @@ def update_planning(planning_id: str):
         )
 
         from ..utils import log_action
-        log_action(action="Modification", entite="Planning", entite_id=p.id, details=f"Mise à jour réservation {p.type} (Statut: {p.status})")
+        log_action(action="Modification", entite="Planning", entite_id=p.id, details=f"Mise à jour réservation {p.type} (Statut: {p.status})", payload={"vehicleIds": [p.vehicule_id]})
 
         return jsonify(planning_to_dict(p)), 200
     except Exception as e:
@@ -375,8 +453,234 @@ def delete_planning(planning_id: str):
         return jsonify({"error": f"Erreur lors de la suppression: {str(e)}"}), 500
     
     from ..utils import log_action
-    log_action(action="Suppression", entite="Planning", entite_id=planning_id_str, details=f"Suppression réservation {planning_type} pour {vehicle_immat}")
+    log_action(action="Suppression", entite="Planning", entite_id=planning_id_str, details=f"Suppression réservation {planning_type} pour {vehicle_immat}", payload={"vehicleIds": [p.vehicule_id]})
     
     return jsonify({"deleted": True}), 200
 
 
+
+
+def _maintenance_slot(m):
+    """Créneau [début, fin) occupé par une maintenance (journées entières)."""
+    start = datetime.combine(m.date_prevue, datetime.min.time())
+    end = datetime.combine(m.date_realisation or m.date_prevue, datetime.min.time()) + timedelta(days=1)
+    return start, end
+
+
+def _active_maintenances(window_start, window_end, vehicle_ids=None):
+    """Maintenances acceptées ou en cours qui chevauchent la fenêtre."""
+    from ..models import Maintenance
+
+    query = Maintenance.query.options(db.lazyload("*")).filter(
+        Maintenance.statut.in_(['accepte', 'en_cours']),
+        Maintenance.date_prevue <= window_end.date(),
+        db.func.coalesce(Maintenance.date_realisation, Maintenance.date_prevue) >= window_start.date(),
+    )
+    if vehicle_ids is not None:
+        query = query.filter(Maintenance.vehicule_id.in_(vehicle_ids))
+    return query.all()
+
+
+def _load_solver_inputs(window_start, window_end):
+    """Charge les demandes en attente de la fenêtre et les créneaux déjà engagés."""
+    pending = Planning.query.filter(
+        Planning.status == 'en_attente',
+        Planning.date_debut < window_end,
+        Planning.date_fin > window_start,
+    ).all()
+
+    # Les véhicules et conducteurs chargent leurs collections en selectin : inutile ici
+    vehicles = Vehicle.query.options(db.lazyload("*")).all()
+    drivers = Driver.query.options(db.lazyload("*")).filter(Driver.statut == 'actif').all()
+
+    accepted = Planning.query.filter(
+        Planning.status == 'acceptee',
+        Planning.date_debut < window_end,
+        Planning.date_fin > window_start,
+    ).all()
+    maintenances = _active_maintenances(window_start, window_end)
+
+    vehicle_busy, driver_busy = {}, {}
+    for p in accepted:
+        vehicle_busy.setdefault(p.vehicule_id, []).append((p.date_debut, p.date_fin))
+        if p.conducteur_id:
+            driver_busy.setdefault(p.conducteur_id, []).append((p.date_debut, p.date_fin))
+    for m in maintenances:
+        vehicle_busy.setdefault(m.vehicule_id, []).append(_maintenance_slot(m))
+
+    requests = [{
+        "id": p.id,
+        "vehicule_id": p.vehicule_id,
+        "conducteur_id": p.conducteur_id,
+        "start": p.date_debut,
+        "end": p.date_fin,
+        "priorite": p.priorite if p.priorite is not None else 3,
+        "zone": p.zone,
+        "numero_om": p.numero_om,
+        "type": p.type,
+    } for p in pending]
+    vehicle_rows = [{"id": v.id, "type_vehicule": v.type_vehicule, "statut": v.statut} for v in vehicles]
+    driver_rows = [{"id": d.id, "vehicule_assigne_id": d.vehicule_assigne_id} for d in drivers]
+    return requests, vehicle_rows, driver_rows, vehicle_busy, driver_busy
+
+
+@bp.post("/auto-assign")
+@token_required
+def auto_assign_planning():
+    """
+    Propose une affectation véhicule/conducteur pour toutes les demandes en attente d'une fenêtre.
+    Rien n'est enregistré : la proposition se valide via /auto-assign/commit.
+    """
+    import time
+    from ..utils.planning_solver import AutoAssignSolver
+
+    user = get_current_user()
+    if user.role not in ['admin', 'technician']:
+        return jsonify({"error": "Vous n'avez pas la permission d'affecter les réservations"}), 403
+
+    data = request.get_json() or {}
+    try:
+        window_start = parse_window_bound(data["from"]) if data.get("from") else datetime.combine(date.today(), datetime.min.time())
+        window_end = parse_window_bound(data["to"], end=True) if data.get("to") else window_start + timedelta(days=30)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    started = time.perf_counter()
+    requests, vehicles, drivers, vehicle_busy, driver_busy = _load_solver_inputs(window_start, window_end)
+    loaded = time.perf_counter()
+
+    solver = AutoAssignSolver(requests, vehicles, drivers, vehicle_busy, driver_busy)
+    assignments, unassigned = solver.solve(improve=data.get("improve", True))
+    solved = time.perf_counter()
+
+    return jsonify({
+        "from": window_start.isoformat(),
+        "to": window_end.isoformat(),
+        "assignments": assignments,
+        "unassigned": unassigned,
+        "stats": {
+            "requests": len(requests),
+            "assigned": len(assignments),
+            "loadMs": round((loaded - started) * 1000, 2),
+            "solveMs": round((solved - loaded) * 1000, 2),
+        },
+    }), 200
+
+
+@bp.post("/auto-assign/commit")
+@token_required
+def commit_auto_assign():
+    """Valide une proposition d'affectation en une seule transaction (tout ou rien)."""
+    from ..utils.planning_solver import UNAVAILABLE_VEHICLE_STATUSES
+
+    user = get_current_user()
+    if user.role not in ['admin', 'technician']:
+        return jsonify({"error": "Vous n'avez pas la permission d'affecter les réservations"}), 403
+
+    assignments = (request.get_json() or {}).get("assignments") or []
+    if not assignments:
+        return jsonify({"error": "Aucune affectation fournie"}), 400
+
+    try:
+        ids = [a.get("planningId") for a in assignments]
+        items = {p.id: p for p in Planning.query.filter(Planning.id.in_(ids)).with_for_update().all()}
+        vehicles = {v.id: v for v in Vehicle.query.options(db.lazyload("*")).filter(
+            Vehicle.id.in_({a.get("vehiculeId") for a in assignments if a.get("vehiculeId")}
+                           | {p.vehicule_id for p in items.values()})).all()}
+        driver_ids = {d for (d,) in db.session.query(Driver.id).filter(
+            Driver.id.in_({a.get("conducteurId") for a in assignments if a.get("conducteurId")})).all()}
+
+        unknown = [a.get("planningId") for a in assignments
+                   if (a.get("vehiculeId") and a["vehiculeId"] not in vehicles)
+                   or (a.get("conducteurId") and a["conducteurId"] not in driver_ids)]
+        if unknown:
+            db.session.rollback()
+            return jsonify({"error": "Véhicule ou conducteur inconnu", "planningIds": unknown}), 400
+
+        conflicts = []
+        proposed = []
+        for a in assignments:
+            p = items.get(a.get("planningId"))
+            if not p or p.status != 'en_attente':
+                conflicts.append({"planningId": a.get("planningId"), "reason": "Réservation introuvable ou déjà traitée"})
+                continue
+            # Sans conducteur proposé, celui déjà choisi sur la demande est conservé
+            proposed.append((p, a.get("vehiculeId") or p.vehicule_id, a.get("conducteurId") or p.conducteur_id))
+
+        if proposed:
+            maintenances = _active_maintenances(
+                min(p.date_debut for p, _, _ in proposed),
+                max(p.date_fin for p, _, _ in proposed),
+                {vehicle_id for _, vehicle_id, _ in proposed},
+            )
+        else:
+            maintenances = []
+
+        # Revalider comme le solveur : véhicule disponible, pas de maintenance, pas de réservation
+        # acceptée entre-temps ni de chevauchement au sein du lot
+        for i, (p, vehicle_id, driver_id) in enumerate(proposed):
+            if vehicles[vehicle_id].statut in UNAVAILABLE_VEHICLE_STATUSES:
+                conflicts.append({"planningId": p.id, "reason": "Véhicule indisponible"})
+                continue
+            in_maintenance = any(
+                m.vehicule_id == vehicle_id and start < p.date_fin and end > p.date_debut
+                for m in maintenances for start, end in [_maintenance_slot(m)]
+            )
+            if in_maintenance:
+                conflicts.append({"planningId": p.id, "reason": "Véhicule en maintenance sur ce créneau"})
+                continue
+            clash = Planning.query.filter(
+                Planning.status == 'acceptee',
+                Planning.date_debut < p.date_fin,
+                Planning.date_fin > p.date_debut,
+                db.or_(Planning.vehicule_id == vehicle_id,
+                       db.and_(Planning.conducteur_id.isnot(None), Planning.conducteur_id == driver_id)),
+            ).first()
+            overlapping = [
+                q for q, other_vehicle, other_driver in proposed[:i]
+                if q.date_debut < p.date_fin and q.date_fin > p.date_debut
+                and (other_vehicle == vehicle_id or (driver_id and other_driver == driver_id))
+            ]
+            if clash or overlapping:
+                conflicts.append({"planningId": p.id, "reason": "Créneau déjà occupé"})
+
+        if conflicts:
+            db.session.rollback()
+            return jsonify({"error": "Conflits détectés, aucune affectation enregistrée", "conflicts": conflicts}), 409
+
+        from ..utils.notification_utils import create_notifications
+
+        for p, vehicle_id, driver_id in proposed:
+            p.vehicule_id = vehicle_id
+            p.conducteur_id = driver_id
+            p.status = 'acceptee'
+            if p.mission:
+                p.mission.vehicule_id = vehicle_id
+                if driver_id:
+                    p.mission.conducteur_id = driver_id
+            vehicle = vehicles[vehicle_id]
+            if p.type in ['mission', 'reserve']:
+                vehicle.statut = 'reserve'
+            elif p.type == 'maintenance':
+                vehicle.statut = 'en_maintenance'
+
+        # Notifications des demandeurs dans la même transaction que les affectations
+        create_notifications([{
+            "title": "Réservation acceptée",
+            "message": f"Votre réservation ({p.type}) pour le véhicule {vehicles[vehicle_id].immatriculation} a été acceptée.",
+            "type": "success",
+            "target_user_id": p.created_by_id,
+            "link": "/planning"
+        } for p, vehicle_id, _ in proposed if p.created_by_id])
+        for p, _, _ in proposed:
+            send_planning_status_notification(p, 'en_attente')
+
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"Erreur lors de l'affectation: {str(e)}"}), 500
+
+    from ..utils import log_action
+    log_action(action="Modification", entite="Planning", entite_id="auto-assign", details=f"Affectation automatique de {len(proposed)} réservation(s)")
+
+    return jsonify({"committed": len(proposed), "items": [planning_to_dict(p) for p, _, _ in proposed]}), 200
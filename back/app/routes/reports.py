@@ -1,49 +1,34 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request, send_file, g
 from sqlalchemy import func
 from datetime import date
 from collections import defaultdict
+import json
+import tempfile
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
 
 from .. import db
-from ..models import Vehicle, FuelEntry, Maintenance
+from ..models import Vehicle, FuelEntry, Maintenance, CostCube
+from ..utils.auth_utils import token_required
+from ..utils.cost_cube import cube_query
+from ..utils.report_jobs import REPORTS, register_report, report_response, submit_report, get_job, job_to_dict
 
 bp = Blueprint("reports", __name__)
 
-@bp.get("/global_summary")
-def get_global_summary():
-    vehicles = Vehicle.query.all()
+MONTH_NAMES = ["Jan", "Fév", "Mar", "Avr", "Mai", "Juin", "Juil", "Août", "Sep", "Oct", "Nov", "Déc"]
+
+def build_global_summary():
+    """Lignes du récapitulatif global (une par véhicule) et années couvertes."""
+    vehicles = Vehicle.query.options(db.lazyload("*")).all()
     
     # 1. Aggregate Costs per Vehicle per Year
     # We want Total Cost = Fuel + Maintenance for each year 2018-2025
-    
-    # Fuel: {(vid, year, month): cost}
-    fuel_stats = db.session.query(
-        FuelEntry.vehicule_id,
-        func.extract('year', FuelEntry.date).label('year'),
-        func.extract('month', FuelEntry.date).label('month'),
-        func.sum(FuelEntry.total_achete).label('total_cost')
-    ).group_by(
-        FuelEntry.vehicule_id, 
-        func.extract('year', FuelEntry.date),
-        func.extract('month', FuelEntry.date)
+    # Les montants mensuels viennent du cube de coûts (tenu à jour à chaque écriture)
+    cells = cube_query(categories=("fuel", "maintenance")).with_entities(
+        CostCube.vehicle_id, CostCube.year, CostCube.month, CostCube.category, CostCube.amount
     ).all()
-
-    # Maintenance: {(vid, year, month): cost}
-    maintenance_stats = db.session.query(
-        Maintenance.vehicule_id,
-        func.extract('year', Maintenance.date_demande).label('year'),
-        func.extract('month', Maintenance.date_demande).label('month'),
-        func.sum(Maintenance.cout).label('total_cost')
-    ).group_by(
-        Maintenance.vehicule_id, 
-        func.extract('year', Maintenance.date_demande),
-        func.extract('month', Maintenance.date_demande)
-    ).all()
-    
-    # Total Maintenance Lifetime: {vid: total_cost}
-    total_maintenance_lifetime = db.session.query(
-        Maintenance.vehicule_id,
-        func.sum(Maintenance.cout).label('total_cost')
-    ).group_by(Maintenance.vehicule_id).all()
     
     # Process into dictionaries
     monthly_details = defaultdict(lambda: defaultdict(lambda: defaultdict(float)))
@@ -55,29 +40,14 @@ def get_global_summary():
     # Track all years encountered in data
     all_years = {date.today().year}
 
-    for vid, year, month, cost in fuel_stats:
-        if cost is not None and year is not None:
-            y, m = int(year), int(month)
-            c = float(cost)
-            vehicle_year_costs[vid][y] += c
-            monthly_details[vid][y][m] += c
+    for vid, y, m, category, c in cells:
+        vehicle_year_costs[vid][y] += c
+        monthly_details[vid][y][m] += c
+        if category == "fuel":
             vehicle_fuel_lifetime[vid] += c
-            all_years.add(y)
-
-    for vid, year, month, cost in maintenance_stats:
-        if cost is not None and year is not None:
-            y, m = int(year), int(month)
-            c = float(cost)
-            vehicle_year_costs[vid][y] += c
-            monthly_details[vid][y][m] += c
+        else:
             vehicle_maintenance_lifetime[vid] += c
-            all_years.add(y)
-
-    # Backup: insure lifetime maintenance covers even entries without dates if any
-    for vid, cost in total_maintenance_lifetime:
-        if cost:
-            # We use the separate query for absolute total maintenance
-            vehicle_maintenance_lifetime[vid] = float(cost)
+        all_years.add(y)
             
     summary_data = []
     current_year = date.today().year
@@ -122,10 +92,102 @@ def get_global_summary():
             
         summary_data.append(row)
 
-    return jsonify(summary_data), 200
+    return summary_data, year_range
 
-@bp.get("/stats")
-def get_reports_stats():
+
+@register_report("global_summary", entities=("vehicles", "fuel", "maintenance"))
+def global_summary_report(params):
+    summary_data, _ = build_global_summary()
+    return summary_data
+
+
+def summary_years(summary_data):
+    """Années couvertes par les lignes du récapitulatif (colonnes cost_YYYY)."""
+    if not summary_data:
+        return list(range(2018, date.today().year + 1))
+    return sorted(int(key[5:]) for key in summary_data[0] if key.startswith("cost_"))
+
+
+@bp.get("/global_summary")
+def get_global_summary():
+    return report_response("global_summary")
+
+
+def write_global_summary_xlsx(summary_data, year_range):
+    """
+    Classeur en mode write-only : les lignes sont écrites au fil de l'eau dans des
+    fichiers temporaires (mémoire constante). Retourne un fichier temporaire prêt à lire.
+    """
+    wb = Workbook(write_only=True)
+    bold = Font(bold=True)
+
+    def header(ws, titles):
+        cells = []
+        for title in titles:
+            cell = WriteOnlyCell(ws, value=title)
+            cell.font = bold
+            cells.append(cell)
+        ws.append(cells)
+
+    ws = wb.create_sheet("Récapitulatif")
+    ws.freeze_panes = "B2"
+    header(ws, [
+        "Immatriculation", "Type", "Marque", "Mise en circulation", "Statut",
+        "Valeur Acquisition", "Année Acquisition", "Ancienneté",
+        *[str(year) for year in year_range],
+        "Coût Total Maintenance", "Coût Total Carburant", "Coût Global",
+    ])
+    for row in summary_data:
+        ws.append([
+            row["immatriculation"], row["type_vehicule"], row["marque"],
+            row["annee_mise_circulation"], row["statut"],
+            row["valeur_acquisition"], row["annee_acquisition"], row["anciennete"],
+            *[row[f"cost_{year}"] for year in year_range],
+            row["total_maintenance"], row["total_fuel"], row["total_global"],
+        ])
+
+    # Une feuille par année : détail mensuel par véhicule
+    for year in year_range:
+        ws = wb.create_sheet(str(year))
+        ws.freeze_panes = "B2"
+        header(ws, ["Immatriculation", "Marque", *MONTH_NAMES, "Total"])
+        for row in summary_data:
+            # Clés en texte : le résultat stocké a fait un aller-retour JSON
+            months = row["monthly_details"].get(str(year), {})
+            ws.append([
+                row["immatriculation"], row["marque"],
+                *[months.get(str(m), 0) for m in range(1, 13)],
+                row[f"cost_{year}"],
+            ])
+
+    output = tempfile.TemporaryFile()
+    wb.save(output)
+    output.seek(0)
+    return output
+
+
+@bp.get("/global_summary.xlsx")
+def export_global_summary_xlsx():
+    job = submit_report("global_summary")
+    if job.status != "done":
+        # Récapitulatif en cours de calcul : le client suit le job puis relance l'export
+        return jsonify(job_to_dict(job)), 202
+    summary_data = json.loads(job.result)
+    year_range = summary_years(summary_data)
+
+    # Les données agrégées sont en mémoire : libérer la connexion avant d'écrire le classeur
+    db.session.remove()
+
+    output = write_global_summary_xlsx(summary_data, year_range)
+    return send_file(
+        output,
+        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        as_attachment=True,
+        download_name=f"recapitulatif_flotte_{date.today().isoformat()}.xlsx",
+    )
+
+@register_report("stats", entities=("vehicles", "missions", "fuel", "maintenance"))
+def build_reports_stats(params):
     from ..models import Mission
     today = date.today()
     current_year = today.year
@@ -133,15 +195,14 @@ def get_reports_stats():
     # --- 1. Summary Cards (KPIs) ---
     total_vehicles = Vehicle.query.count()
     
-    # Annual fuel (current year)
-    annual_fuel = db.session.query(func.sum(FuelEntry.quantite_achetee)).filter(
-        func.extract('year', FuelEntry.date) == current_year
-    ).scalar() or 0
-    
-    # Total maintenance count (current year)
-    total_maintenance_count = Maintenance.query.filter(
-        func.extract('year', Maintenance.date_demande) == current_year
-    ).count()
+    # Annual fuel and maintenance count (current year), read from the cost cube
+    current = cube_query(categories=("fuel", "maintenance"), year=current_year).with_entities(
+        CostCube.month, CostCube.category,
+        func.sum(CostCube.amount), func.sum(CostCube.quantity), func.sum(CostCube.entries)
+    ).group_by(CostCube.month, CostCube.category).all()
+
+    annual_fuel = sum(q or 0 for _, category, _, q, _ in current if category == "fuel")
+    total_maintenance_count = int(sum(n or 0 for _, category, _, _, n in current if category == "maintenance"))
     
     # Availability: (Total - In Maintenance) / Total
     in_maintenance = Vehicle.query.filter(Vehicle.statut == 'technique').count()
@@ -151,27 +212,14 @@ def get_reports_stats():
     # ... (skipping complex trend logic for now)
 
     # --- 2. Monthly Costs (Fuel + Maintenance) ---
-    # Monthly Fuel Costs
-    monthly_fuel = db.session.query(
-        func.extract('month', FuelEntry.date).label('month'),
-        func.sum(FuelEntry.total_achete).label('cost')
-    ).filter(func.extract('year', FuelEntry.date) == current_year).group_by(func.extract('month', FuelEntry.date)).all()
-    
-    # Monthly Maintenance Costs
-    monthly_maint = db.session.query(
-        func.extract('month', Maintenance.date_demande).label('month'),
-        func.sum(Maintenance.cout).label('cost')
-    ).filter(func.extract('year', Maintenance.date_demande) == current_year).group_by(func.extract('month', Maintenance.date_demande)).all()
-    
-    month_names = ["Jan", "Fév", "Mar", "Avr", "Mai", "Juin", "Juil", "Août", "Sep", "Oct", "Nov", "Déc"]
     cost_data = []
     
-    fuel_map = {int(m): float(c or 0) for m, c in monthly_fuel}
-    maint_map = {int(m): float(c or 0) for m, c in monthly_maint}
+    fuel_map = {m: float(c or 0) for m, category, c, _, _ in current if category == "fuel"}
+    maint_map = {m: float(c or 0) for m, category, c, _, _ in current if category == "maintenance"}
     
     for i in range(1, 13):
         cost_data.append({
-            "month": month_names[i-1],
+            "month": MONTH_NAMES[i-1],
             "cout": fuel_map.get(i, 0),
             "maintenance": maint_map.get(i, 0)
         })
@@ -201,7 +249,7 @@ def get_reports_stats():
     mission_map = {vid: (count, km) for vid, count, km in mission_stats}
     fuel_perf_map = {vid: float(cons or 0) for vid, cons in fuel_perf}
     
-    vehicles = Vehicle.query.all()
+    vehicles = Vehicle.query.options(db.lazyload("*")).all()
     vehicle_usage = []
     for v in vehicles:
         m_count, m_km = mission_map.get(v.id, (0, 0))
@@ -212,7 +260,7 @@ def get_reports_stats():
             "consumption": round(fuel_perf_map.get(v.id, 0), 1)
         })
 
-    return jsonify({
+    return {
         "summary": {
             "totalVehicles": total_vehicles,
             "annualFuel": annual_fuel,
@@ -222,4 +270,34 @@ def get_reports_stats():
         "costData": cost_data,
         "maintenanceByType": maint_type_data,
         "vehicleUsage": vehicle_usage
-    }), 200
+    }
+
+
+@bp.get("/stats")
+def get_reports_stats():
+    return report_response("stats")
+
+
+@bp.post("/jobs")
+@token_required
+def submit_report_job():
+    """
+    Lance un rapport en arrière-plan : {"report": "stats", "params": {...}}.
+    Renvoie immédiatement le job (avec le résultat s'il est déjà stocké pour cette version des données).
+    """
+    data = request.get_json() or {}
+    report = data.get("report")
+    if report not in REPORTS:
+        return jsonify({"error": f"Rapport inconnu. Disponibles: {', '.join(sorted(REPORTS))}"}), 400
+
+    job = submit_report(report, data.get("params") or {}, g.user.id)
+    return jsonify(job_to_dict(job)), 200 if job.status == "done" else 202
+
+
+@bp.get("/jobs/<job_id>")
+@token_required
+def get_report_job(job_id):
+    job = get_job(job_id)
+    if not job:
+        return jsonify({"error": "Job introuvable"}), 404
+    return jsonify(job_to_dict(job)), 200
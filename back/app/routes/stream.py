@@ -0,0 +1,67 @@
+import json
+import queue
+
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+
+from .. import db
+from ..utils.auth_utils import get_request_token, authenticate
+from ..utils.event_hub import hub
+from ..utils.notification_utils import cached_badge_counts, BADGE_ROLES
+
+bp = Blueprint("stream", __name__)
+
+CHANNELS = ("planning", "notifications", "badges")
+
+# Commentaire envoyé régulièrement pour garder la connexion ouverte derrière les proxys
+HEARTBEAT_SECONDS = 15
+
+
+def format_event(event, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@bp.get("")
+def stream_events():
+    """
+    Canal Server-Sent Events : /api/stream?token=<token>&channels=planning,notifications,badges
+    EventSource ne permet pas d'envoyer d'en-têtes, le token peut donc être passé en paramètre.
+    """
+    token = get_request_token(allow_query=True)
+    if not token:
+        return jsonify({'message': 'Le token est manquant !'}), 401
+
+    user = authenticate(token)
+    if not user or user.status != 'active':
+        return jsonify({"error": "Unauthorized"}), 401
+
+    channels = [c for c in (request.args.get("channels") or ",".join(CHANNELS)).split(",") if c in CHANNELS]
+    user_id, role = user.id, user.role
+
+    initial = []
+    if "badges" in channels and role in BADGE_ROLES:
+        initial.append(format_event("badges", cached_badge_counts()))
+
+    # Ne pas garder de connexion à la base pendant toute la durée du flux
+    db.session.remove()
+
+    sub = hub.subscribe(user_id, role, channels)
+
+    def generate():
+        try:
+            yield "retry: 5000\n\n"
+            for chunk in initial:
+                yield chunk
+            while True:
+                try:
+                    message = sub.get(timeout=HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_event(message["event"], message["data"])
+        finally:
+            hub.unsubscribe(sub)
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
@@ -1,15 +1,36 @@
-from flask import Blueprint, jsonify, request
+from datetime import datetime, timedelta
+from flask import Blueprint, jsonify, request, current_app
+from sqlalchemy import and_, or_, select
 from .. import db
-from ..models import User
-from ..utils.auth_utils import token_required
+from ..models import User, TokenRevocation
+from ..utils.auth_utils import token_required, invalidate_user
+from ..utils.session_tokens import revocations
 
 bp = Blueprint("users", __name__)
 
+def is_online(now):
+    """
+    En ligne : compte actif, requête authentifiée depuis moins de USER_ONLINE_WINDOW secondes
+    avec un token non expiré, et aucune révocation de toutes ses sessions depuis
+    (la déconnexion efface last_seen_at).
+    """
+    revoked_since = select(TokenRevocation.id).where(
+        TokenRevocation.user_id == User.id,
+        TokenRevocation.jti.is_(None),
+        TokenRevocation.not_before >= User.last_seen_at
+    ).exists()
+    return and_(
+        User.status == 'active',
+        User.last_seen_at >= now - timedelta(seconds=current_app.config["USER_ONLINE_WINDOW"]),
+        or_(User.session_expires_at.is_(None), User.session_expires_at > now),
+        ~revoked_since
+    )
+
 @bp.get("/")
 def get_users():
-    users = User.query.all()
+    rows = db.session.query(User, is_online(datetime.utcnow()).label("is_online")).all()
     result = []
-    for user in users:
+    for user, online in rows:
         result.append({
             "id": user.id,
             "email": user.email,
@@ -19,7 +40,8 @@ def get_users():
             "avatar": user.avatar,
             "createdAt": user.created_at.isoformat() if user.created_at else None,
             "lastLogin": user.last_login.isoformat() if user.last_login else None,
-            "isOnline": True if user.token else False,
+            "emailDigest": user.email_digest,
+            "isOnline": bool(online),
         })
     return jsonify(result), 200
 
@@ -41,7 +63,7 @@ def delete_user(user_id):
 
     try:
         # Import models we need for cleanup
-        from ..models import ActionLog, Maintenance, Mission, Planning, Notification, NotificationRead
+        from ..models import ActionLog, Maintenance, Mission, Planning, Notification, NotificationRead, NotificationInbox, NotificationInboxArchive
         
         # Clean up all related records before deleting user
         # 1. Delete action logs created by this user
@@ -56,15 +78,19 @@ def delete_user(user_id):
         # 4. Update planning to set created_by_id to NULL
         Planning.query.filter_by(created_by_id=user_id).update({"created_by_id": None})
         
-        # 5. Delete notifications targeted to this user
+        # 5. Delete this user's inbox, then notifications targeted to this user
+        NotificationInbox.query.filter_by(user_id=user_id).delete()
+        NotificationInboxArchive.query.filter_by(user_id=user_id).delete()
         Notification.query.filter_by(target_user_id=user_id).delete()
         
         # 6. Delete notification read status for this user
         NotificationRead.query.filter_by(user_id=user_id).delete()
         
-        # Now we can safely delete the user
+        # Now we can safely delete the user, and close all of their sessions
         db.session.delete(user)
+        revocations.revoke_user(user_id)
         db.session.commit()
+        invalidate_user(user_id)
         
         from ..utils import log_action
         log_action(action="Suppression", entite="Utilisateur", entite_id=user_id, details=f"Suppression de l'utilisateur {user.email}")
@@ -103,8 +129,11 @@ def update_user_role(user_id):
         # If user was pending, approving them (changing role) activates them
         if user.status == 'pending':
             user.status = 'active'
+        # Les tokens ouverts portent l'ancien rôle : l'utilisateur devra se reconnecter
+        revocations.revoke_user(user.id)
             
         db.session.commit()
+        invalidate_user(user.id)
         
         from ..utils.notification_utils import create_notification
         create_notification(
@@ -122,3 +151,30 @@ def update_user_role(user_id):
     except Exception as e:
         db.session.rollback()
         return jsonify({"success": False, "error": str(e)}), 500
+
+@bp.put("/<user_id>/email-digest")
+@token_required
+def update_email_digest(user_id):
+    from flask import g
+    from ..utils.email_utils import DIGEST_FREQUENCIES
+
+    # Each user sets their own preference; admins can set it for anyone
+    if not g.user or (g.user.role != 'admin' and g.user.id != user_id):
+        return jsonify({"success": False, "error": "Accès refusé."}), 403
+
+    user = db.session.get(User, user_id)
+    if not user:
+        return jsonify({"success": False, "error": "Utilisateur non trouvé"}), 404
+
+    data = request.get_json() or {}
+    frequency = data.get("emailDigest")
+    if frequency not in DIGEST_FREQUENCIES:
+        return jsonify({"success": False, "error": "Fréquence invalide"}), 400
+
+    try:
+        user.email_digest = frequency
+        db.session.commit()
+        return jsonify({"success": True, "emailDigest": user.email_digest}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"success": False, "error": str(e)}), 500
@@ -170,7 +170,7 @@ def create_vehicle():
         db.session.commit()
 
         from ..utils import log_action
-        log_action(action="Création", entite="Véhicule", entite_id=vehicle.id, details=f"Création du véhicule {vehicle.immatriculation}")
+        log_action(action="Création", entite="Véhicule", entite_id=vehicle.id, details=f"Création du véhicule {vehicle.immatriculation}", payload={"vehicleIds": [vehicle.id]})
 
         return jsonify(vehicle_to_dict(vehicle)), 201
     except ValueError as e:
@@ -288,7 +288,7 @@ def update_vehicle(vehicle_id: str):
         db.session.commit()
 
         from ..utils import log_action
-        log_action(action="Modification", entite="Véhicule", entite_id=vehicle.id, details=f"Modification du véhicule {vehicle.immatriculation}")
+        log_action(action="Modification", entite="Véhicule", entite_id=vehicle.id, details=f"Modification du véhicule {vehicle.immatriculation}", payload={"vehicleIds": [vehicle.id]})
 
         return jsonify(vehicle_to_dict(vehicle)), 200
     except ValueError as e:
@@ -310,7 +310,7 @@ def delete_vehicle(vehicle_id: str):
     db.session.commit()
 
     from ..utils import log_action
-    log_action(action="Suppression", entite="Véhicule", entite_id=vehicle_id, details=f"Suppression du véhicule {vehicle.immatriculation}")
+    log_action(action="Suppression", entite="Véhicule", entite_id=vehicle_id, details=f"Suppression du véhicule {vehicle.immatriculation}", payload={"vehicleIds": [vehicle_id]})
 
     return jsonify({"deleted": True}), 200
 
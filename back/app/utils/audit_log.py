@@ -0,0 +1,136 @@
+"""
+Journal d'audit asynchrone.
+
+log_action() ne fait plus qu'empiler une entrée : un thread par processus insère
+les lignes action_logs par lots (toutes les AUDIT_LOG_FLUSH_MS ms ou dès
+AUDIT_LOG_BATCH entrées), dans sa propre session et sa propre transaction.
+La file est bornée (AUDIT_LOG_BUFFER) : si la base ne suit plus, les nouvelles
+entrées sont abandonnées et comptées plutôt que de bloquer les requêtes.
+La file est vidée à l'arrêt du processus.
+"""
+import atexit
+import os
+import queue
+import threading
+import time
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from .. import db
+from ..models import ActionLog
+
+
+class AuditLogWriter:
+    def __init__(self):
+        self._app = None
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.dropped = 0
+        self.written = 0
+
+    def init_app(self, app):
+        self._app = app
+        self.flush_interval = app.config.get("AUDIT_LOG_FLUSH_MS", 500) / 1000
+        self.batch_size = app.config.get("AUDIT_LOG_BATCH", 200)
+        self._queue = queue.Queue(maxsize=app.config.get("AUDIT_LOG_BUFFER", 10000))
+        atexit.register(self.shutdown)
+
+    def enqueue(self, row):
+        """Empile une ligne action_logs (dict de colonnes) sans toucher à la base."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                print(f"Audit log buffer full: {self.dropped} entries dropped")
+
+    def _ensure_started(self):
+        # Démarré à la première entrée, et redémarré dans un processus fils (fork des workers)
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="audit-log-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._take_batch()
+            if batch:
+                self._write(batch)
+
+    def _take_batch(self):
+        """Attend la première entrée puis complète le lot jusqu'à l'échéance ou la taille maximale."""
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        with self._app.app_context():
+            with Session(db.engine) as session:
+                try:
+                    session.execute(insert(ActionLog), batch)
+                    session.commit()
+                    self.written += len(batch)
+                    return
+                except Exception as e:
+                    session.rollback()
+                    print(f"Error writing audit log batch ({len(batch)} entries): {e}")
+
+                # Une ligne invalide (utilisateur supprimé...) ne doit pas faire perdre tout le lot
+                for row in batch:
+                    try:
+                        session.execute(insert(ActionLog), [row])
+                        session.commit()
+                        self.written += 1
+                    except Exception as e:
+                        session.rollback()
+                        print(f"Error logging action {row.get('action')}: {e}")
+
+    def flush(self):
+        """Écrit immédiatement tout ce qui est en file (scripts, arrêt)."""
+        if self._queue is None:
+            return
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
+        if batch:
+            self._write(batch)
+
+    def shutdown(self):
+        self._stop.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout=self.flush_interval * 2)
+        self.flush()
+
+
+audit_log = AuditLogWriter()
+
+
+def init_audit_log(app):
+    audit_log.init_app(app)
@@ -1,18 +1,215 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from datetime import datetime
 from functools import wraps
-from flask import request, jsonify, g
+from flask import request, jsonify, g, current_app
+from itsdangerous import BadSignature
+from sqlalchemy import update
+from .. import db
 from ..models import User
+from .change_feed import register_commit_listener
+from .session_tokens import decode_token, token_expiry
+
+# Ce que l'authentification doit connaître d'un utilisateur
+AuthEntry = namedtuple("AuthEntry", ["id", "role", "status"])
+
+
+class AuthCache:
+    """
+    Cache des anciens tokens aléatoires (users.token), les tokens signés se vérifiant sans la base.
+    Token -> AuthEntry du worker : TTL court (AUTH_CACHE_TTL) et éviction LRU
+    au-delà de AUTH_CACHE_SIZE entrées. Invalidé par utilisateur à chaque commit qui
+    touche la table users ; le TTL borne le délai pour les écritures des autres workers.
+    """
+
+    def __init__(self):
+        self._data = OrderedDict()
+        self._by_user = {}
+        self._lock = threading.Lock()
+
+    def get(self, token):
+        with self._lock:
+            item = self._data.get(token)
+            if item is None:
+                return None
+            entry, expires_at = item
+            if expires_at < time.monotonic():
+                self._remove(token)
+                return None
+            self._data.move_to_end(token)
+            return entry
+
+    def set(self, token, entry):
+        ttl = current_app.config.get("AUTH_CACHE_TTL", 30)
+        max_size = current_app.config.get("AUTH_CACHE_SIZE", 5000)
+        with self._lock:
+            self._remove(token)
+            self._data[token] = (entry, time.monotonic() + ttl)
+            self._by_user.setdefault(entry.id, set()).add(token)
+            while len(self._data) > max_size:
+                self._remove(next(iter(self._data)))
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for token in list(self._by_user.get(user_id, ())):
+                self._remove(token)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._by_user.clear()
+
+    def _remove(self, token):
+        item = self._data.pop(token, None)
+        if item is not None:
+            tokens = self._by_user.get(item[0].id)
+            if tokens is not None:
+                tokens.discard(token)
+                if not tokens:
+                    del self._by_user[item[0].id]
+
+
+auth_cache = AuthCache()
+
+
+class SessionActivity:
+    """
+    Dernière activité authentifiée de chaque utilisateur (users.last_seen_at), et expiration
+    du token utilisé (users.session_expires_at) : base du statut « en ligne ».
+    Écrite au plus une fois par USER_ACTIVITY_INTERVAL secondes et par utilisateur dans ce
+    worker, par un UPDATE sur sa propre connexion (hors de la transaction de la requête,
+    sans passer par le fil des changements ni invalider les caches liés à users).
+    """
+
+    def __init__(self):
+        self._written = {}
+        self._lock = threading.Lock()
+
+    def touch(self, user_id, expires_at=None):
+        interval = current_app.config.get("USER_ACTIVITY_INTERVAL", 60)
+        now = time.monotonic()
+        with self._lock:
+            written = self._written.get(user_id)
+            if written is not None and now - written < interval:
+                return
+            self._written[user_id] = now
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(update(User).where(User.id == user_id).values(
+                    last_seen_at=datetime.utcnow(), session_expires_at=expires_at
+                ))
+        except Exception as e:
+            with self._lock:
+                self._written.pop(user_id, None)
+            print(f"Error recording activity of user {user_id}: {e}")
+
+    def forget(self, user_id):
+        """La prochaine requête de l'utilisateur (autre session) sera enregistrée sans attendre."""
+        with self._lock:
+            self._written.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._written.clear()
+
+
+session_activity = SessionActivity()
+
+
+class CurrentUser:
+    """
+    Utilisateur authentifié (g.user) : id, role et status viennent du token signé
+    (ou du cache pour un ancien token), les autres attributs chargent l'utilisateur
+    complet au premier accès. Pour modifier l'utilisateur, utiliser load().
+    `claims` : contenu du token signé (None pour un ancien token).
+    """
+
+    def __init__(self, entry, claims=None):
+        self.id, self.role, self.status = entry
+        self.claims = claims
+        self._user = None
+
+    def load(self):
+        if self._user is None:
+            self._user = db.session.get(User, self.id)
+        return self._user
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        user = self.load()
+        if user is None:
+            raise AttributeError(name)
+        return getattr(user, name)
+
+
+def get_request_token(allow_query=False):
+    """Token de la requête : en-tête Authorization ("Bearer <token>" ou "<token>"), sinon ?token= si permis."""
+    auth_header = request.headers.get('Authorization')
+    if auth_header:
+        return auth_header.split(" ")[1] if " " in auth_header else auth_header
+    if allow_query:
+        return request.args.get("token")
+    return None
+
+
+def authenticate(token):
+    """
+    CurrentUser correspondant au token, ou None.
+    Token signé : vérifié sans requête (signature, expiration, révocations en mémoire).
+    Ancien token aléatoire : recherché dans users.token (via le cache).
+    """
+    if not token:
+        return None
+    try:
+        claims = decode_token(token)
+    except BadSignature:
+        return _authenticate_legacy(token)
+    if claims is None:
+        return None
+    session_activity.touch(claims["uid"], token_expiry(claims))
+    # Seuls les comptes actifs reçoivent un token ; une désactivation passe par une révocation
+    return CurrentUser(AuthEntry(claims["uid"], claims["role"], "active"), claims)
+
+
+def _authenticate_legacy(token):
+    # Un ancien token n'expire pas : accepté seulement jusqu'à AUTH_LEGACY_TOKENS_UNTIL
+    until = current_app.config.get("AUTH_LEGACY_TOKENS_UNTIL")
+    if until is None or datetime.utcnow() >= until:
+        return None
+    entry = auth_cache.get(token)
+    if entry is None:
+        row = db.session.query(User.id, User.role, User.status).filter(User.token == token).first()
+        if row is None:
+            return None
+        entry = AuthEntry(*row)
+        auth_cache.set(token, entry)
+    if entry.status == "active":
+        session_activity.touch(entry.id, until)
+    return CurrentUser(entry)
+
+
+def current_user_from_request(allow_query=False):
+    return authenticate(get_request_token(allow_query))
+
+
+def invalidate_user(user_id):
+    """À appeler quand un utilisateur perd ou change ses droits (déconnexion, rôle, suppression)."""
+    auth_cache.invalidate_user(user_id)
+
+
+@register_commit_listener
+def _invalidate_on_commit(changes):
+    for change in changes:
+        if change.table == "users":
+            auth_cache.invalidate_user(change.entity_id)
+
 
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = None
-        # Check Authorization header
-        if 'Authorization' in request.headers:
-            auth_header = request.headers['Authorization']
-            if auth_header.startswith('Bearer '):
-                token = auth_header.split(" ")[1]
-            else:
-                token = auth_header
+        token = get_request_token()
 
         if not token:
             print(f"[DEBUG AUTH] Token missing. Headers: {request.headers}")
@@ -23,12 +220,14 @@ def token_required(f):
 
         try:
             # Find user with this token
-            current_user = User.query.filter_by(token=token).first()
+            current_user = authenticate(token)
+            if current_user is None:
+                return jsonify({'message': 'Token invalide !'}), 401
             # Check if user is approved (active)
             if current_user.status != 'active':
-                print(f"[DEBUG AUTH] Account not approved: {current_user.email} (Status: {current_user.status})")
+                print(f"[DEBUG AUTH] Account not approved: {current_user.id} (Status: {current_user.status})")
                 return jsonify({'message': 'Compte non approuvé. Veuillez contacter un administrateur.'}), 403
-            
+
             # Save user in global flask context
             g.user = current_user
         except Exception as e:
@@ -0,0 +1,162 @@
+"""
+Compteurs de la barre latérale tenus à jour à l'écriture.
+
+Une ligne par badge dans badge_counters. Chaque flush compare l'appartenance des
+lignes modifiées à chaque badge avant (valeurs lues en base) et après (valeurs
+écrites) ; juste avant le commit, l'écart de chaque badge est appliqué par un
+UPDATE atomique (count = count + écart) sur sa seule ligne, dans la même
+transaction. Seules les transactions qui changent un compteur verrouillent une
+ligne, et seulement celle de ce badge : un écrivain de missions n'attend jamais un
+écrivain de maintenances.
+
+La lecture des compteurs est une seule requête sur quatre lignes. Une réconciliation
+périodique recompte tout à partir des tables sources (index partiels des demandes en
+attente) : elle absorbe les mises à jour en masse hors ORM et le glissement
+quotidien de l'échéance à 30 jours des documents de conformité.
+"""
+from datetime import date, datetime, timedelta
+from collections import Counter
+
+from sqlalchemy import event, func, inspect, select, update
+
+from .. import db
+from ..models import BadgeCounter, Mission, Maintenance, Compliance, Planning
+
+# Documents actifs expirant dans 30 jours ou moins (y compris expirés)
+COMPLIANCE_ACTIVE_STATUSES = ('valide', 'à_renouveler')
+COMPLIANCE_WINDOW_DAYS = 30
+
+
+def _compliance_threshold():
+    return date.today() + timedelta(days=COMPLIANCE_WINDOW_DAYS)
+
+
+def _expiring(statut, date_expiration):
+    return statut in COMPLIANCE_ACTIVE_STATUSES and date_expiration is not None \
+        and date_expiration <= _compliance_threshold()
+
+
+# Badge -> (modèle, colonnes lues, appartenance en Python, condition SQL) ;
+# les conditions SQL reprennent celles des index partiels
+BADGES = {
+    "missions": (Mission, ("state",), lambda state: state == 'nouveau',
+                 lambda: Mission.state == 'nouveau'),
+    "maintenance": (Maintenance, ("statut",), lambda statut: statut == 'en_attente',
+                    lambda: Maintenance.statut == 'en_attente'),
+    "compliance": (Compliance, ("statut", "date_expiration"), _expiring,
+                   lambda: Compliance.statut.in_(COMPLIANCE_ACTIVE_STATUSES)
+                   & (Compliance.date_expiration <= _compliance_threshold())),
+    "planning": (Planning, ("status",), lambda status: status == 'en_attente',
+                 lambda: Planning.status == 'en_attente'),
+}
+MODEL_BADGES = {model: name for name, (model, *_rest) in BADGES.items()}
+
+
+def count_badges(session=None):
+    """Recompte les quatre badges à partir des tables sources, en une requête."""
+    session = session or db.session
+    row = session.execute(select(*[
+        select(func.count()).select_from(model).where(condition()).scalar_subquery().label(name)
+        for name, (model, _, _, condition) in BADGES.items()
+    ])).one()
+    return dict(row._mapping)
+
+
+def _deltas(session):
+    return session.info.setdefault("badge_deltas", Counter())
+
+
+def _stored_members(session, objects):
+    """Soustrait l'appartenance actuelle en base des lignes qui vont être modifiées ou supprimées."""
+    by_badge = {}
+    for obj in objects:
+        name = MODEL_BADGES.get(type(obj))
+        if name and inspect(obj).has_identity:
+            by_badge.setdefault(name, []).append(obj.id)
+
+    deltas = _deltas(session)
+    with session.no_autoflush:
+        for name, ids in by_badge.items():
+            model, columns, member, _ = BADGES[name]
+            rows = session.execute(
+                select(*[getattr(model, c) for c in columns]).where(model.id.in_(ids))
+            ).all()
+            deltas[name] -= sum(1 for row in rows if member(*row))
+
+
+def _collect_before(session, flush_context, instances):
+    _stored_members(session, list(session.dirty) + list(session.deleted))
+
+
+def _collect_after(session, flush_context):
+    deltas = _deltas(session)
+    for obj in list(session.new) + [o for o in session.dirty if o not in session.deleted]:
+        name = MODEL_BADGES.get(type(obj))
+        if name:
+            _, columns, member, _ = BADGES[name]
+            if member(*[getattr(obj, c) for c in columns]):
+                deltas[name] += 1
+
+
+def _apply_before_commit(session):
+    session.flush()
+    deltas = session.info.pop("badge_deltas", None) or {}
+    # Ordre fixe des lignes verrouillées : pas d'interblocage entre deux commits
+    for name in sorted(name for name, delta in deltas.items() if delta):
+        session.execute(
+            update(BadgeCounter).where(BadgeCounter.badge == name)
+            .values(count=BadgeCounter.count + deltas[name])
+        )
+
+
+def _discard(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop("badge_deltas", None)
+
+
+def init_badge_counters():
+    """Branche la mise à jour incrémentale des compteurs sur les commits."""
+    if event.contains(db.session, "after_flush", _collect_after):
+        return
+    event.listen(db.session, "before_flush", _collect_before)
+    event.listen(db.session, "after_flush", _collect_after)
+    event.listen(db.session, "before_commit", _apply_before_commit)
+    event.listen(db.session, "after_soft_rollback", _discard)
+
+
+def reconcile_badge_counters(session=None):
+    """
+    Recompte et réécrit les lignes des compteurs.
+    Sur PostgreSQL les lignes sont verrouillées d'abord (dans l'ordre des badges) : un
+    commit concurrent attend, ou est déjà visible par le recomptage ; aucun écart n'est
+    perdu ni compté deux fois.
+    """
+    session = session or db.session
+    rows = {
+        row.badge: row for row in session.execute(
+            select(BadgeCounter).order_by(BadgeCounter.badge)
+            .with_for_update().execution_options(populate_existing=True)
+        ).scalars()
+    }
+    counts = count_badges(session)
+    now = datetime.utcnow()
+    for name, value in counts.items():
+        row = rows.get(name)
+        if row is None:
+            row = BadgeCounter(badge=name)
+            session.add(row)
+        row.count = value
+        row.reconciled_at = now
+    # Les recomptes ne doivent pas être réappliqués comme écarts
+    session.info.pop("badge_deltas", None)
+    session.commit()
+    return counts
+
+
+def read_badge_counters(session=None):
+    """Compteurs courants : une lecture des lignes badge_counters (réconciliées s'il en manque)."""
+    session = session or db.session
+    counts = dict(session.execute(select(BadgeCounter.badge, BadgeCounter.count)).all())
+    if set(counts) != set(BADGES):
+        return reconcile_badge_counters(session)
+    return counts
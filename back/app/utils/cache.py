@@ -0,0 +1,73 @@
+import threading
+import time
+
+from .change_feed import register_commit_listener
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Cache mémoire partagé par tous les utilisateurs d'un worker (thread-safe)."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+shared_cache = TTLCache()
+
+# Table -> clés du cache à invalider quand elle est modifiée
+_dependencies = {}
+_dependencies_lock = threading.Lock()
+
+
+def get_or_compute(key, compute, ttl, tables=()):
+    """
+    Retourne la valeur en cache ou la calcule.
+    Les écritures sur `tables` (dans ce worker) invalident la clé ; le TTL borne
+    la fraîcheur vis-à-vis des écritures faites par les autres workers.
+    """
+    value = shared_cache.get(key, _MISSING)
+    if value is not _MISSING:
+        return value
+
+    value = compute()
+    shared_cache.set(key, value, ttl)
+    with _dependencies_lock:
+        for table in tables:
+            _dependencies.setdefault(table, set()).add(key)
+    return value
+
+
+@register_commit_listener
+def _invalidate_on_commit(changes):
+    tables = {c.table for c in changes}
+    with _dependencies_lock:
+        keys = set()
+        for table in tables:
+            keys |= _dependencies.get(table, set())
+    for key in keys:
+        shared_cache.invalidate(key)
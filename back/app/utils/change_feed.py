@@ -0,0 +1,108 @@
+from collections import namedtuple
+from sqlalchemy import event, insert, inspect, text
+
+from .. import db
+from ..models import ChangeFeedEntry
+
+# Tables suivies par le flux de changements -> nom d'entité exposé par /api/changes
+FEED_ENTITIES = {
+    "planning": "planning",
+    "missions": "missions",
+    "maintenances": "maintenance",
+    "vehicles": "vehicles",
+    "drivers": "drivers",
+    "fuel_entries": "fuel",
+    "compliance": "compliance",
+    "fuel_monthly_budgets": "fuel_budgets",
+}
+
+# Clé arbitraire de verrou consultatif : sérialise les écrivains du flux pour que
+# l'ordre des seq corresponde à l'ordre des commits (aucun curseur ne saute de ligne).
+FEED_LOCK_KEY = 726001
+
+Change = namedtuple("Change", ["table", "entity_id", "op"])
+
+_commit_listeners = []
+
+
+def register_commit_listener(fn):
+    """
+    Enregistre fn(changes) appelée après chaque commit contenant des écritures.
+    `changes` est une liste de Change(table, entity_id, op) couvrant tous les modèles.
+    La session est alors hors transaction : un écouteur qui lit la base ouvre sa propre session.
+    """
+    if fn not in _commit_listeners:
+        _commit_listeners.append(fn)
+    return fn
+
+
+def _primary_key(obj) -> str:
+    state = inspect(obj)
+    values = state.mapper.primary_key_from_instance(obj)
+    return ":".join(str(v) for v in values)
+
+
+def _collect(session, flush_context):
+    pending = session.info.setdefault("pending_changes", {})
+    for obj in session.new:
+        pending[(obj.__tablename__, _primary_key(obj))] = "upsert"
+    for obj in session.dirty:
+        if session.is_modified(obj, include_collections=False):
+            pending[(obj.__tablename__, _primary_key(obj))] = "upsert"
+    for obj in session.deleted:
+        pending[(obj.__tablename__, _primary_key(obj))] = "delete"
+
+
+def _write_feed(session):
+    # Vide la session pour que toutes les écritures de la transaction soient collectées
+    session.flush()
+    pending = session.info.get("pending_changes")
+    if not pending:
+        return
+
+    rows = [
+        {"entity": FEED_ENTITIES[table], "entity_id": entity_id, "op": op}
+        for (table, entity_id), op in pending.items()
+        if table in FEED_ENTITIES
+    ]
+    if not rows:
+        return
+
+    if session.get_bind().dialect.name == "postgresql":
+        session.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": FEED_LOCK_KEY})
+    session.execute(insert(ChangeFeedEntry), rows)
+
+
+def _dispatch(session):
+    pending = session.info.pop("pending_changes", None)
+    if not pending:
+        return
+    changes = [Change(table, entity_id, op) for (table, entity_id), op in pending.items()]
+    for listener in _commit_listeners:
+        try:
+            listener(changes)
+        except Exception as e:
+            print(f"Error in commit listener {listener.__name__}: {e}")
+
+
+def _discard(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop("pending_changes", None)
+
+
+def init_change_feed():
+    """Branche les écouteurs de session qui alimentent la table change_feed."""
+    if event.contains(db.session, "after_flush", _collect):
+        return
+    event.listen(db.session, "after_flush", _collect)
+    event.listen(db.session, "before_commit", _write_feed)
+    event.listen(db.session, "after_commit", _dispatch)
+    event.listen(db.session, "after_soft_rollback", _discard)
+
+
+def latest_seq(entities=None) -> int:
+    """Retourne le dernier curseur du flux (éventuellement restreint à certaines entités)."""
+    query = db.session.query(db.func.max(ChangeFeedEntry.seq))
+    if entities:
+        query = query.filter(ChangeFeedEntry.entity.in_(entities))
+    return query.scalar() or 0
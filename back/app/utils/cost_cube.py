@@ -0,0 +1,224 @@
+"""
+Cube de coûts véhicule x année x mois x catégorie.
+
+Les écritures sur fuel_entries, maintenances et compliance marquent les cellules
+touchées (anciennes clés lues avant le flush, nouvelles après) ; ces cellules sont recalculées juste avant
+le commit, dans la même transaction. rebuild_cost_cube() reconstruit tout le cube.
+"""
+from datetime import date, datetime
+
+from sqlalchemy import event, delete, insert, select, inspect, func, extract, text
+
+from .. import db
+from ..models import CostCube, FuelEntry, Maintenance, Compliance
+
+
+def _compliance_date():
+    return func.coalesce(Compliance.date_emission, func.date(Compliance.created_at, type_=db.Date), type_=db.Date)
+
+
+# Catégorie -> (modèle, colonne de date, montant, quantité)
+CATEGORIES = {
+    "fuel": (FuelEntry, lambda: FuelEntry.date, lambda: FuelEntry.total_achete, lambda: FuelEntry.quantite_achetee),
+    "maintenance": (Maintenance, lambda: Maintenance.date_demande, lambda: Maintenance.cout, None),
+    "compliance": (Compliance, _compliance_date, lambda: Compliance.cout, None),
+}
+MODEL_CATEGORIES = {model: category for category, (model, *_rest) in CATEGORIES.items()}
+
+# Espace de verrous consultatifs des cellules (le second entier est le hash de la cellule) :
+# deux transactions qui touchent la même cellule la recalculent l'une après l'autre
+CUBE_LOCK_KEY = 726002
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def _cell(category, vehicle_id, day):
+    day = _as_date(day)
+    if vehicle_id and day:
+        return (vehicle_id, day.year, day.month, category)
+    return None
+
+
+def _stored_cells(session, objects):
+    """Cellules occupées en base par des lignes qui vont être modifiées ou supprimées."""
+    by_category = {}
+    for obj in objects:
+        category = MODEL_CATEGORIES.get(type(obj))
+        if category and inspect(obj).has_identity:
+            by_category.setdefault(category, []).append(obj.id)
+
+    cells = set()
+    with session.no_autoflush:
+        for category, ids in by_category.items():
+            model, date_col, _, _ = CATEGORIES[category]
+            rows = session.execute(
+                select(model.vehicule_id, date_col()).where(model.id.in_(ids))
+            ).all()
+            cells |= {_cell(category, vid, day) for vid, day in rows}
+    cells.discard(None)
+    return cells
+
+
+def _row_cell(obj, category):
+    if category == "fuel":
+        day = obj.date
+    elif category == "maintenance":
+        day = obj.date_demande
+    else:
+        day = obj.date_emission or obj.created_at
+    return _cell(category, obj.vehicule_id, day)
+
+
+def _collect_before(session, flush_context, instances):
+    # Anciennes clés : lues en base avant l'UPDATE / DELETE (les attributs expirés n'ont pas d'historique)
+    dirty = session.info.setdefault("dirty_cost_cells", set())
+    dirty |= _stored_cells(session, list(session.dirty) + list(session.deleted))
+
+
+def _collect(session, flush_context):
+    # Nouvelles clés : valeurs écrites par ce flush
+    dirty = session.info.setdefault("dirty_cost_cells", set())
+    for obj in list(session.new) + list(session.dirty):
+        category = MODEL_CATEGORIES.get(type(obj))
+        if category:
+            cell = _row_cell(obj, category)
+            if cell:
+                dirty.add(cell)
+
+
+def _lock_cells(session, cells):
+    # Ordre fixe : deux transactions qui partagent plusieurs cellules ne s'interbloquent pas
+    for cell in sorted(cells):
+        session.execute(text("SELECT pg_advisory_xact_lock(:ns, hashtext(:cell))"),
+                        {"ns": CUBE_LOCK_KEY, "cell": ":".join(str(part) for part in cell)})
+
+
+def _upsert_cell(session, values):
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        dialect_insert = None
+
+    if dialect_insert is None:
+        session.execute(delete(CostCube).where(
+            CostCube.vehicle_id == values["vehicle_id"],
+            CostCube.year == values["year"],
+            CostCube.month == values["month"],
+            CostCube.category == values["category"],
+        ))
+        session.execute(insert(CostCube).values(**values))
+        return
+    stmt = dialect_insert(CostCube).values(**values)
+    session.execute(stmt.on_conflict_do_update(
+        index_elements=["vehicle_id", "year", "month", "category"],
+        set_={key: stmt.excluded[key] for key in ("amount", "quantity", "entries", "updated_at")},
+    ))
+
+
+def refresh_cells(session, cells):
+    """Recalcule les cellules données à partir des tables sources."""
+    if session.get_bind().dialect.name == "postgresql":
+        # Le verrou tenu jusqu'au commit garantit que la somme lue ensuite inclut les
+        # écritures déjà validées par l'autre transaction (READ COMMITTED)
+        _lock_cells(session, cells)
+
+    for vehicle_id, year, month, category in cells:
+        model, date_col, amount_col, quantity_col = CATEGORIES[category]
+        start = date(year, month, 1)
+        end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+        row = session.query(
+            func.coalesce(func.sum(amount_col()), 0.0),
+            func.coalesce(func.sum(quantity_col()), 0.0) if quantity_col else func.coalesce(None, 0.0),
+            func.count(),
+        ).filter(
+            model.vehicule_id == vehicle_id,
+            date_col() >= start,
+            date_col() < end,
+        ).one()
+
+        if row[2]:
+            _upsert_cell(session, {
+                "vehicle_id": vehicle_id, "year": year, "month": month, "category": category,
+                "amount": float(row[0] or 0), "quantity": float(row[1] or 0), "entries": row[2],
+                "updated_at": datetime.utcnow(),
+            })
+        else:
+            session.execute(delete(CostCube).where(
+                CostCube.vehicle_id == vehicle_id,
+                CostCube.year == year,
+                CostCube.month == month,
+                CostCube.category == category,
+            ))
+
+
+def _refresh_before_commit(session):
+    session.flush()
+    cells = session.info.pop("dirty_cost_cells", None)
+    if cells:
+        refresh_cells(session, cells)
+
+
+def _discard(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop("dirty_cost_cells", None)
+
+
+def init_cost_cube():
+    """Branche la maintenance incrémentale du cube sur les commits."""
+    if event.contains(db.session, "after_flush", _collect):
+        return
+    event.listen(db.session, "before_flush", _collect_before)
+    event.listen(db.session, "after_flush", _collect)
+    event.listen(db.session, "before_commit", _refresh_before_commit)
+    event.listen(db.session, "after_soft_rollback", _discard)
+
+
+def rebuild_cost_cube():
+    """Reconstruit entièrement le cube à partir des tables sources (une agrégation par catégorie)."""
+    db.session.execute(delete(CostCube))
+    now = datetime.utcnow()
+    total = 0
+    for category, (model, date_col, amount_col, quantity_col) in CATEGORIES.items():
+        year = extract('year', date_col())
+        month = extract('month', date_col())
+        rows = db.session.query(
+            model.vehicule_id,
+            year.label('year'),
+            month.label('month'),
+            func.coalesce(func.sum(amount_col()), 0.0),
+            func.coalesce(func.sum(quantity_col()), 0.0) if quantity_col else func.coalesce(None, 0.0),
+            func.count(),
+        ).filter(date_col().isnot(None)).group_by(model.vehicule_id, year, month).all()
+
+        values = [{
+            "vehicle_id": vid,
+            "year": int(y),
+            "month": int(m),
+            "category": category,
+            "amount": float(amount or 0),
+            "quantity": float(quantity or 0),
+            "entries": count,
+            "updated_at": now,
+        } for vid, y, m, amount, quantity, count in rows]
+        if values:
+            db.session.execute(insert(CostCube), values)
+        total += len(values)
+    db.session.commit()
+    return total
+
+
+def cube_query(categories=None, year=None):
+    """Requête de base sur le cube, filtrée par catégories et/ou année."""
+    query = CostCube.query
+    if categories:
+        query = query.filter(CostCube.category.in_(categories))
+    if year is not None:
+        query = query.filter(CostCube.year == year)
+    return query
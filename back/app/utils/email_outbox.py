@@ -0,0 +1,295 @@
+"""
+Boîte d'envoi transactionnelle des emails (table email_outbox).
+
+Les alertes ne construisent ni n'envoient plus d'email pendant la requête :
+queue_email() écrit une ligne (type, paramètres, clé de déduplication) dans la
+transaction de l'événement métier. Un rollback l'annule avec le reste, et une clé
+déjà présente (même événement signalé deux fois) est ignorée.
+
+Après chaque commit ayant écrit dans la boîte, le thread d'envoi du processus est
+réveillé ; le planificateur le relance aussi chaque minute (lignes d'autres
+processus, envois abandonnés ou interrompus). Il réserve les lignes en attente par
+lots de EMAIL_OUTBOX_BATCH, construit les messages (EMAIL_BUILDERS de email_utils)
+et les confie au pool d'envoi, qui rapporte le résultat : sent, skipped (plus de
+destinataire), digested (tous les destinataires lisent des récapitulatifs, voir
+digest_events), ou pending/failed après échec (au plus EMAIL_OUTBOX_MAX_ATTEMPTS
+tentatives). Une ligne réservée depuis plus de EMAIL_OUTBOX_CLAIM_TIMEOUT secondes
+(processus arrêté pendant l'envoi) est reprise.
+"""
+import atexit
+import json
+import os
+import threading
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import case, delete, event, insert, or_, select, update
+from sqlalchemy.orm import Session
+
+from .. import db
+from ..models import DigestEvent, EmailOutbox
+from .mail_pool import mail_pool
+
+OutboxItem = namedtuple("OutboxItem", ["id", "kind", "params"])
+
+
+def queue_email(kind, dedupe_key, params):
+    """
+    Ajoute un email à la transaction en cours, envoyé après commit.
+    Une seule ligne par dedupe_key : la même alerte pour le même événement n'est envoyée qu'une fois.
+    """
+    row = {
+        "kind": kind,
+        "dedupe_key": dedupe_key,
+        "params": json.dumps(params, default=str),
+        "status": "pending",
+        "attempts": 0,
+        "created_at": datetime.utcnow(),
+    }
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        dialect_insert = None
+
+    if dialect_insert is not None:
+        db.session.execute(
+            dialect_insert(EmailOutbox).values(**row).on_conflict_do_nothing(index_elements=["dedupe_key"])
+        )
+    elif db.session.query(EmailOutbox.id).filter_by(dedupe_key=dedupe_key).first() is None:
+        db.session.execute(insert(EmailOutbox).values(**row))
+    db.session.info["email_outbox"] = True
+
+
+class _Delivery:
+    """Résultats des messages d'une ligne : la ligne est close quand tous ont été traités."""
+
+    def __init__(self, outbox, item, messages):
+        self.outbox = outbox
+        self.item = item
+        self.left = len(messages)
+        self.delivered = 0
+        self.errors = []
+        self.recipients = sorted({r for msg in messages for r in msg.recipients})
+        self._lock = threading.Lock()
+
+    def __call__(self, error):
+        with self._lock:
+            self.left -= 1
+            if error is None:
+                self.delivered += 1
+            else:
+                self.errors.append(str(error))
+            if self.left:
+                return
+        self.outbox._finish(self.item.id, self.delivered, self.errors, self.recipients)
+
+
+class EmailOutboxDispatcher:
+    def __init__(self):
+        self._app = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._dispatch_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self.sent = 0
+        self.failed = 0
+
+    def init_app(self, app):
+        self._app = app
+        self.batch_size = app.config.get("EMAIL_OUTBOX_BATCH", 50)
+        self.max_attempts = app.config.get("EMAIL_OUTBOX_MAX_ATTEMPTS", 5)
+        self.claim_timeout = app.config.get("EMAIL_OUTBOX_CLAIM_TIMEOUT", 600)
+        atexit.register(self.shutdown)
+
+    def wake(self):
+        """Demande au thread d'envoi de traiter les lignes en attente."""
+        self._ensure_started()
+        self._wake.set()
+
+    def _ensure_started(self):
+        # Démarré au premier commit, et redémarré dans un processus fils (fork des workers)
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="email-outbox", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait()
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                self.dispatch()
+            except Exception as e:
+                print(f"Error dispatching email outbox: {e}")
+
+    def dispatch(self):
+        """Confie au pool d'envoi toutes les lignes en attente ; retourne leur nombre."""
+        with self._dispatch_lock, self._app.app_context():
+            total, after_id = 0, 0
+            try:
+                while True:
+                    # after_id : une ligne remise en attente pendant ce passage attend le suivant
+                    items = self._claim(after_id)
+                    for item in items:
+                        self._submit(item)
+                    total += len(items)
+                    if len(items) < self.batch_size:
+                        return total
+                    after_id = items[-1].id
+            finally:
+                db.session.remove()
+
+    def _claim(self, after_id):
+        now = datetime.utcnow()
+        with Session(db.engine) as session:
+            query = select(EmailOutbox.id, EmailOutbox.kind, EmailOutbox.params).where(
+                EmailOutbox.id > after_id,
+                EmailOutbox.attempts < self.max_attempts,
+                or_(
+                    EmailOutbox.status == "pending",
+                    (EmailOutbox.status == "sending")
+                    & (EmailOutbox.claimed_at < now - timedelta(seconds=self.claim_timeout)),
+                ),
+            ).order_by(EmailOutbox.id).limit(self.batch_size)
+            if session.get_bind().dialect.name == "postgresql":
+                # Plusieurs processus peuvent vider la boîte : chacun prend des lignes différentes
+                query = query.with_for_update(skip_locked=True)
+            rows = session.execute(query).all()
+            if not rows:
+                return []
+            session.execute(
+                update(EmailOutbox)
+                .where(EmailOutbox.id.in_([row.id for row in rows]))
+                .values(status="sending", claimed_at=now, attempts=EmailOutbox.attempts + 1)
+            )
+            session.commit()
+        return [OutboxItem(row.id, row.kind, json.loads(row.params)) for row in rows]
+
+    def _submit(self, item):
+        from .email_utils import EMAIL_BUILDERS, split_digest_recipients
+
+        builder = EMAIL_BUILDERS.get(item.kind)
+        try:
+            if builder is None:
+                raise ValueError(f"unknown email kind {item.kind}")
+            messages = builder(item.params)
+            messages, deferred = split_digest_recipients(item.kind, messages)
+            if deferred:
+                self._store_digest_events(item, deferred, done=not messages)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error building email {item.kind} #{item.id}: {e}")
+            self._finish(item.id, 0, [f"build: {e}"], [])
+            return
+        if not messages:
+            if not deferred:
+                self._finish(item.id, 0, [], [])
+            return
+        delivery = _Delivery(self, item, messages)
+        for msg in messages:
+            mail_pool.submit(msg, delivery)
+
+    def _store_digest_events(self, item, deferred, done):
+        """
+        Met de côté les destinataires qui lisent des récapitulatifs (digest_events).
+        Une ligne reprise remplace ses événements non encore récapitulés ; si personne
+        n'attend l'email immédiatement, la ligne est close dans la même transaction.
+        """
+        now = datetime.utcnow()
+        with Session(db.engine) as session:
+            session.execute(delete(DigestEvent).where(
+                DigestEvent.outbox_id == item.id, DigestEvent.digested_at.is_(None)
+            ))
+            session.execute(insert(DigestEvent), [{
+                "recipient": recipient,
+                "frequency": frequency,
+                "kind": item.kind,
+                "outbox_id": item.id,
+                "subject": msg.subject[:255],
+                "body": msg.html,
+                "created_at": now,
+            } for recipient, frequency, msg in deferred])
+            if done:
+                session.execute(update(EmailOutbox).where(EmailOutbox.id == item.id).values(
+                    status="digested", sent_at=now, error=None,
+                    recipients=", ".join(sorted({recipient for recipient, _, _ in deferred})),
+                ))
+            session.commit()
+
+    def _finish(self, row_id, delivered, errors, recipients):
+        now = datetime.utcnow()
+        values = {"recipients": ", ".join(recipients) or None}
+        if not errors:
+            values.update(status="sent" if delivered else "skipped", sent_at=now, error=None)
+            self.sent += delivered
+        elif delivered:
+            # Une partie des destinataires a reçu l'email : pas de nouvel essai (pas de doublon)
+            values.update(status="failed", error="; ".join(errors))
+            self.failed += 1
+        else:
+            values.update(
+                status=case((EmailOutbox.attempts >= self.max_attempts, "failed"), else_="pending"),
+                error="; ".join(errors),
+            )
+            self.failed += 1
+        with self._app.app_context():
+            with Session(db.engine) as session:
+                try:
+                    session.execute(update(EmailOutbox).where(EmailOutbox.id == row_id).values(**values))
+                    session.commit()
+                except Exception as e:
+                    session.rollback()
+                    print(f"Error recording email outbox status #{row_id}: {e}")
+
+    def shutdown(self):
+        self._stop.set()
+        self._wake.set()
+
+
+email_outbox = EmailOutboxDispatcher()
+
+
+def _wake_after_commit(session):
+    if session.info.pop("email_outbox", False):
+        email_outbox.wake()
+
+
+def _discard(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop("email_outbox", None)
+
+
+def purge_email_outbox(retention_days):
+    """
+    Supprime les lignes traitées (sent, digested, skipped, failed) et les événements déjà
+    récapitulés depuis plus de retention_days jours.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    result = db.session.execute(delete(EmailOutbox).where(
+        EmailOutbox.status.in_(["sent", "digested", "skipped", "failed"]),
+        EmailOutbox.created_at < cutoff,
+    ))
+    db.session.execute(delete(DigestEvent).where(DigestEvent.digested_at < cutoff))
+    db.session.commit()
+    return result.rowcount
+
+
+def init_email_outbox(app):
+    """Branche le réveil du thread d'envoi sur les commits de db.session."""
+    email_outbox.init_app(app)
+    if event.contains(db.session, "after_commit", _wake_after_commit):
+        return
+    event.listen(db.session, "after_commit", _wake_after_commit)
+    event.listen(db.session, "after_soft_rollback", _discard)
@@ -1,36 +1,125 @@
+import hashlib
 from flask_mail import Message
 from flask import render_template_string, current_app
-from threading import Thread
 from .. import mail, db
-from ..models import User
-from datetime import datetime
+from .mail_pool import mail_pool
+from .email_outbox import queue_email
+from .cache import get_or_compute
+from .change_feed import FEED_ENTITIES
+from ..models import User, Vehicle, Maintenance, Planning, Mission, FuelEntry, Compliance, DigestEvent, ChangeFeedEntry
+from sqlalchemy import func, update
+from datetime import datetime, date
+
+# Alerts are queued in the caller's transaction (email_outbox) with the ids and values
+# they need; the outbox dispatcher builds the messages after commit (EMAIL_BUILDERS).
+
+# Roles alerted by the fleet-wide emails, and the recipient cache (see get_role_recipients)
+STAFF_ROLES = ('admin', 'technician')
+RECIPIENTS_CACHE_TTL = 300
+RECIPIENTS_TABLES = ("users",)
+
+# Users choose to get alerts as they happen or grouped in an hourly/daily digest (User.email_digest);
+# critical alerts, and the digests themselves, are always sent at once
+DIGEST_FREQUENCIES = ('immediate', 'hourly', 'daily')
+DIGEST_LABELS = {'hourly': 'horaire', 'daily': 'quotidien'}
+IMMEDIATE_KINDS = {"abnormal_fuel", "budget_overrun", "digest"}
 
 def send_email_async(msg):
-    """Send email asynchronously in a background thread to avoid blocking HTTP response."""
-    def send_async_email(app, msg):
-        with app.app_context():
-            try:
-                mail.send(msg)
-            except Exception as e:
-                print(f"Error sending async email: {e}")
-    
-    app = current_app._get_current_object()
-    thread = Thread(target=send_async_email, args=(app, msg))
-    thread.start()
-
-def send_maintenance_alert(maintenance, vehicle):
-    """Notify technicians and admins about a new maintenance request."""
-    # Find active technicians and admins
-    recipients = [u.profile_email for u in User.query.filter(User.role.in_(['admin', 'technician'])).all() if u.profile_email]
-    
-    if not recipients:
-        return
+    """Queue an email for the mail worker pool to avoid blocking the HTTP response."""
+    mail_pool.submit(msg)
+
+def send_emails_async(msgs):
+    """Queue several emails; the pool workers send them over their kept-alive SMTP connections."""
+    for msg in msgs:
+        mail_pool.submit(msg)
+
+def _get(model, id):
+    """Load one row without its eager (selectin) relationships."""
+    return db.session.get(model, id, options=[db.lazyload("*")]) if id else None
+
+def get_role_recipients(roles):
+    """
+    Email addresses of the users holding one of `roles`, from the shared cache.
+    Any committed write to users in this worker (creation, profile, role change, deletion)
+    invalidates it; the TTL bounds staleness for writes made by other workers.
+    """
+    roles = tuple(sorted(set(roles)))
+
+    def compute():
+        return tuple(email for (email,) in db.session.query(User.profile_email).filter(
+            User.role.in_(roles),
+            User.profile_email.isnot(None),
+            User.profile_email != ''
+        ).distinct().order_by(User.profile_email).all())
+
+    return list(get_or_compute(f"recipients:{','.join(roles)}", compute, RECIPIENTS_CACHE_TTL, RECIPIENTS_TABLES))
+
+def get_digest_preferences():
+    """{address: 'hourly' | 'daily'} for the users reading their alerts as digests (cached like the recipients)."""
+    def compute():
+        return dict(db.session.query(User.profile_email, User.email_digest).filter(
+            User.email_digest.in_(('hourly', 'daily')),
+            User.profile_email.isnot(None),
+            User.profile_email != ''
+        ).all())
+
+    return get_or_compute("recipients:digest", compute, RECIPIENTS_CACHE_TTL, RECIPIENTS_TABLES)
+
+def split_digest_recipients(kind, messages):
+    """
+    Keep on each message the recipients who want it now.
+    Returns (messages to send now, [(recipient, frequency, message)] for the digests).
+    """
+    if kind in IMMEDIATE_KINDS:
+        return messages, []
+    preferences = get_digest_preferences()
+    if not preferences:
+        return messages, []
+
+    immediate, deferred = [], []
+    for msg in messages:
+        deferred.extend((r, preferences[r], msg) for r in msg.recipients if r in preferences)
+        now = [r for r in msg.recipients if r not in preferences]
+        if now:
+            msg.recipients = now
+            immediate.append(msg)
+    return immediate, deferred
+
+def _transition_key(kind, obj, old_status, new_status):
+    """
+    Dedupe key of one status transition: old->new from the entity's last committed version
+    (its latest change_feed seq). Concurrent or replayed requests that saw the same version
+    share the key, so the email is queued once; a status reached again later starts from a
+    newer version and gets its own email.
+    """
+    version = db.session.query(func.max(ChangeFeedEntry.seq)).filter(
+        ChangeFeedEntry.entity == FEED_ENTITIES[obj.__tablename__],
+        ChangeFeedEntry.entity_id == obj.id
+    ).scalar() or 0
+    return f"{kind}:{obj.id}:{old_status}->{new_status}:{version}"
+
+def _message(subject, recipients, html_content):
+    msg = Message(subject, recipients=recipients)
+    msg.html = html_content
+    return [msg]
+
+def send_maintenance_alert(maintenance):
+    """Notify technicians and admins about a new maintenance request (sent after commit)."""
+    queue_email("maintenance_created", f"maintenance_created:{maintenance.id}", {"maintenanceId": maintenance.id})
+
+def _build_maintenance_alert(params):
+    maintenance = _get(Maintenance, params["maintenanceId"])
+    vehicle = _get(Vehicle, maintenance.vehicule_id) if maintenance else None
+    recipients = get_role_recipients(STAFF_ROLES)
+    if not vehicle or not recipients:
+        return []
 
     subject = f"Nouvelle demande d'intervention : {vehicle.immatriculation}"
-    
+    demandeur_name = maintenance.demandeur.name if maintenance.demandeur else "Inconnu"
+
     html_content = f"""
     <h3>Nouvelle demande d'intervention</h3>
-    <p>Une nouvelle demande a été soumise par <b>{maintenance.demandeur.name}</b>.</p>
+    <p>Une nouvelle demande a été soumise par <b>{demandeur_name}</b>.</p>
     <ul>
         <li><b>Véhicule :</b> {vehicle.immatriculation} ({vehicle.marque} {vehicle.modele})</li>
         <li><b>Type :</b> {maintenance.type}</li>
@@ -39,23 +128,30 @@ def send_maintenance_alert(maintenance, vehicle):
     </ul>
     <p>Veuillez vous connecter à l'application pour valider ou rejeter cette demande.</p>
     """
-    
-    msg = Message(subject, recipients=recipients)
-    msg.html = html_content
-    
-    send_email_async(msg)
 
-def send_status_update_notification(maintenance, vehicle):
-    """Notify the requester about the status change (accepted/rejected)."""
-    recipient = maintenance.demandeur.profile_email
-    if not recipient:
-        return
+    return _message(subject, recipients, html_content)
 
-    status_label = "Acceptée" if maintenance.statut == 'accepte' else "Rejetée"
+def send_status_update_notification(maintenance, old_status):
+    """Notify the requester about the status change (accepted/rejected), once per transition."""
+    queue_email(
+        "maintenance_status",
+        _transition_key("maintenance_status", maintenance, old_status, maintenance.statut),
+        {"maintenanceId": maintenance.id, "status": maintenance.statut}
+    )
+
+def _build_status_update_notification(params):
+    maintenance = _get(Maintenance, params["maintenanceId"])
+    vehicle = _get(Vehicle, maintenance.vehicule_id) if maintenance else None
+    recipient = maintenance.demandeur.profile_email if maintenance and maintenance.demandeur else None
+    if not vehicle or not recipient:
+        return []
+
+    status = params["status"]
+    status_label = "Acceptée" if status == 'accepte' else "Rejetée"
     subject = f"Votre demande d'intervention pour {vehicle.immatriculation} a été {status_label}"
-    
-    color = "green" if maintenance.statut == 'accepte' else "red"
-    
+
+    color = "green" if status == 'accepte' else "red"
+
     html_content = f"""
     <h3>Mise à jour de votre demande d'intervention</h3>
     <p>Votre demande pour le véhicule <b>{vehicle.immatriculation}</b> a été <b style="color: {color};">{status_label.lower()}</b>.</p>
@@ -66,58 +162,72 @@ def send_status_update_notification(maintenance, vehicle):
     </ul>
     <p>Merci de consulter l'application pour plus d'informations.</p>
     """
-    
-    msg = Message(subject, recipients=[recipient])
-    msg.html = html_content
-    
-    send_email_async(msg)
+
+    return _message(subject, [recipient], html_content)
 
 def send_mileage_limit_alert(vehicle, alert_type, current_km, threshold_km):
-    """Notify admins/technicians when a vehicle exceeds its mileage threshold for maintenance."""
-    recipients = [u.profile_email for u in User.query.filter(User.role.in_(['admin', 'technician'])).all() if u.profile_email]
-    if not recipients:
-        return
+    """
+    Notify admins/technicians when a vehicle exceeds its mileage threshold for maintenance.
+    Email and in-app notification join the caller's transaction; one alert per maintenance cycle.
+    """
+    from .notification_utils import create_notifications
+
+    last_km = vehicle.last_vidange_km if alert_type == 'vidange' else vehicle.last_filtre_km
+    queue_email(
+        "mileage_limit",
+        f"mileage_limit:{vehicle.id}:{alert_type}:{last_km or 0}",
+        {"vehicleId": vehicle.id, "alertType": alert_type, "currentKm": current_km,
+         "thresholdKm": threshold_km, "lastKm": last_km}
+    )
 
+    type_label = "vidange" if alert_type == 'vidange' else "changement de filtre"
+    create_notifications([{
+        "title": f"Alerte Maintenance: {vehicle.immatriculation}",
+        "message": f"Le véhicule {vehicle.immatriculation} a atteint le seuil de {type_label}.",
+        "type": "warning",
+        "target_role": "technician",
+        "link": "/vehicles"
+    }])
+
+    return True
+
+def _build_mileage_limit_alert(params):
+    vehicle = _get(Vehicle, params["vehicleId"])
+    recipients = get_role_recipients(STAFF_ROLES)
+    if not vehicle or not recipients:
+        return []
+
+    alert_type = params["alertType"]
     type_label = "vidange" if alert_type == 'vidange' else "changement de filtre"
     subject = f"ALERTE MAINTENANCE : {vehicle.immatriculation} ({type_label})"
-    
+
     html_content = f"""
     <h3 style="color: #d32f2f;">Alerte de Maintenance Automatique</h3>
     <p>Le véhicule <b>{vehicle.immatriculation}</b> ({vehicle.marque} {vehicle.modele}) a atteint le seuil critique pour : <b>{type_label.upper()}</b>.</p>
     <ul>
-        <li><b>Kilométrage actuel :</b> {current_km} km</li>
-        <li><b>Dernière intervention :</b> {vehicle.last_vidange_km if alert_type == 'vidange' else vehicle.last_filtre_km} km</li>
-        <li><b>Seuil d'alerte :</b> {threshold_km} km</li>
+        <li><b>Kilométrage actuel :</b> {params["currentKm"]} km</li>
+        <li><b>Dernière intervention :</b> {params["lastKm"]} km</li>
+        <li><b>Seuil d'alerte :</b> {params["thresholdKm"]} km</li>
     </ul>
     <p>Une intervention est nécessaire immédiatement.</p>
     <p>Veuillez planifier une maintenance depuis l'application.</p>
     """
-    
-    msg = Message(subject, recipients=recipients)
-    msg.html = html_content
-    
-    send_email_async(msg)
-    
-    # Also create an in-app notification
-    from .notification_utils import create_notification
-    create_notification(
-        title=f"Alerte Maintenance: {vehicle.immatriculation}",
-        message=f"Le véhicule {vehicle.immatriculation} a atteint le seuil de {type_label}.",
-        type="warning",
-        target_role="technician",
-        link="/vehicles"
-    )
-    
-    return True
 
-def send_planning_creation_alert(planning, vehicle):
-    """Notify admins/technicians about a new planning reservation."""
-    recipients = [u.profile_email for u in User.query.filter(User.role.in_(['admin', 'technician'])).all() if u.profile_email]
-    if not recipients:
-        return
+    return _message(subject, recipients, html_content)
+
+def send_planning_creation_alert(planning):
+    """Notify admins/technicians about a new planning reservation (sent after commit)."""
+    queue_email("planning_created", f"planning_created:{planning.id}", {"planningId": planning.id})
+
+def _build_planning_creation_alert(params):
+    planning = _get(Planning, params["planningId"])
+    vehicle = _get(Vehicle, planning.vehicule_id) if planning else None
+    recipients = get_role_recipients(STAFF_ROLES)
+    if not vehicle or not recipients:
+        return []
 
     subject = f"Nouvelle réservation Planning : {vehicle.immatriculation}"
-    
+
     creator_name = planning.created_by.name if planning.created_by else "Un utilisateur"
 
     html_content = f"""
@@ -132,23 +242,30 @@ def send_planning_creation_alert(planning, vehicle):
     </ul>
     <p>Connectez-vous pour valider ou rejeter cette demande.</p>
     """
-    
-    msg = Message(subject, recipients=recipients)
-    msg.html = html_content
-    
-    send_email_async(msg)
 
-def send_planning_status_notification(planning, vehicle):
-    """Notify the creator about the planning status change."""
-    if not planning.created_by or not planning.created_by.profile_email:
-        return
+    return _message(subject, recipients, html_content)
+
+def send_planning_status_notification(planning, old_status):
+    """Notify the creator about the planning status change, once per transition."""
+    queue_email(
+        "planning_status",
+        _transition_key("planning_status", planning, old_status, planning.status),
+        {"planningId": planning.id, "status": planning.status}
+    )
+
+def _build_planning_status_notification(params):
+    planning = _get(Planning, params["planningId"])
+    vehicle = _get(Vehicle, planning.vehicule_id) if planning else None
+    if not vehicle or not planning.created_by or not planning.created_by.profile_email:
+        return []
 
     recipient = planning.created_by.profile_email
-    status_label = "Acceptée" if planning.status == 'acceptee' else "Rejetée" if planning.status == 'rejetee' else planning.status
-    color = "green" if planning.status == 'acceptee' else "red" if planning.status == 'rejetee' else "gray"
-    
+    status = params["status"]
+    status_label = "Acceptée" if status == 'acceptee' else "Rejetée" if status == 'rejetee' else status
+    color = "green" if status == 'acceptee' else "red" if status == 'rejetee' else "gray"
+
     subject = f"Votre réservation pour {vehicle.immatriculation} a été {status_label}"
-    
+
     html_content = f"""
     <h3>Mise à jour de votre réservation</h3>
     <p>Votre réservation (Type: {planning.type}) pour le véhicule <b>{vehicle.immatriculation}</b> a été <b style="color: {color};">{status_label}</b>.</p>
@@ -158,20 +275,22 @@ def send_planning_status_notification(planning, vehicle):
         <li><b>Description :</b> {planning.description}</li>
     </ul>
     """
-    
-    msg = Message(subject, recipients=[recipient])
-    msg.html = html_content
-    
-    send_email_async(msg)
 
-def send_mission_creation_alert(mission, vehicle):
-    """Notify admins/technicians about a new mission."""
-    recipients = [u.profile_email for u in User.query.filter(User.role.in_(['admin', 'technician'])).all() if u.profile_email]
-    if not recipients:
-        return
+    return _message(subject, [recipient], html_content)
+
+def send_mission_creation_alert(mission):
+    """Notify admins/technicians about a new mission (sent after commit)."""
+    queue_email("mission_created", f"mission_created:{mission.id}", {"missionId": mission.id})
+
+def _build_mission_creation_alert(params):
+    mission = _get(Mission, params["missionId"])
+    vehicle = _get(Vehicle, mission.vehicule_id) if mission else None
+    recipients = get_role_recipients(STAFF_ROLES)
+    if not vehicle or not recipients:
+        return []
 
     subject = f"Nouvelle Mission Créée : {mission.reference}"
-    
+
     html_content = f"""
     <h3>Nouvelle Mission</h3>
     <p>Une nouvelle mission a été créée.</p>
@@ -183,43 +302,52 @@ def send_mission_creation_alert(mission, vehicle):
         <li><b>Dates :</b> {mission.date_debut} {f'au {mission.date_fin}' if mission.date_fin else ''}</li>
     </ul>
     """
-    
-    msg = Message(subject, recipients=recipients)
-    msg.html = html_content
-    
-    send_email_async(msg)
 
-def send_mission_status_notification(mission, vehicle):
-    """Notify admins/technicians about a mission status update."""
-    recipients = [u.profile_email for u in User.query.filter(User.role.in_(['admin', 'technician'])).all() if u.profile_email]
-    if not recipients:
-        return
+    return _message(subject, recipients, html_content)
+
+def send_mission_status_notification(mission, old_state):
+    """Notify admins/technicians about a mission status update, once per transition."""
+    queue_email(
+        "mission_status",
+        _transition_key("mission_status", mission, old_state, mission.state),
+        {"missionId": mission.id, "state": mission.state}
+    )
+
+def _build_mission_status_notification(params):
+    mission = _get(Mission, params["missionId"])
+    vehicle = _get(Vehicle, mission.vehicule_id) if mission else None
+    recipients = get_role_recipients(STAFF_ROLES)
+    if not vehicle or not recipients:
+        return []
+
+    state = params["state"]
+    subject = f"Mise à jour Mission : {mission.reference} ({state.upper()})"
 
-    subject = f"Mise à jour Mission : {mission.reference} ({mission.state.upper()})"
-    
     html_content = f"""
     <h3>Mise à jour de Mission</h3>
-    <p>La mission <b>{mission.reference}</b> est maintenant <b>{mission.state.upper()}</b>.</p>
+    <p>La mission <b>{mission.reference}</b> est maintenant <b>{state.upper()}</b>.</p>
     <ul>
         <li><b>Véhicule :</b> {vehicle.immatriculation}</li>
         <li><b>Missionnaire :</b> {mission.missionnaire or 'N/A'}</li>
     </ul>
     """
-    
-    msg = Message(subject, recipients=recipients)
-    msg.html = html_content
-    
-    send_email_async(msg)
 
-def send_fuel_creation_alert(fuel_entry, vehicle):
-    """Notify admins and technicians about a new fuel entry."""
-    recipients = [u.profile_email for u in User.query.filter(User.role.in_(['admin', 'technician'])).all() if u.profile_email]
-    if not recipients:
-        return
+    return _message(subject, recipients, html_content)
+
+def send_fuel_creation_alert(fuel_entry):
+    """Notify admins and technicians about a new fuel entry (sent after commit)."""
+    queue_email("fuel_created", f"fuel_created:{fuel_entry.id}", {"fuelEntryId": fuel_entry.id})
+
+def _build_fuel_creation_alert(params):
+    fuel_entry = _get(FuelEntry, params["fuelEntryId"])
+    vehicle = _get(Vehicle, fuel_entry.vehicule_id) if fuel_entry else None
+    recipients = get_role_recipients(STAFF_ROLES)
+    if not vehicle or not recipients:
+        return []
 
     subject = f"Nouvelle entrée Carburant : {vehicle.immatriculation}"
-    
-    driver_name = fuel_entry.driver.nom if fuel_entry.driver else "Inconnu"
+
+    driver_name = fuel_entry.demandeur.name if fuel_entry.demandeur else "Inconnu"
 
     html_content = f"""
     <h3>Nouveau plein de carburant enregistré</h3>
@@ -231,20 +359,30 @@ def send_fuel_creation_alert(fuel_entry, vehicle):
         <li><b>Kilométrage :</b> {fuel_entry.actuel_km} km</li>
     </ul>
     """
-    
-    msg = Message(subject, recipients=recipients)
-    msg.html = html_content
-    
-    send_email_async(msg)
 
-def send_reminder_alert(request_type, request_obj, vehicle):
-    """Send a reminder email for a pending request."""
-    recipients = [u.profile_email for u in User.query.filter(User.role.in_(['admin', 'technician'])).all() if u.profile_email]
-    if not recipients:
-        return
+    return _message(subject, recipients, html_content)
+
+REMINDER_MODELS = {"Mission": Mission, "Planning": Planning, "Maintenance": Maintenance}
+
+def send_reminder_alert(request_type, request_obj):
+    """Send a reminder email for a pending request (once per request and day)."""
+    queue_email(
+        "reminder",
+        f"reminder:{request_type}:{request_obj.id}:{date.today().isoformat()}",
+        {"requestType": request_type, "requestId": request_obj.id}
+    )
+
+def _build_reminder_alert(params):
+    request_type = params["requestType"]
+    model = REMINDER_MODELS.get(request_type)
+    request_obj = _get(model, params["requestId"]) if model else None
+    vehicle = _get(Vehicle, request_obj.vehicule_id) if request_obj else None
+    recipients = get_role_recipients(STAFF_ROLES)
+    if not vehicle or not recipients:
+        return []
 
     subject = f"RAPPEL : Demande {request_type} en attente - {vehicle.immatriculation}"
-    
+
     # Generic mapping based on request type
     details = ""
     if request_type == "Mission":
@@ -268,78 +406,116 @@ def send_reminder_alert(request_type, request_obj, vehicle):
     </ul>
     <p>Cette demande est prévue pour demain. Veuillez la traiter dès que possible dans l'application.</p>
     """
-    
-    msg = Message(subject, recipients=recipients)
-    msg.html = html_content
-    
-    send_email_async(msg)
-
-def send_document_expiry_alert(compliance, vehicle):
-    """Notify admins/technicians about a document expiring in 5 days."""
-    recipients = [u.profile_email for u in User.query.filter(User.role.in_(['admin', 'technician'])).all() if u.profile_email]
-    if not recipients:
-        return
-
-    days_remaining = (compliance.date_expiration - datetime.now().date()).days
-    subject = f"ALERTE ÉCHÉANCE : {compliance.type.upper()} - {vehicle.immatriculation} (Expire dans {days_remaining} jours)"
-    
-    type_labels = {
-        'assurance': 'Assurance',
-        'vignette': 'Vignette',
-        'visite_technique': 'Visite Technique',
-        'carte_rose': 'Carte Rose'
-    }
-    type_label = type_labels.get(compliance.type, compliance.type)
-    
+
+    return _message(subject, recipients, html_content)
+
+DOCUMENT_TYPE_LABELS = {
+    'assurance': 'Assurance',
+    'vignette': 'Vignette',
+    'visite_technique': 'Visite Technique',
+    'carte_rose': 'Carte Rose'
+}
+
+def send_document_expiry_digest(compliance_ids, today):
+    """Queue the expiry digest for these documents (one email per admin/technician)."""
+    ids = sorted(compliance_ids)
+    digest = hashlib.sha1(",".join(ids).encode()).hexdigest()[:16]
+    queue_email(
+        "document_expiry",
+        f"document_expiry:{today.isoformat()}:{digest}",
+        {"complianceIds": ids, "today": today.isoformat()}
+    )
+
+def _build_document_expiry_digest(params):
+    documents = db.session.query(
+        Compliance.id, Compliance.type, Compliance.numero_document, Compliance.date_expiration,
+        Compliance.prestataire, Vehicle.immatriculation, Vehicle.marque, Vehicle.modele
+    ).join(Vehicle, Vehicle.id == Compliance.vehicule_id).filter(
+        Compliance.id.in_(params["complianceIds"])
+    ).all()
+    if not documents:
+        return []
+    today = date.fromisoformat(params["today"])
+    return [build_document_expiry_digest(r, documents, today) for r in get_role_recipients(STAFF_ROLES)]
+
+def build_document_expiry_digest(recipient, documents, today):
+    """
+    One digest email listing every expiring document, grouped by vehicle then type.
+    `documents` are rows with compliance and vehicle columns (see check_expiring_documents).
+    """
+    by_vehicle = {}
+    for doc in sorted(documents, key=lambda d: (d.immatriculation or '', d.type, d.date_expiration)):
+        by_vehicle.setdefault((doc.immatriculation, doc.marque, doc.modele), []).append(doc)
+
+    sections = []
+    for (immatriculation, marque, modele), docs in by_vehicle.items():
+        rows = []
+        for doc in docs:
+            days_remaining = (doc.date_expiration - today).days
+            color = "#e74c3c" if days_remaining < 0 else "#f39c12"
+            remaining = f"Expiré depuis {-days_remaining} jours" if days_remaining < 0 else f"Expire dans {days_remaining} jours"
+            rows.append(f"""
+            <tr>
+                <td style="padding: 4px 8px;">{DOCUMENT_TYPE_LABELS.get(doc.type, doc.type)}</td>
+                <td style="padding: 4px 8px;">{doc.numero_document or 'N/A'}</td>
+                <td style="padding: 4px 8px;">{doc.date_expiration.strftime('%d/%m/%Y')}</td>
+                <td style="padding: 4px 8px; color: {color};"><b>{remaining}</b></td>
+                <td style="padding: 4px 8px;">{doc.prestataire or 'N/A'}</td>
+            </tr>""")
+        sections.append(f"""
+        <h4>{immatriculation} ({marque} {modele})</h4>
+        <table style="border-collapse: collapse;" border="1">
+            <tr><th>Document</th><th>Numéro</th><th>Expiration</th><th>Échéance</th><th>Prestataire</th></tr>
+            {''.join(rows)}
+        </table>""")
+
+    subject = f"ALERTE ÉCHÉANCES : {len(documents)} document(s) sur {len(by_vehicle)} véhicule(s)"
     html_content = f"""
-    <h3 style="color: #f39c12;">⚠️ Alerte d'Échéance Imminente</h3>
-    <p>Le document <b>{type_label}</b> du véhicule <b>{vehicle.immatriculation}</b> ({vehicle.marque} {vehicle.modele}) expire dans <b style="color: #e74c3c;">{days_remaining} jours</b>.</p>
-    <ul>
-        <li><b>Type de document :</b> {type_label}</li>
-        <li><b>Véhicule :</b> {vehicle.immatriculation} ({vehicle.marque} {vehicle.modele})</li>
-        <li><b>Numéro de document :</b> {compliance.numero_document or 'N/A'}</li>
-        <li><b>Date d'expiration :</b> {compliance.date_expiration.strftime('%d/%m/%Y')}</li>
-        <li><b>Prestataire :</b> {compliance.prestataire or 'N/A'}</li>
-    </ul>
-    <p style="color: #e74c3c;"><b>Action requise :</b> Veuillez planifier le renouvellement de ce document avant son expiration.</p>
-    <p>Connectez-vous à l'application pour gérer cette échéance.</p>
+    <h3 style="color: #f39c12;">⚠️ Documents arrivant à échéance</h3>
+    <p>Les documents suivants expirent dans les 5 prochains jours ou sont déjà expirés.</p>
+    {''.join(sections)}
+    <p style="color: #e74c3c;"><b>Action requise :</b> Veuillez planifier le renouvellement de ces documents.</p>
+    <p>Connectez-vous à l'application pour gérer ces échéances.</p>
     """
-    
-    msg = Message(subject, recipients=recipients)
+
+    msg = Message(subject, recipients=[recipient])
     msg.html = html_content
-    
-    send_email_async(msg)
-    
-    # Also create an in-app notification
-    from .notification_utils import create_notification
-    create_notification(
-        title=f"Échéance proche: {type_label}",
-        message=f"Le {type_label} du véhicule {vehicle.immatriculation} expire le {compliance.date_expiration.strftime('%d/%m/%Y')}.",
-        type="warning",
-        target_role="admin",
-        link="/compliance"
-    )
-    
-    return True
+    return msg
 
 def send_abnormal_fuel_alert(fuel_entry, vehicle, driver_name):
-    """Notify admins and technicians about an abnormal fuel transaction."""
-    print("DEBUG: Inside send_abnormal_fuel_alert")
-    recipients = [u.profile_email for u in User.query.filter(User.role.in_(['admin', 'technician'])).all() if u.profile_email]
-    print(f"DEBUG: Found {len(recipients)} recipients: {recipients}")
-    if not recipients:
-        print("DEBUG: No recipients found, exiting.")
-        return
+    """
+    Notify admins and technicians about an abnormal fuel transaction.
+    Email and in-app notification join the caller's transaction; one alert per fuel entry.
+    """
+    from .notification_utils import create_notifications
+
+    queue_email("abnormal_fuel", f"abnormal_fuel:{fuel_entry.id}", {"fuelEntryId": fuel_entry.id, "driverName": driver_name})
+
+    create_notifications([{
+        "title": f"Anomalie Carburant: {vehicle.immatriculation}",
+        "message": f"Quantité ({fuel_entry.quantite_rechargee}L) supérieure à la capacité ({vehicle.capacite_reservoir}L).",
+        "type": "error",
+        "target_role": "admin",
+        "link": "/fuel"
+    }])
+
+    return True
+
+def _build_abnormal_fuel_alert(params):
+    fuel_entry = _get(FuelEntry, params["fuelEntryId"])
+    vehicle = _get(Vehicle, fuel_entry.vehicule_id) if fuel_entry else None
+    recipients = get_role_recipients(STAFF_ROLES)
+    if not vehicle or not recipients:
+        return []
 
     subject = f"⚠️ ALERTE : Consommation de carburant anormale - {vehicle.immatriculation}"
-    print(f"DEBUG: Preparing email with subject: {subject}")
-    
+
     html_content = f"""
     <h3 style="color: #e74c3c;">🚨 Alerte de Consommation Anormale Detectée</h3>
     <p>Une transaction de carburant suspecte a été enregistrée pour le véhicule <b>{vehicle.immatriculation}</b>.</p>
     <div style="background-color: #fcebea; padding: 15px; border-radius: 8px; border: 1px solid #e74c3c;">
         <ul>
-            <li><b>Conducteur :</b> {driver_name}</li>
+            <li><b>Conducteur :</b> {params["driverName"]}</li>
             <li><b>Véhicule :</b> {vehicle.immatriculation} ({vehicle.marque} {vehicle.modele})</li>
             <li><b>Quantité Achetée (QTEacheter) :</b> <span style="color: #e74c3c; font-weight: bold;">{fuel_entry.quantite_achetee:.2f} L</span></li>
             <li><b>Quantité Rechargée (QTErecharger) :</b> {fuel_entry.quantite_rechargee:.2f} L</li>
@@ -352,23 +528,133 @@ def send_abnormal_fuel_alert(fuel_entry, vehicle, driver_name):
     <p style="font-weight: bold;">Une vérification et une explication du conducteur sont nécessaires.</p>
     <p>Veuillez consulter les détails complets dans l'application.</p>
     """
-    
-    msg = Message(subject, recipients=recipients)
-    msg.html = html_content
-    
-    print("DEBUG: Calling send_email_async")
-    send_email_async(msg)
-    
-    # Also create an in-app notification
-    print("DEBUG: Creating in-app notification")
-    from .notification_utils import create_notification
-    create_notification(
-        title=f"Anomalie Carburant: {vehicle.immatriculation}",
-        message=f"Quantité ({fuel_entry.quantite_rechargee}L) supérieure à la capacité ({vehicle.capacite_reservoir}L).",
-        type="error",
-        target_role="admin",
-        link="/fuel"
+
+    return _message(subject, recipients, html_content)
+
+MONTH_NAMES = ['', 'Janvier', 'Février', 'Mars', 'Avril', 'Mai', 'Juin',
+               'Juillet', 'Août', 'Septembre', 'Octobre', 'Novembre', 'Décembre']
+
+def send_budget_overrun_alert(vehicle, year, month, forecast, consumed):
+    """
+    Alert when a vehicle exceeds its monthly fuel budget.
+    Email and in-app notification join the caller's transaction; one alert per vehicle and month.
+    """
+    from .notification_utils import create_notifications
+
+    queue_email(
+        "budget_overrun",
+        f"budget_overrun:{vehicle.id}:{year}-{month:02d}",
+        {"vehicleId": vehicle.id, "year": year, "month": month, "forecast": forecast, "consumed": consumed}
     )
-    
-    print("DEBUG: send_abnormal_fuel_alert completed")
-    return True
+
+    overrun_percent = ((consumed / forecast) - 1) * 100 if forecast > 0 else 0
+    create_notifications([{
+        "title": f"Budget dépassé: {vehicle.immatriculation}",
+        "message": f"Budget {MONTH_NAMES[month]}: {consumed:,.0f} Ar / {forecast:,.0f} Ar (+{overrun_percent:.1f}%)",
+        "type": "error",
+        "target_role": "admin",
+        "link": "/fuel/year-end-stats"
+    }])
+
+def _build_budget_overrun_alert(params):
+    vehicle = _get(Vehicle, params["vehicleId"])
+    recipients = get_role_recipients(STAFF_ROLES)
+    if not vehicle or not recipients:
+        return []
+
+    year, month = params["year"], params["month"]
+    forecast, consumed = params["forecast"], params["consumed"]
+    month_name = MONTH_NAMES[month]
+
+    overrun_amount = consumed - forecast
+    overrun_percent = ((consumed / forecast) - 1) * 100 if forecast > 0 else 0
+
+    subject = f"⚠️ BUDGET DÉPASSÉ : {vehicle.immatriculation} - {month_name} {year}"
+
+    html_content = f"""
+    <h3 style="color: #e74c3c;">⚠️ Dépassement Budgétaire Détecté</h3>
+    <p>Le véhicule <b>{vehicle.immatriculation}</b> ({vehicle.marque} {vehicle.modele}) a dépassé son budget carburant.</p>
+    <div style="background-color: #fcebea; padding: 15px; border-radius: 8px; border: 1px solid #e74c3c; margin: 15px 0;">
+        <ul>
+            <li><b>Mois :</b> {month_name} {year}</li>
+            <li><b>Budget prévu :</b> {forecast:,.0f} Ar</li>
+            <li><b>Montant consommé :</b> <span style="color: #e74c3c; font-weight: bold;">{consumed:,.0f} Ar</span></li>
+            <li><b>Dépassement :</b> <span style="color: #e74c3c; font-weight: bold;">{overrun_amount:,.0f} Ar ({overrun_percent:.1f}%)</span></li>
+        </ul>
+    </div>
+    <p><b>Action requise :</b> Veuillez vérifier la consommation de carburant et prendre les mesures appropriées.</p>
+    <p>Connectez-vous à l'application pour plus de détails.</p>
+    """
+
+    return _message(subject, recipients, html_content)
+
+def queue_email_digests(frequency):
+    """
+    Queue one digest email per recipient gathering its pending `frequency` events.
+    The events are marked digested in the same transaction; returns the number of digests.
+    """
+    events = db.session.query(DigestEvent.id, DigestEvent.recipient).filter(
+        DigestEvent.frequency == frequency,
+        DigestEvent.digested_at.is_(None)
+    ).order_by(DigestEvent.recipient, DigestEvent.id).all()
+    if not events:
+        return 0
+
+    by_recipient = {}
+    for event_id, recipient in events:
+        by_recipient.setdefault(recipient, []).append(event_id)
+    for recipient, ids in by_recipient.items():
+        queue_email(
+            "digest",
+            f"digest:{frequency}:{recipient}:{ids[0]}-{ids[-1]}",
+            {"recipient": recipient, "frequency": frequency, "eventIds": ids}
+        )
+    db.session.execute(
+        update(DigestEvent)
+        .where(DigestEvent.id.in_([event.id for event in events]))
+        .values(digested_at=datetime.utcnow())
+    )
+    db.session.commit()
+    return len(by_recipient)
+
+def _build_digest(params):
+    events = db.session.query(DigestEvent.subject, DigestEvent.body, DigestEvent.created_at).filter(
+        DigestEvent.id.in_(params["eventIds"])
+    ).order_by(DigestEvent.id).all()
+    if not events:
+        return []
+
+    label = DIGEST_LABELS.get(params["frequency"], params["frequency"])
+    subject = f"Récapitulatif {label} : {len(events)} alerte(s)"
+
+    sections = [f"""
+    <div style="border-top: 1px solid #ddd; margin-top: 15px; padding-top: 10px;">
+        <p style="color: #888; font-size: 12px;">{event.created_at.strftime('%d/%m/%Y %H:%M')} — <b>{event.subject}</b></p>
+        {event.body}
+    </div>""" for event in events]
+
+    html_content = f"""
+    <h3>Récapitulatif {label} de vos alertes</h3>
+    <p>{len(events)} alerte(s) depuis le dernier récapitulatif.</p>
+    {''.join(sections)}
+    <p>Connectez-vous à l'application pour plus de détails.</p>
+    """
+
+    return _message(subject, [params["recipient"]], html_content)
+
+# Outbox kind -> builder(params) returning the messages to send ([] when nobody is left to notify)
+EMAIL_BUILDERS = {
+    "maintenance_created": _build_maintenance_alert,
+    "maintenance_status": _build_status_update_notification,
+    "mileage_limit": _build_mileage_limit_alert,
+    "planning_created": _build_planning_creation_alert,
+    "planning_status": _build_planning_status_notification,
+    "mission_created": _build_mission_creation_alert,
+    "mission_status": _build_mission_status_notification,
+    "fuel_created": _build_fuel_creation_alert,
+    "reminder": _build_reminder_alert,
+    "document_expiry": _build_document_expiry_digest,
+    "abnormal_fuel": _build_abnormal_fuel_alert,
+    "budget_overrun": _build_budget_overrun_alert,
+    "digest": _build_digest,
+}
@@ -0,0 +1,241 @@
+import atexit
+import json
+import os
+import queue
+import select
+import threading
+import time
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from .. import db
+
+# Canal PostgreSQL utilisé pour diffuser les événements entre workers
+PG_CHANNEL = "fiara_events"
+
+# NOTIFY limite la charge utile à 8000 octets
+MAX_MESSAGE_LENGTH = 500
+
+# Commits en attente de publication (au-delà, les plus récents sont abandonnés)
+MAX_PENDING_COMMITS = 1000
+
+
+class Subscription:
+    """File d'événements d'un client SSE connecté."""
+
+    def __init__(self, user_id, role, channels, maxsize=100):
+        self.user_id = user_id
+        self.role = role
+        self.channels = set(channels)
+        self.queue = queue.Queue(maxsize=maxsize)
+
+    def accepts(self, event) -> bool:
+        if event["event"] not in self.channels:
+            return False
+        if event.get("userId") and event["userId"] != self.user_id:
+            return False
+        roles = event.get("roles")
+        if roles and self.role not in roles:
+            return False
+        return True
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            # Client trop lent : on abandonne l'événement le plus ancien
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                pass
+            self.queue.put_nowait(event)
+
+    def get(self, timeout):
+        return self.queue.get(timeout=timeout)
+
+
+class EventHub:
+    """
+    Diffuse les événements d'écriture aux clients SSE de ce worker.
+    Sur PostgreSQL, les événements passent par LISTEN/NOTIFY pour atteindre tous les workers.
+    Les commits sont publiés par un thread du hub : la requête qui écrit n'attend ni les
+    lectures (notifications, badges) ni le NOTIFY.
+    """
+
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._listener = None
+        self._publisher = None
+        self._pid = None
+        self._pending = queue.Queue(maxsize=MAX_PENDING_COMMITS)
+        self._stop = threading.Event()
+        self._app = None
+        self.uses_postgres = False
+        self.dropped = 0
+
+    def init_app(self, app):
+        self._app = app
+        self.uses_postgres = app.config["SQLALCHEMY_DATABASE_URI"].startswith("postgresql")
+        atexit.register(self.shutdown)
+
+    def subscribe(self, user_id, role, channels) -> Subscription:
+        sub = Subscription(user_id, role, channels)
+        with self._lock:
+            self._subscribers.add(sub)
+        if self.uses_postgres:
+            self._ensure_listener()
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def publish(self, event, data, roles=None, user_id=None):
+        """Publie un événement (à appeler après le commit de l'écriture)."""
+        message = {"event": event, "data": data, "roles": roles, "userId": user_id}
+        if self.uses_postgres:
+            try:
+                with db.engine.begin() as conn:
+                    conn.execute(text("SELECT pg_notify(:channel, :payload)"),
+                                 {"channel": PG_CHANNEL, "payload": json.dumps(message)})
+                return
+            except Exception as e:
+                print(f"Error publishing event through NOTIFY: {e}")
+        self.publish_local(message)
+
+    def publish_local(self, message):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            if sub.accepts(message):
+                sub.put(message)
+
+    def enqueue_changes(self, changes):
+        """Confie les écritures d'un commit au thread de publication."""
+        self._ensure_publisher()
+        try:
+            self._pending.put_nowait(changes)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                print(f"Event hub queue full: {self.dropped} commit(s) not published")
+
+    def _ensure_publisher(self):
+        # Démarré au premier commit, et redémarré dans un processus fils (fork des workers)
+        if self._publisher is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._publisher is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._publisher = threading.Thread(target=self._publish_loop, name="event-hub-publisher", daemon=True)
+            self._publisher.start()
+
+    def _publish_loop(self):
+        while not self._stop.is_set():
+            try:
+                changes = self._pending.get(timeout=1)
+            except queue.Empty:
+                continue
+            # Regroupe les commits arrivés entre-temps : les badges ne sont recalculés qu'une fois
+            while True:
+                try:
+                    changes = changes + self._pending.get_nowait()
+                except queue.Empty:
+                    break
+            try:
+                with self._app.app_context():
+                    publish_changes(changes)
+            except Exception as e:
+                print(f"Error publishing changes: {e}")
+
+    def shutdown(self):
+        self._stop.set()
+
+    def _ensure_listener(self):
+        with self._lock:
+            if self._listener and self._listener.is_alive():
+                return
+            self._listener = threading.Thread(target=self._listen, name="event-hub-listener", daemon=True)
+            self._listener.start()
+
+    def _listen(self):
+        while True:
+            raw = None
+            try:
+                with self._app.app_context():
+                    raw = db.engine.raw_connection()
+                    raw.detach()
+                conn = raw.driver_connection
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {PG_CHANNEL}")
+                while True:
+                    if select.select([conn], [], [], 30) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        self.publish_local(json.loads(notify.payload))
+            except Exception as e:
+                print(f"Event hub listener error, reconnecting: {e}")
+                if raw is not None:
+                    # Connexion détachée du pool : la fermer, sinon elle reste ouverte côté serveur
+                    try:
+                        raw.close()
+                    except Exception:
+                        pass
+                time.sleep(5)
+
+
+hub = EventHub()
+
+
+def _publish_changes(changes):
+    """Écouteur de commit : les événements SSE sont préparés hors de la requête."""
+    from .notification_utils import BADGE_TABLES
+
+    changes = [c for c in changes if c.table in ("planning", "notifications") or c.table in BADGE_TABLES]
+    if changes:
+        hub.enqueue_changes(changes)
+
+
+def publish_changes(changes):
+    """Transforme les écritures d'un ou plusieurs commits en événements SSE."""
+    from ..models import Notification
+    from .notification_utils import get_badge_counts, BADGE_TABLES, BADGE_ROLES
+
+    planning = [{"id": c.entity_id, "op": c.op} for c in changes if c.table == "planning"]
+    if planning:
+        hub.publish("planning", {"changes": planning})
+
+    notification_ids = [c.entity_id for c in changes if c.table == "notifications" and c.op == "upsert"]
+    badges_changed = any(c.table in BADGE_TABLES for c in changes)
+    if not notification_ids and not badges_changed:
+        return
+
+    with Session(db.engine) as session:
+        notifications = session.query(Notification).filter(Notification.id.in_(notification_ids)).all() if notification_ids else []
+        for notif in notifications:
+            roles = [r.strip() for r in notif.target_role.split(",")] if notif.target_role else None
+            hub.publish("notifications", {
+                "id": notif.id,
+                "title": notif.title,
+                "message": notif.message[:MAX_MESSAGE_LENGTH],
+                "type": notif.type,
+                "link": notif.link,
+                "timestamp": notif.timestamp.isoformat(),
+                "isRead": False,
+            }, roles=roles, user_id=notif.target_user_id)
+
+        if badges_changed:
+            hub.publish("badges", get_badge_counts(session), roles=BADGE_ROLES)
+
+
+def init_event_hub(app):
+    from .change_feed import register_commit_listener
+    hub.init_app(app)
+    register_commit_listener(_publish_changes)
@@ -1,69 +1,42 @@
-import json
+import uuid
 from datetime import datetime
-from flask import request, g
-from ..models import ActionLog, User, db
+from flask import g
+from .audit_log import audit_log
+from .auth_utils import current_user_from_request
 
-def log_action(user_id=None, action=None, entite=None, entite_id=None, details=None):
+def log_action(user_id=None, action=None, entite=None, entite_id=None, details=None, payload=None):
     """
-    Enregistre une action utilisateur dans la base de données.
+    Enregistre une action utilisateur dans le journal d'audit.
     Priorité : user_id argument > g.user (via décorateur) > token manuel.
+    `payload` : données structurées interrogeables (ex. {"vehicleIds": [...]}).
+    L'écriture est différée (voir audit_log) : aucun commit ni I/O dans la requête.
     """
     try:
-        debug_info = {
-            "timestamp": datetime.utcnow().isoformat(),
-            "action": action,
-            "passed_user_id": user_id,
-            "g_has_user": hasattr(g, 'user'),
-            "g_user": str(g.user.id) if hasattr(g, 'user') and g.user else None,
-            "auth_header": request.headers.get('Authorization') is not None
-        }
-
         if not user_id:
             # 2. Try to get it from flask global context (populated by token_required)
             if hasattr(g, 'user') and g.user:
                 user_id = g.user.id
             else:
-                # 3. Fallback to manual token extraction from headers
-                auth_header = request.headers.get('Authorization')
-                if auth_header:
-                    # Handle both "Bearer <token>" and "<token>" formats
-                    if auth_header.startswith('Bearer '):
-                        token = auth_header.split(" ")[1]
-                    else:
-                        token = auth_header
-                    
-                    user = User.query.filter_by(token=token).first()
-                    if user:
-                        user_id = user.id
-                        debug_info["manual_user"] = user.id
-                    else:
-                        debug_info["manual_user"] = "NOT FOUND"
-        
-        debug_info["final_user_id"] = user_id
-        
-        try:
-            with open(r"c:\Parc_auto\back\backend_debug.log", "a") as f:
-                f.write(json.dumps(debug_info) + "\n")
-        except Exception as e:
-            print(f"DEBUG LOG ERROR: {e}")
+                # 3. Fallback to the request token (auth cache)
+                user = current_user_from_request()
+                if user:
+                    user_id = user.id
 
         # 4. Final fallback for system actions or unidentified processes
         if not user_id:
             user_id = "system" 
 
-        new_log = ActionLog(
-            id=f"log_{int(datetime.utcnow().timestamp() * 1000)}", 
-            user_id=user_id,
-            action=action,
-            entite=entite,
-            entite_id=str(entite_id) if entite_id else "N/A",
-            details=details,
-            timestamp=datetime.utcnow()
-        )
-        db.session.add(new_log)
-        db.session.commit()
+        now = datetime.utcnow()
+        audit_log.enqueue({
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "action": action,
+            "entite": entite,
+            "entite_id": str(entite_id) if entite_id else "N/A",
+            "details": details,
+            "payload": payload,
+            "timestamp": now,
+            "minute_of_day": now.hour * 60 + now.minute
+        })
     except Exception as e:
-        db.session.rollback()
         print(f"Error logging action: {e}")
-        import traceback
-        traceback.print_exc()
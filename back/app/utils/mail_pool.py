@@ -0,0 +1,143 @@
+"""
+Envoi des emails par un pool fixe de workers.
+
+Les emails sont déposés dans une file bornée (MAIL_QUEUE_SIZE) ; MAIL_WORKERS threads
+la vident, chacun en gardant sa connexion SMTP ouverte tant qu'il a du travail
+(fermée après MAIL_IDLE_TIMEOUT secondes d'inactivité). Les erreurs temporaires
+(connexion perdue, réponse 4xx) sont retentées MAIL_RETRY_ATTEMPTS fois avec une
+attente croissante ; au-delà de la capacité de la file, les emails sont abandonnés
+et comptés. Le nombre de threads et de sockets ne dépend donc jamais du volume.
+"""
+import atexit
+import os
+import queue
+import smtplib
+import threading
+import time
+
+from .. import mail
+
+
+def _is_temporary(error):
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    return isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, OSError))
+
+
+class MailPool:
+    def __init__(self):
+        self._app = None
+        self._queue = None
+        self._threads = []
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def init_app(self, app):
+        self._app = app
+        self.workers = app.config.get("MAIL_WORKERS", 2)
+        self.idle_timeout = app.config.get("MAIL_IDLE_TIMEOUT", 30)
+        self.retry_attempts = app.config.get("MAIL_RETRY_ATTEMPTS", 3)
+        self.retry_backoff = app.config.get("MAIL_RETRY_BACKOFF", 2)
+        self._queue = queue.Queue(maxsize=app.config.get("MAIL_QUEUE_SIZE", 1000))
+        atexit.register(self.shutdown)
+
+    def submit(self, msg, callback=None):
+        """
+        Dépose un email dans la file ; l'envoi se fait hors de la requête.
+        `callback(error)` est appelée une fois l'email traité (error vaut None s'il est parti).
+        """
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((msg, callback))
+        except queue.Full:
+            self.dropped += 1
+            print(f"Email queue full, dropping email to {msg.recipients} ({self.dropped} dropped)")
+            if callback is not None:
+                callback(RuntimeError("mail queue full"))
+
+    def _ensure_started(self):
+        # Démarré au premier email, et redémarré dans un processus fils (fork des workers)
+        if self._threads and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._threads and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._threads = [
+                threading.Thread(target=self._run, name=f"mail-worker-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def _run(self):
+        with self._app.app_context():
+            conn, last_used = None, 0
+            try:
+                while not (self._stop.is_set() and self._queue.empty()):
+                    try:
+                        msg, callback = self._queue.get(timeout=1)
+                    except queue.Empty:
+                        if conn is not None and time.monotonic() - last_used >= self.idle_timeout:
+                            conn = self._close(conn)
+                        continue
+                    conn, error = self._send(conn, msg)
+                    last_used = time.monotonic()
+                    if callback is not None:
+                        try:
+                            callback(error)
+                        except Exception as e:
+                            print(f"Error in email callback: {e}")
+            finally:
+                self._close(conn)
+
+    def _send(self, conn, msg):
+        """
+        Envoie msg sur la connexion du worker (ouverte au besoin).
+        Retourne (connexion à garder, erreur définitive ou None).
+        """
+        for attempt in range(self.retry_attempts + 1):
+            try:
+                if conn is None:
+                    conn = mail.connect().__enter__()
+                conn.send(msg)
+                self.sent += 1
+                return conn, None
+            except Exception as e:
+                conn = self._close(conn)
+                if not _is_temporary(e) or attempt == self.retry_attempts:
+                    self.failed += 1
+                    print(f"Error sending email to {msg.recipients}: {e}")
+                    return None, e
+                delay = self.retry_backoff * (2 ** attempt)
+                print(f"Email to {msg.recipients} failed ({e}), retrying in {delay}s")
+                time.sleep(delay)
+        return conn, None
+
+    def _close(self, conn):
+        if conn is not None:
+            try:
+                conn.__exit__(None, None, None)
+            except Exception:
+                pass
+        return None
+
+    def shutdown(self, timeout=10):
+        """Laisse les workers vider la file (au plus `timeout` secondes)."""
+        self._stop.set()
+        if self._pid == os.getpid():
+            deadline = time.monotonic() + timeout
+            for thread in self._threads:
+                thread.join(max(0, deadline - time.monotonic()))
+
+
+mail_pool = MailPool()
+
+
+def init_mail_pool(app):
+    mail_pool.init_app(app)
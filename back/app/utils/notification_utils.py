@@ -1,25 +1,150 @@
-from datetime import datetime
-from ..models import Notification, db
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import insert, select, delete, literal, func, or_, and_
+from ..models import (
+    Notification, NotificationInbox, NotificationRead, NotificationArchive, NotificationInboxArchive, User, db
+)
+from .badge_counters import read_badge_counters
+from .cache import get_or_compute
+
+# Tables dont les écritures modifient les compteurs de la barre latérale
+BADGE_TABLES = {"missions", "maintenances", "planning", "compliance", "badge_counters"}
+BADGE_ROLES = ["admin", "technician"]
+BADGE_CACHE_KEY = "badges"
+BADGE_CACHE_TTL = 30
 
 def create_notification(title, message, type='info', target_role=None, target_user_id=None, link=None):
     """
     Crée une nouvelle notification dans la base de données.
     """
     try:
-        new_notification = Notification(
-            id=f"notif_{int(datetime.utcnow().timestamp() * 1000)}",
-            title=title,
-            message=message,
-            type=type,
-            target_role=target_role,
-            target_user_id=target_user_id,
-            link=link,
-            timestamp=datetime.utcnow()
-        )
-        db.session.add(new_notification)
+        new_notification = create_notifications([{
+            "title": title,
+            "message": message,
+            "type": type,
+            "target_role": target_role,
+            "target_user_id": target_user_id,
+            "link": link,
+        }])[0]
         db.session.commit()
         return new_notification
     except Exception as e:
         print(f"Error creating notification: {e}")
         db.session.rollback()
         return None
+
+
+def create_notifications(items):
+    """
+    Crée plusieurs notifications (dicts title, message, type, target_role, target_user_id, link)
+    dans la transaction de l'appelant, sans commit : un INSERT groupé pour les notifications,
+    un INSERT ... SELECT pour toutes les boîtes de réception.
+    """
+    now = datetime.utcnow()
+    notifications = [Notification(
+        id=str(uuid.uuid4()),
+        title=item["title"],
+        message=item["message"],
+        type=item.get("type", "info"),
+        target_role=item.get("target_role"),
+        target_user_id=item.get("target_user_id"),
+        link=item.get("link"),
+        timestamp=now,
+    ) for item in items]
+    if not notifications:
+        return []
+
+    db.session.add_all(notifications)
+    db.session.flush()
+    deliver_notifications([n.id for n in notifications])
+    return notifications
+
+
+def recipient_match():
+    """
+    Condition de jointure notifications x users : utilisateur ciblé, l'un des rôles
+    de target_role (liste séparée par des virgules, correspondance exacte), ou tous
+    les utilisateurs si la notification n'a pas de cible.
+    """
+    role_list = literal(",") + func.replace(Notification.target_role, " ", "") + literal(",")
+    return or_(
+        User.id == Notification.target_user_id,
+        role_list.like(literal("%,") + User.role + literal(",%")),
+        and_(Notification.target_role.is_(None), Notification.target_user_id.is_(None)),
+    )
+
+
+def deliver_notifications(notification_ids):
+    """Remplit la boîte de réception de chaque destinataire des notifications données."""
+    db.session.execute(insert(NotificationInbox).from_select(
+        ["user_id", "notification_id", "created_at", "is_read"],
+        select(User.id, Notification.id, Notification.timestamp, literal(False))
+        .join(Notification, recipient_match())
+        .where(Notification.id.in_(notification_ids)),
+    ))
+
+
+def archive_old_notifications(retention_days, batch_size=1000, archive_days=0):
+    """
+    Déplace les notifications plus anciennes que `retention_days` (et leurs boîtes de
+    réception) vers les tables d'archive, par lots de `batch_size` avec un commit par lot,
+    pour ne jamais tenir de longs verrous. Les archives plus anciennes que `archive_days`
+    sont supprimées (0 = conservées). Retourne (archivées, supprimées).
+    """
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    archived = 0
+    while True:
+        ids = [row[0] for row in db.session.execute(
+            select(Notification.id).where(Notification.timestamp < cutoff)
+            .order_by(Notification.timestamp).limit(batch_size)
+        ).all()]
+        if not ids:
+            break
+
+        inbox_columns = ["user_id", "notification_id", "created_at", "is_read", "read_at"]
+        db.session.execute(insert(NotificationInboxArchive).from_select(
+            inbox_columns,
+            select(*[getattr(NotificationInbox, c) for c in inbox_columns])
+            .where(NotificationInbox.notification_id.in_(ids)),
+        ))
+        notif_columns = ["id", "title", "message", "type", "target_role", "target_user_id", "link", "timestamp"]
+        db.session.execute(insert(NotificationArchive).from_select(
+            notif_columns + ["archived_at"],
+            select(*[getattr(Notification, c) for c in notif_columns], literal(datetime.utcnow(), db.DateTime))
+            .where(Notification.id.in_(ids)),
+        ))
+        db.session.execute(delete(NotificationInbox).where(NotificationInbox.notification_id.in_(ids)))
+        db.session.execute(delete(NotificationRead).where(NotificationRead.notification_id.in_(ids)))
+        db.session.execute(delete(Notification).where(Notification.id.in_(ids)))
+        db.session.commit()
+        archived += len(ids)
+
+    purged = 0
+    if archive_days:
+        purge_cutoff = datetime.utcnow() - timedelta(days=archive_days)
+        while True:
+            ids = [row[0] for row in db.session.execute(
+                select(NotificationArchive.id).where(NotificationArchive.timestamp < purge_cutoff).limit(batch_size)
+            ).all()]
+            if not ids:
+                break
+            db.session.execute(delete(NotificationInboxArchive).where(NotificationInboxArchive.notification_id.in_(ids)))
+            db.session.execute(delete(NotificationArchive).where(NotificationArchive.id.in_(ids)))
+            db.session.commit()
+            purged += len(ids)
+
+    return archived, purged
+
+
+def get_badge_counts(session=None):
+    """
+    Compteurs de la barre latérale (identiques pour tous les admins/techniciens).
+    Une seule lecture des lignes badge_counters, tenues à jour à chaque commit.
+    `session` permet d'appeler la fonction hors de la session de la requête.
+    """
+    return read_badge_counters(session)
+
+
+def cached_badge_counts():
+    """Compteurs partagés par tous les utilisateurs des rôles BADGE_ROLES (mémoire du worker)."""
+    return get_or_compute(BADGE_CACHE_KEY, get_badge_counts, BADGE_CACHE_TTL, BADGE_TABLES)
@@ -0,0 +1,215 @@
+"""
+Affectation automatique des demandes de réservation en attente.
+
+Algorithme glouton par priorité : les demandes sortent d'une file de priorité
+(priorite, date_debut) et chaque véhicule garde une ligne de temps triée de ses
+créneaux occupés (réservations acceptées, maintenances, affectations déjà
+proposées) ; la disponibilité se vérifie par recherche dichotomique.
+Une passe de recherche locale optionnelle tente ensuite de placer les demandes
+restées sans véhicule en déplaçant une affectation concurrente vers un autre véhicule.
+"""
+import heapq
+from bisect import bisect_left, insort
+
+# Statuts de véhicule qui excluent toute affectation
+UNAVAILABLE_VEHICLE_STATUSES = {"technique", "exceptionnel", "en_maintenance"}
+
+# Les demandes de maintenance restent sur leur véhicule
+FIXED_VEHICLE_TYPES = {"maintenance"}
+
+
+class Timeline:
+    """Créneaux occupés d'une ressource, triés par début (intervalles semi-ouverts)."""
+
+    def __init__(self):
+        self.slots = []  # (start, end, owner)
+
+    def add(self, start, end, owner=None):
+        insort(self.slots, (start, end, owner or ""))
+
+    def remove(self, owner):
+        self.slots = [s for s in self.slots if s[2] != owner]
+
+    def conflicts(self, start, end):
+        """Créneaux qui chevauchent [start, end)."""
+        # Aucun créneau commençant après `end` ne peut chevaucher
+        idx = bisect_left(self.slots, (end,))
+        return [s for s in self.slots[:idx] if s[1] > start]
+
+    def is_free(self, start, end) -> bool:
+        return not self.conflicts(start, end)
+
+    def gap_before(self, start):
+        """Temps libre entre la fin du créneau précédent et `start` (plus petit = meilleur remplissage)."""
+        idx = bisect_left(self.slots, (start,))
+        ends = [s[1] for s in self.slots[:idx] if s[1] <= start]
+        return (start - max(ends)).total_seconds() if ends else float("inf")
+
+
+def _reject(request, reason):
+    return {"planningId": request["id"], "reason": reason}
+
+
+class AutoAssignSolver:
+    """
+    requests : dicts {id, vehicule_id, conducteur_id, start, end, priorite, zone, numero_om, type}
+    vehicles : dicts {id, type_vehicule, statut}
+    drivers  : dicts {id, vehicule_assigne_id}
+    vehicle_busy / driver_busy : {id: [(start, end), ...]} créneaux déjà engagés
+    """
+
+    def __init__(self, requests, vehicles, drivers, vehicle_busy=None, driver_busy=None):
+        self.requests = {r["id"]: r for r in requests}
+        self.vehicles = {v["id"]: v for v in vehicles if v.get("statut") not in UNAVAILABLE_VEHICLE_STATUSES}
+        self.vehicle_types = {v["id"]: v.get("type_vehicule") for v in vehicles}
+        self.drivers = {d["id"]: d for d in drivers}
+        self.vehicle_timelines = {vid: Timeline() for vid in self.vehicles}
+        self.driver_timelines = {did: Timeline() for did in self.drivers}
+
+        for vid, slots in (vehicle_busy or {}).items():
+            if vid in self.vehicle_timelines:
+                for start, end in slots:
+                    self.vehicle_timelines[vid].add(start, end)
+        for did, slots in (driver_busy or {}).items():
+            if did in self.driver_timelines:
+                for start, end in slots:
+                    self.driver_timelines[did].add(start, end)
+
+        self.assignments = {}  # planning_id -> (vehicule_id, conducteur_id)
+        self.unassigned = {}
+
+    # --- Candidats -------------------------------------------------------
+
+    def candidate_vehicles(self, request):
+        """Véhicules libres pour la demande, le véhicule demandé d'abord puis le meilleur remplissage."""
+        start, end = request["start"], request["end"]
+        if request.get("type") in FIXED_VEHICLE_TYPES:
+            vid = request["vehicule_id"]
+            timeline = self.vehicle_timelines.get(vid)
+            return [vid] if timeline and timeline.is_free(start, end) else []
+
+        wanted_type = self.vehicle_types.get(request["vehicule_id"])
+        free = [vid for vid, timeline in self.vehicle_timelines.items() if timeline.is_free(start, end)]
+        return sorted(free, key=lambda vid: (
+            vid != request["vehicule_id"],
+            self.vehicle_types.get(vid) != wanted_type,
+            self.vehicle_timelines[vid].gap_before(start),
+            vid,
+        ))
+
+    def pick_driver(self, request, vehicle_id):
+        start, end = request["start"], request["end"]
+
+        def free(did):
+            timeline = self.driver_timelines.get(did)
+            return timeline is not None and timeline.is_free(start, end)
+
+        if request.get("conducteur_id"):
+            return request["conducteur_id"] if free(request["conducteur_id"]) else False
+
+        assigned = [did for did, d in self.drivers.items() if d.get("vehicule_assigne_id") == vehicle_id and free(did)]
+        if assigned:
+            return sorted(assigned)[0]
+        others = [did for did, d in self.drivers.items() if not d.get("vehicule_assigne_id") and free(did)]
+        return sorted(others)[0] if others else None
+
+    # --- Affectation -----------------------------------------------------
+
+    def _place(self, request, vehicle_id, driver_id):
+        start, end = request["start"], request["end"]
+        self.vehicle_timelines[vehicle_id].add(start, end, request["id"])
+        if driver_id:
+            self.driver_timelines[driver_id].add(start, end, request["id"])
+        self.assignments[request["id"]] = (vehicle_id, driver_id)
+        self.unassigned.pop(request["id"], None)
+
+    def _unplace(self, request_id):
+        vehicle_id, driver_id = self.assignments.pop(request_id)
+        self.vehicle_timelines[vehicle_id].remove(request_id)
+        if driver_id:
+            self.driver_timelines[driver_id].remove(request_id)
+
+    def try_assign(self, request) -> bool:
+        if request["end"] <= request["start"]:
+            self.unassigned[request["id"]] = _reject(request, "Dates invalides")
+            return False
+        if request.get("zone") == "periferie" and not request.get("numero_om"):
+            self.unassigned[request["id"]] = _reject(request, "Numéro d'OM manquant pour la périphérie")
+            return False
+
+        driver_blocked = False
+        for vehicle_id in self.candidate_vehicles(request):
+            driver_id = self.pick_driver(request, vehicle_id)
+            if driver_id is False:
+                driver_blocked = True
+                continue
+            self._place(request, vehicle_id, driver_id)
+            return True
+
+        reason = "Conducteur indisponible" if driver_blocked else "Aucun véhicule disponible sur ce créneau"
+        self.unassigned[request["id"]] = _reject(request, reason)
+        return False
+
+    def improve(self):
+        """
+        Recherche locale : pour chaque demande non placée, libérer un véhicule en déplaçant
+        la seule affectation concurrente (de priorité égale ou moindre) vers un autre véhicule libre.
+        """
+        for request_id in sorted(self.unassigned, key=lambda rid: (self.requests[rid]["priorite"], self.requests[rid]["start"])):
+            request = self.requests[request_id]
+            if request.get("zone") == "periferie" and not request.get("numero_om"):
+                continue
+            for vehicle_id, timeline in self.vehicle_timelines.items():
+                if request.get("type") in FIXED_VEHICLE_TYPES and vehicle_id != request["vehicule_id"]:
+                    continue
+                blocking = timeline.conflicts(request["start"], request["end"])
+                if len(blocking) != 1 or blocking[0][2] not in self.assignments:
+                    continue
+                other = self.requests[blocking[0][2]]
+                if other["priorite"] < request["priorite"] or other.get("type") in FIXED_VEHICLE_TYPES:
+                    continue
+
+                previous = self.assignments[other["id"]]
+                self._unplace(other["id"])
+                alternatives = [vid for vid in self.candidate_vehicles(other) if vid != vehicle_id]
+                moved = False
+                for alt in alternatives:
+                    alt_driver = self.pick_driver(other, alt)
+                    if alt_driver is False:
+                        continue
+                    self._place(other, alt, alt_driver)
+                    moved = True
+                    break
+                driver_id = self.pick_driver(request, vehicle_id) if moved else False
+                if moved and driver_id is not False:
+                    self._place(request, vehicle_id, driver_id)
+                    break
+                # Annuler le déplacement
+                if moved:
+                    self._unplace(other["id"])
+                self._place(other, *previous)
+
+    def solve(self, improve=True):
+        heap = [(r["priorite"], r["start"], r["id"]) for r in self.requests.values()]
+        heapq.heapify(heap)
+        while heap:
+            _, _, request_id = heapq.heappop(heap)
+            self.try_assign(self.requests[request_id])
+
+        if improve and self.unassigned:
+            self.improve()
+
+        assignments = []
+        for request_id, (vehicle_id, driver_id) in sorted(self.assignments.items(), key=lambda item: self.requests[item[0]]["start"]):
+            request = self.requests[request_id]
+            assignments.append({
+                "planningId": request_id,
+                "vehiculeId": vehicle_id,
+                "conducteurId": driver_id,
+                "previousVehiculeId": request["vehicule_id"],
+                "previousConducteurId": request.get("conducteur_id"),
+                "dateDebut": request["start"].isoformat(),
+                "dateFin": request["end"].isoformat(),
+                "priorite": request["priorite"],
+            })
+        return assignments, list(self.unassigned.values())
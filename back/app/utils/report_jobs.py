@@ -0,0 +1,210 @@
+"""
+Calcul des rapports lourds en arrière-plan, avec résultats stockés.
+
+Chaque rapport déclare les entités du flux de changements dont il dépend ; son
+résultat est rangé dans report_jobs sous la clé (rapport, paramètres, version des
+données = dernier curseur de ces entités). Tant qu'aucune de ces entités ne change,
+les demandes suivantes sont servies depuis la table sans recalcul.
+
+Le calcul se fait toujours sur l'exécuteur de rapports, jamais dans la requête : une
+demande sans résultat stocké reçoit un job (202) à suivre via /api/reports/jobs/<id>.
+La ligne report_jobs (pending) est écrite dès la demande, dans sa propre transaction :
+le job est suivi depuis n'importe quel worker, même s'il attend encore une place sur
+l'exécuteur. Un job pending / running depuis plus de STALE_AFTER (worker arrêté) est
+signalé en échec. _inflight évite de lancer deux fois le même job dans un worker.
+"""
+import hashlib
+import json
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+from flask import current_app, jsonify
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from .. import db
+from ..models import ReportJob
+from .change_feed import latest_seq
+
+# Rapport -> (fonction de calcul(params) -> données JSON, entités du flux)
+REPORTS = {}
+
+# Au-delà, un job resté en attente / en cours est considéré perdu (worker redémarré)
+STALE_AFTER = timedelta(minutes=10)
+
+_executor = None
+
+# (rapport, params_hash, version) -> colonnes du job lancé par ce worker, pas encore terminé
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def register_report(name, entities):
+    """Déclare fn(params) comme rapport calculable en arrière-plan."""
+    def decorator(fn):
+        REPORTS[name] = (fn, tuple(entities))
+        return fn
+    return decorator
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=current_app.config.get("REPORT_WORKERS", 2),
+            thread_name_prefix="report-job",
+        )
+    return _executor
+
+
+def _normalize(report, params):
+    # Les rapports dépendent aussi de la date du jour (année courante, ancienneté)
+    params = {k: v for k, v in (params or {}).items() if v is not None}
+    params.setdefault("asOf", date.today().isoformat())
+    encoded = json.dumps(params, sort_keys=True, default=str)
+    return params, hashlib.sha256(f"{report}:{encoded}".encode()).hexdigest()
+
+
+def data_version(report) -> int:
+    return latest_seq(REPORTS[report][1])
+
+
+def _is_stale(job):
+    """En attente / en cours depuis plus de STALE_AFTER : le worker qui le portait s'est arrêté."""
+    since = job.started_at or job.created_at
+    return job.status in ("pending", "running") and since < datetime.utcnow() - STALE_AFTER
+
+
+def find_job(report, params_hash, version):
+    """Job réutilisable : terminé, ou encore en cours et pas trop ancien."""
+    jobs = ReportJob.query.filter_by(report=report, params_hash=params_hash, data_version=version).filter(
+        ReportJob.status.in_(("done", "pending", "running"))
+    ).order_by(ReportJob.created_at.desc()).all()
+    for job in jobs:
+        if not _is_stale(job):
+            return job
+    return None
+
+
+def submit_report(report, params=None, user_id=None) -> ReportJob:
+    """
+    Retourne le job existant pour ces paramètres et cette version des données, sinon en lance un.
+    Le job est écrit dans sa propre transaction, pas dans celle de l'appelant (utilisable depuis un GET).
+    """
+    params, params_hash = _normalize(report, params)
+    version = data_version(report)
+
+    job = find_job(report, params_hash, version)
+    if job:
+        return job
+
+    key = (report, params_hash, version)
+    with _inflight_lock:
+        values = _inflight.get(key)
+        if values is None:
+            values = {
+                "id": str(uuid.uuid4()),
+                "report": report,
+                "params": json.dumps(params, default=str),
+                "params_hash": params_hash,
+                "data_version": version,
+                "status": "pending",
+                "requested_by_id": user_id,
+                "created_at": datetime.utcnow(),
+            }
+            with Session(db.engine) as session:
+                session.add(ReportJob(**values))
+                session.commit()
+            _inflight[key] = values
+            _get_executor().submit(_run_job, current_app._get_current_object(), key, values)
+    # Copie transitoire (hors session) : les colonnes partagées ne sont jamais modifiées
+    return ReportJob(**values)
+
+
+def get_job(job_id):
+    """Job stocké (None s'il est inconnu) ; un job perdu est marqué en échec pour que le client relance."""
+    job = db.session.get(ReportJob, job_id)
+    if job is None or not _is_stale(job):
+        return job
+    with Session(db.engine) as session:
+        session.execute(
+            update(ReportJob)
+            .where(ReportJob.id == job_id, ReportJob.status.in_(("pending", "running")))
+            .values(status="failed", error="Job interrompu (worker arrêté)", finished_at=datetime.utcnow())
+        )
+        session.commit()
+    db.session.refresh(job)
+    return job
+
+
+def report_response(report, params=None):
+    """
+    Réponse d'une route de rapport : le résultat stocké (200) si les données n'ont pas
+    changé, sinon le job lancé en arrière-plan (202), à suivre via /api/reports/jobs/<id>.
+    """
+    job = submit_report(report, params)
+    if job.status == "done":
+        # Le JSON stocké est renvoyé tel quel, sans décodage ni réencodage
+        return current_app.response_class(job.result, mimetype="application/json"), 200
+    return jsonify(job_to_dict(job)), 202
+
+
+def _purge_superseded(report, params_hash, version):
+    """Supprime les résultats des versions précédentes pour ces paramètres."""
+    ReportJob.query.filter(
+        ReportJob.report == report,
+        ReportJob.params_hash == params_hash,
+        ReportJob.data_version < version,
+        ReportJob.status.in_(("done", "failed")),
+    ).delete(synchronize_session=False)
+
+
+def _run_job(app, key, values):
+    with app.app_context():
+        try:
+            job = db.session.get(ReportJob, values["id"])
+            if job is None:
+                return
+            job.status = "running"
+            job.started_at = datetime.utcnow()
+            db.session.commit()
+
+            compute, _ = REPORTS[job.report]
+            try:
+                job.result = app.json.dumps(compute(json.loads(job.params)))
+                job.status = "done"
+            except Exception as e:
+                db.session.rollback()
+                job = db.session.get(ReportJob, values["id"])
+                job.status = "failed"
+                job.error = str(e)
+                print(f"Error computing report {job.report}: {e}")
+            job.finished_at = datetime.utcnow()
+            if job.status == "done":
+                _purge_superseded(job.report, job.params_hash, job.data_version)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error running report job {values['report']}: {e}")
+        finally:
+            with _inflight_lock:
+                _inflight.pop(key, None)
+            db.session.remove()
+
+
+def job_to_dict(job: ReportJob, include_result=True):
+    data = {
+        "id": job.id,
+        "report": job.report,
+        "params": json.loads(job.params or "{}"),
+        "dataVersion": job.data_version,
+        "status": job.status,
+        "error": job.error,
+        "createdAt": job.created_at.isoformat() if job.created_at else None,
+        "finishedAt": job.finished_at.isoformat() if job.finished_at else None,
+    }
+    if include_result and job.status == "done":
+        data["result"] = json.loads(job.result)
+    return data
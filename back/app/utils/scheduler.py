@@ -4,6 +4,8 @@ from flask import current_app
 
 def init_scheduler(app):
     """Initialize and start the background scheduler for periodic tasks."""
+    if not app.config.get("SCHEDULER_ENABLED", True):
+        return
     scheduler = BackgroundScheduler()
     
     # Schedule the document expiry check to run daily at 9:00 AM
@@ -28,6 +30,87 @@ def init_scheduler(app):
         replace_existing=True
     )
     
+    # Recount sidebar badges (drift from bulk updates, 30-day compliance window moving daily)
+    scheduler.add_job(
+        func=lambda: reconcile_badges(app),
+        trigger='interval',
+        minutes=10,
+        id='reconcile_badges',
+        name='Reconcile sidebar badge counters',
+        replace_existing=True
+    )
+    scheduler.add_job(
+        func=lambda: reconcile_badges(app),
+        trigger='cron',
+        hour=0,
+        minute=1,
+        id='reconcile_badges_daily',
+        name='Reconcile sidebar badge counters after midnight',
+        replace_existing=True
+    )
+    
+    # Move old notifications to the archive tables (nightly, in batches)
+    scheduler.add_job(
+        func=lambda: archive_notifications(app),
+        trigger='cron',
+        hour=2,
+        minute=30,
+        id='archive_notifications',
+        name='Archive notifications past the retention period',
+        replace_existing=True
+    )
+    
+    # Drop token revocations once every token they target has expired
+    scheduler.add_job(
+        func=lambda: purge_token_revocations(app),
+        trigger='cron',
+        hour=3,
+        minute=0,
+        id='purge_token_revocations',
+        name='Purge expired session token revocations',
+        replace_existing=True
+    )
+    
+    # Send outbox emails left pending (other processes, restarts, failed attempts)
+    scheduler.add_job(
+        func=lambda: dispatch_email_outbox(app),
+        trigger='interval',
+        minutes=1,
+        id='dispatch_email_outbox',
+        name='Dispatch pending outbox emails',
+        replace_existing=True
+    )
+    
+    # Alert digests for the users who chose hourly or daily emails
+    scheduler.add_job(
+        func=lambda: send_email_digests(app, 'hourly'),
+        trigger='cron',
+        minute=0,
+        id='send_hourly_digests',
+        name='Send hourly alert digests',
+        replace_existing=True
+    )
+    scheduler.add_job(
+        func=lambda: send_email_digests(app, 'daily'),
+        trigger='cron',
+        hour=7,
+        minute=30,
+        id='send_daily_digests',
+        name='Send daily alert digests',
+        replace_existing=True
+    )
+    
+    # Drop processed outbox rows past the retention period
+    scheduler.add_job(
+        func=lambda: purge_email_outbox(app),
+        trigger='cron',
+        hour=3,
+        minute=15,
+        id='purge_email_outbox',
+        name='Purge processed outbox emails',
+        replace_existing=True
+    )
+    
     scheduler.start()
     print("Scheduler initialized: Daily document expiry checks at 9:00 AM")
     
@@ -42,13 +125,105 @@ def init_scheduler(app):
     import atexit
     atexit.register(lambda: scheduler.shutdown())
 
+def reconcile_badges(app):
+    """Recount badge counters from the source tables."""
+    with app.app_context():
+        from .. import db
+        from .badge_counters import reconcile_badge_counters
+        try:
+            counts = reconcile_badge_counters()
+            print(f"Badge counters reconciled: {counts}")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error reconciling badge counters: {e}")
+        finally:
+            db.session.remove()
+
+def archive_notifications(app):
+    """Apply the notification retention policy."""
+    with app.app_context():
+        from .. import db
+        from .notification_utils import archive_old_notifications
+        try:
+            archived, purged = archive_old_notifications(
+                app.config["NOTIFICATION_RETENTION_DAYS"],
+                app.config["NOTIFICATION_ARCHIVE_BATCH"],
+                app.config["NOTIFICATION_ARCHIVE_DAYS"],
+            )
+            print(f"Notifications archived: {archived}, archive rows purged: {purged}")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error archiving notifications: {e}")
+        finally:
+            db.session.remove()
+
+def purge_token_revocations(app):
+    """Delete revocations whose targeted tokens have all expired."""
+    with app.app_context():
+        from .. import db
+        from .session_tokens import purge_expired_revocations
+        try:
+            purged = purge_expired_revocations()
+            print(f"Token revocations purged: {purged}")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error purging token revocations: {e}")
+        finally:
+            db.session.remove()
+
+def dispatch_email_outbox(app):
+    """Hand pending outbox rows to the mail pool."""
+    from .email_outbox import email_outbox
+    try:
+        dispatched = email_outbox.dispatch()
+        if dispatched:
+            print(f"Email outbox: {dispatched} email(s) dispatched")
+    except Exception as e:
+        print(f"Error dispatching email outbox: {e}")
+
+def send_email_digests(app, frequency):
+    """Queue one digest email per recipient for the pending hourly or daily alerts."""
+    with app.app_context():
+        from .. import db
+        from .email_utils import queue_email_digests
+        try:
+            digests = queue_email_digests(frequency)
+            print(f"Email digests ({frequency}): {digests} queued")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error queueing {frequency} email digests: {e}")
+        finally:
+            db.session.remove()
+
+def purge_email_outbox(app):
+    """Delete outbox rows processed more than EMAIL_OUTBOX_RETENTION_DAYS ago."""
+    with app.app_context():
+        from .. import db
+        from .email_outbox import purge_email_outbox as purge
+        try:
+            purged = purge(app.config["EMAIL_OUTBOX_RETENTION_DAYS"])
+            print(f"Email outbox rows purged: {purged}")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error purging email outbox: {e}")
+        finally:
+            db.session.remove()
+
 def check_expiring_documents(app):
-    """Check for documents expiring in the next 5 days and send alerts."""
+    """
+    Check for documents expiring in the next 5 days and send alerts.
+    One joined query, one UPDATE for the alert flags, one outbox row for the digest emails.
+    """
     with app.app_context():
+        from sqlalchemy import update
         from ..models import Compliance, Vehicle
         from .. import db
-        from .email_utils import send_document_expiry_alert
+        from .email_utils import send_document_expiry_digest, get_role_recipients, STAFF_ROLES
+        from .notification_utils import create_notifications
         from datetime import datetime
+        import time
+        
+        started = time.perf_counter()
         
         # Calculate the target date range (up to 5 days from now)
         today = datetime.now().date()
@@ -56,30 +231,47 @@ def check_expiring_documents(app):
         
         # Find all compliance entries expiring within the next 5 days (or already expired)
         # that haven't been alerted yet (handle False or NULL)
-        expiring_docs = Compliance.query.filter(
+        expiring_docs = db.session.query(
+            Compliance.id, Compliance.type, Compliance.numero_document, Compliance.date_expiration,
+            Compliance.prestataire, Vehicle.immatriculation, Vehicle.marque, Vehicle.modele
+        ).join(Vehicle, Vehicle.id == Compliance.vehicule_id).filter(
             Compliance.date_expiration <= max_target_date,
             (Compliance.expiry_alert_sent == False) | (Compliance.expiry_alert_sent == None)
         ).all()
         
         print(f"Checking for documents expiring between {today} and {max_target_date}")
         print(f"Found {len(expiring_docs)} document(s) to alert")
+        if not expiring_docs:
+            return 0
+        
+        vehicles = {doc.immatriculation for doc in expiring_docs}
+        
+        try:
+            # Mark all as alerted, notify in-app and queue the digest emails, in one transaction
+            db.session.execute(
+                update(Compliance)
+                .where(Compliance.id.in_([doc.id for doc in expiring_docs]))
+                .values(expiry_alert_sent=True, expiry_alert_sent_at=datetime.now())
+            )
+            create_notifications([{
+                "title": "Échéances proches",
+                "message": f"{len(expiring_docs)} document(s) sur {len(vehicles)} véhicule(s) expirent d'ici le {max_target_date.strftime('%d/%m/%Y')}.",
+                "type": "warning",
+                "target_role": "admin",
+                "link": "/compliance"
+            }])
+            send_document_expiry_digest([doc.id for doc in expiring_docs], today)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error marking expiring documents as alerted: {e}")
+            return 0
         
-        for compliance in expiring_docs:
-            vehicle = Vehicle.query.get(compliance.vehicule_id)
-            if vehicle:
-                try:
-                    # Send the email alert
-                    send_document_expiry_alert(compliance, vehicle)
-                    
-                    # Mark as alerted
-                    compliance.expiry_alert_sent = True
-                    compliance.expiry_alert_sent_at = datetime.now()
-                    db.session.commit()
-                    
-                    print(f"Alert sent for {compliance.type} - {vehicle.immatriculation}")
-                except Exception as e:
-                    print(f"Error sending alert for {compliance.type} - {vehicle.immatriculation}: {e}")
-                    db.session.rollback()
+        # Digest recipients, resolved the same way by the outbox when it builds the emails
+        recipients = get_role_recipients(STAFF_ROLES)
+        duration_ms = (time.perf_counter() - started) * 1000
+        print(f"Document expiry sweep: {len(expiring_docs)} document(s), {len(vehicles)} vehicle(s), "
+              f"{len(recipients)} recipient(s), {duration_ms:.0f} ms")
         
         return len(expiring_docs)
 
@@ -0,0 +1,151 @@
+"""
+Tokens de session signés (HMAC avec SECRET_KEY, via itsdangerous).
+
+Le token porte l'utilisateur, son rôle, sa date d'émission, son expiration et un
+identifiant unique (jti) : il se vérifie sans accès à la base, et un utilisateur
+peut avoir plusieurs sessions ouvertes. Les révocations (déconnexion d'une
+session, ou de toutes les sessions d'un utilisateur après changement de rôle,
+désactivation ou suppression) sont stockées dans token_revocations ; chaque worker en garde une
+copie en mémoire, rechargée toutes les TOKEN_REVOCATION_REFRESH secondes.
+"""
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from flask import current_app
+from itsdangerous import URLSafeSerializer
+from sqlalchemy import delete, event, inspect, select
+from sqlalchemy.orm import Session
+
+from .. import db
+from ..models import TokenRevocation, User
+
+TOKEN_SALT = "fiara-session"
+
+
+def _serializer():
+    return URLSafeSerializer(current_app.config["SECRET_KEY"], salt=TOKEN_SALT)
+
+
+def _to_datetime(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).replace(tzinfo=None)
+
+
+def _to_timestamp(dt):
+    return dt.replace(tzinfo=timezone.utc).timestamp()
+
+
+def token_expiry(claims):
+    """Expiration d'un token signé (datetime UTC naïf, comme les colonnes de la base)."""
+    return _to_datetime(claims["exp"])
+
+
+def issue_token(user):
+    """Token signé pour une nouvelle session de `user`."""
+    now = time.time()
+    return _serializer().dumps({
+        "uid": user.id,
+        "role": user.role,
+        "iat": now,
+        "exp": now + current_app.config.get("AUTH_TOKEN_MAX_AGE", 12 * 3600),
+        "jti": uuid.uuid4().hex,
+    })
+
+
+def decode_token(token):
+    """
+    Claims d'un token signé valide (signature, expiration, révocation), sinon None.
+    Lève BadSignature si ce n'est pas un token signé (ancien token aléatoire).
+    """
+    claims = _serializer().loads(token)
+    if claims.get("exp", 0) < time.time():
+        return None
+    if revocations.is_revoked(claims):
+        return None
+    return claims
+
+
+class RevocationList:
+    """Copie en mémoire des révocations encore utiles (jti révoqués, not_before par utilisateur)."""
+
+    def __init__(self):
+        self._jtis = set()
+        self._not_before = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def is_revoked(self, claims):
+        self._refresh_if_stale()
+        with self._lock:
+            if claims.get("jti") in self._jtis:
+                return True
+            return claims.get("iat", 0) < self._not_before.get(claims.get("uid"), 0)
+
+    def _refresh_if_stale(self):
+        interval = current_app.config.get("TOKEN_REVOCATION_REFRESH", 15)
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < interval:
+            return
+        with Session(db.engine) as session:
+            rows = session.execute(
+                select(TokenRevocation.jti, TokenRevocation.user_id, TokenRevocation.not_before)
+                .where(TokenRevocation.expires_at > datetime.utcnow())
+            ).all()
+        jtis, not_before = set(), {}
+        for jti, user_id, nb in rows:
+            if jti:
+                jtis.add(jti)
+            elif nb is not None:
+                not_before[user_id] = max(not_before.get(user_id, 0), _to_timestamp(nb))
+        with self._lock:
+            self._jtis, self._not_before = jtis, not_before
+            self._loaded_at = time.monotonic()
+
+    def revoke_token(self, claims):
+        """Révoque une session (déconnexion). Ajoutée à la session de l'appelant, qui commit."""
+        db.session.add(TokenRevocation(
+            jti=claims["jti"], user_id=claims["uid"], expires_at=token_expiry(claims)
+        ))
+        with self._lock:
+            self._jtis.add(claims["jti"])
+
+    def revoke_user(self, user_id, session=None):
+        """Révoque toutes les sessions ouvertes de l'utilisateur (rôle modifié, désactivation, suppression)."""
+        now = time.time()
+        max_age = current_app.config.get("AUTH_TOKEN_MAX_AGE", 12 * 3600)
+        (session or db.session).add(TokenRevocation(
+            user_id=user_id, not_before=_to_datetime(now), expires_at=_to_datetime(now + max_age)
+        ))
+        with self._lock:
+            self._not_before[user_id] = now
+
+
+revocations = RevocationList()
+
+
+def _revoke_deactivated(session, flush_context, instances):
+    """
+    Un token signé porte le statut « active » : tout utilisateur qui quitte ce statut
+    (désactivation, remise en attente) voit ses sessions révoquées dans la même transaction.
+    Les UPDATE en masse sur users.status contournent l'ORM et doivent appeler revoke_user.
+    """
+    for obj in session.dirty:
+        if not isinstance(obj, User):
+            continue
+        # L'ancienne valeur n'est pas toujours chargée : tout statut écrit autre qu'« active » révoque
+        if inspect(obj).attrs.status.history.added and obj.status != "active":
+            revocations.revoke_user(obj.id, session)
+
+
+def init_session_tokens():
+    """Branche l'écouteur de session qui révoque les tokens des comptes désactivés."""
+    if event.contains(db.session, "before_flush", _revoke_deactivated):
+        return
+    event.listen(db.session, "before_flush", _revoke_deactivated)
+
+
+def purge_expired_revocations():
+    """Supprime les révocations dont les tokens visés ont tous expiré."""
+    result = db.session.execute(delete(TokenRevocation).where(TokenRevocation.expires_at <= datetime.utcnow()))
+    db.session.commit()
+    return result.rowcount
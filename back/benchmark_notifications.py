@@ -0,0 +1,159 @@
+"""
+Benchmark: notification inbox vs legacy role filter
+
+Seeds 100k notifications (role-targeted, user-targeted and system-wide) into a
+scratch database and compares, for one admin user:
+  - legacy: role OR LIKE filter on notifications + all notification_reads in Python
+  - inbox : latest 50 and unread count on notification_inbox (indexed)
+
+The scratch database defaults to a temporary SQLite file; set BENCH_DATABASE_URL
+to a dedicated PostgreSQL database to measure the production engine.
+Never point it at the application database: all tables are dropped first.
+"""
+
+import os
+import random
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, or_, and_
+
+from app import create_app, db
+from app.config import Config
+from app.models import User, Notification, NotificationRead, NotificationInbox
+
+NOTIFICATIONS = int(os.environ.get("BENCH_NOTIFICATIONS", "100000"))
+RUNS = 20
+LEGACY_RUNS = 3  # Plusieurs secondes par appel à 100k
+ROLES = {"admin": 5, "technician": 10, "direction": 5, "collaborator": 30, "driver": 50}
+TARGET_ROLES = ["admin", "admin,technician", "admin,direction", "technician"]
+
+
+class BenchConfig(Config):
+    SQLALCHEMY_DATABASE_URI = os.environ.get(
+        "BENCH_DATABASE_URL",
+        f"sqlite:///{os.path.join(tempfile.gettempdir(), 'fiara_bench_notifications.db')}",
+    )
+
+
+def seed():
+    db.drop_all()
+    db.create_all()
+
+    users = []
+    for role, count in ROLES.items():
+        for i in range(count):
+            users.append({"id": str(uuid.uuid4()), "name": f"{role} {i}", "email": f"{role}{i}@bench.local",
+                          "role": role, "created_at": datetime.utcnow().date(),
+                          "status": "active"})
+    db.session.execute(insert(User), users)
+
+    roles_of = {}
+    for u in users:
+        roles_of.setdefault(u["role"], []).append(u["id"])
+    all_ids = [u["id"] for u in users]
+
+    start = datetime.utcnow() - timedelta(days=365)
+    batch_notifs, batch_inbox, batch_reads = [], [], []
+    for i in range(NOTIFICATIONS):
+        r = random.random()
+        target_role = target_user = None
+        if r < 0.6:
+            target_role = random.choice(TARGET_ROLES)
+            recipients = [uid for role in target_role.split(",") for uid in roles_of[role]]
+        elif r < 0.99:
+            target_user = random.choice(all_ids)
+            recipients = [target_user]
+        else:
+            recipients = all_ids
+
+        nid = f"bench_{i}"
+        ts = start + timedelta(seconds=i * 300)
+        batch_notifs.append({"id": nid, "title": "Bench", "message": "Benchmark notification", "type": "info",
+                             "target_role": target_role, "target_user_id": target_user, "timestamp": ts})
+        for uid in recipients:
+            is_read = random.random() < 0.8
+            batch_inbox.append({"user_id": uid, "notification_id": nid, "created_at": ts, "is_read": is_read})
+            if is_read:
+                batch_reads.append({"user_id": uid, "notification_id": nid, "read_at": ts})
+
+        if len(batch_notifs) >= 5000:
+            flush_batches(batch_notifs, batch_inbox, batch_reads)
+    flush_batches(batch_notifs, batch_inbox, batch_reads)
+    db.session.commit()
+
+
+def flush_batches(notifs, inbox, reads):
+    if notifs:
+        db.session.execute(insert(Notification), notifs)
+    if inbox:
+        db.session.execute(insert(NotificationInbox), inbox)
+    if reads:
+        db.session.execute(insert(NotificationRead), reads)
+    notifs.clear()
+    inbox.clear()
+    reads.clear()
+
+
+def legacy(user):
+    notifications = Notification.query.filter(
+        or_(
+            Notification.target_role == user.role,
+            Notification.target_role.like(f"%{user.role}%"),
+            Notification.target_user_id == user.id,
+            and_(Notification.target_role.is_(None), Notification.target_user_id.is_(None))
+        )
+    ).order_by(Notification.timestamp.desc()).limit(50).all()
+    read_ids = [r.notification_id for r in NotificationRead.query.filter_by(user_id=user.id).all()]
+    latest = [n.id in read_ids for n in notifications]
+
+    # L'ancien client comptait les non lues sur la page ; le compte exact demande tout le filtre
+    all_ids = [n.id for n in Notification.query.with_entities(Notification.id).filter(
+        or_(
+            Notification.target_role.like(f"%{user.role}%"),
+            Notification.target_user_id == user.id,
+            and_(Notification.target_role.is_(None), Notification.target_user_id.is_(None))
+        )
+    ).all()]
+    unread = sum(1 for nid in all_ids if nid not in read_ids)
+    return latest, unread
+
+
+def inbox(user):
+    latest = db.session.query(Notification, NotificationInbox.is_read).join(
+        NotificationInbox, NotificationInbox.notification_id == Notification.id
+    ).filter(NotificationInbox.user_id == user.id).order_by(NotificationInbox.created_at.desc()).limit(50).all()
+    unread = db.session.query(func.count()).select_from(NotificationInbox).filter(
+        NotificationInbox.user_id == user.id, NotificationInbox.is_read.is_(False)
+    ).scalar()
+    return latest, unread
+
+
+def measure(label, fn, user, runs=RUNS):
+    fn(user)  # Warm-up
+    timings = []
+    for _ in range(runs):
+        db.session.expire_all()
+        t0 = time.perf_counter()
+        _, unread = fn(user)
+        timings.append((time.perf_counter() - t0) * 1000)
+    timings.sort()
+    print(f"  {label:<8} median {timings[len(timings) // 2]:8.2f} ms   p90 {timings[int(len(timings) * 0.9)]:8.2f} ms   unread={unread}")
+
+
+app = create_app(BenchConfig)
+
+with app.app_context():
+    print(f"Database: {db.engine.url.render_as_string(hide_password=True)}")
+    print(f"Seeding {NOTIFICATIONS} notifications...")
+    t0 = time.perf_counter()
+    seed()
+    print(f"  done in {time.perf_counter() - t0:.1f}s "
+          f"({NotificationInbox.query.count()} inbox rows, {NotificationRead.query.count()} reads)")
+
+    user = User.query.filter_by(role="admin").first()
+    print(f"\nUser: {user.email}")
+    measure("legacy", legacy, user, LEGACY_RUNS)
+    measure("inbox", inbox, user)
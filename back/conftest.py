@@ -0,0 +1,144 @@
+"""
+Fixtures des tests automatisés (pytest) : l'application tourne sur une base SQLite
+jetable, sans planificateur, et les emails ne partent pas (TESTING).
+
+Les autres scripts test_*.py de ce dossier (et de tools/) sont des vérifications
+manuelles sur la base PostgreSQL ou l'API lancée : ils s'exécutent à l'import et ne
+sont pas collectés.
+"""
+import time
+from datetime import date, datetime
+
+import pytest
+import sqlalchemy as sa
+
+from app import create_app, db
+from app.config import Config
+
+collect_ignore = [
+    "test_accept.py",
+    "test_accepted_dates.py",
+    "test_date_awareness.py",
+    "test_day_view.py",
+    "test_document_alerts.py",
+    "test_email.py",
+    "test_email_config.py",
+    "test_enhanced_ai.py",
+    "test_fetch_planning.py",
+    "test_logging_api.py",
+    "test_logging_api_std.py",
+    "test_login_api.py",
+    "test_login_api_v2.py",
+    "test_maintenance_automation.py",
+    "test_mission_planning.py",
+    "test_results.txt",
+    "tools",
+]
+
+
+@pytest.fixture(scope="session")
+def app(tmp_path_factory):
+    # Fichier plutôt que :memory: : les threads (outbox, audit, SSE) ont leur propre connexion
+    class TestConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path_factory.mktemp('db') / 'test.db'}"
+        TESTING = True
+        SCHEDULER_ENABLED = False
+        SECRET_KEY = "test-secret"
+        MAIL_RETRY_ATTEMPTS = 0
+        AUDIT_LOG_FLUSH_MS = 20
+        TOKEN_REVOCATION_REFRESH = 0
+
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+@pytest.fixture(autouse=True)
+def clean_db(app):
+    """Chaque test part de tables vides et de caches vides."""
+    from app.utils.auth_utils import auth_cache, session_activity
+    from app.utils.cache import shared_cache
+
+    with app.app_context():
+        # SQLite n'applique pas les clés étrangères : l'ordre des tables est indifférent
+        for table in db.metadata.tables.values():
+            db.session.execute(table.delete())
+        db.session.commit()
+        db.session.info.clear()
+        shared_cache.clear()
+        auth_cache.clear()
+        session_activity.clear()
+        yield
+        db.session.rollback()
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def _placeholder(column):
+    if isinstance(column.type, sa.DateTime):
+        return datetime(2026, 1, 1)
+    if isinstance(column.type, sa.Date):
+        return date(2026, 1, 1)
+    if isinstance(column.type, (sa.Integer, sa.Float, sa.Numeric)):
+        return 0
+    return "x"
+
+
+@pytest.fixture
+def make():
+    """make(Model, **colonnes) : ajoute et commit une ligne, les colonnes obligatoires non fournies sont remplies."""
+
+    def _make(model, commit=True, **values):
+        for column in model.__table__.columns:
+            if column.key in values or column.nullable or column.primary_key:
+                continue
+            if column.default is not None or column.server_default is not None:
+                continue
+            values[column.key] = _placeholder(column)
+        obj = model(**values)
+        db.session.add(obj)
+        if commit:
+            db.session.commit()
+        return obj
+
+    return _make
+
+
+@pytest.fixture
+def admin(make):
+    from app.models import User
+    return make(User, id="admin-1", email="admin@test.local", name="Admin", role="admin", status="active")
+
+
+@pytest.fixture
+def vehicle(make):
+    from app.models import Vehicle
+    return make(Vehicle, id="v1", immatriculation="1234 TAA", marque="Toyota", modele="Hilux",
+                type_vehicule="4x4", statut="principale")
+
+
+@pytest.fixture
+def auth_headers():
+    """En-têtes d'une session ouverte pour l'utilisateur donné."""
+    from app.utils.session_tokens import issue_token
+
+    def _headers(user):
+        return {"Authorization": f"Bearer {issue_token(user)}"}
+
+    return _headers
+
+
+def wait_for(condition, timeout=5):
+    """Attend qu'un thread d'arrière-plan ait produit son effet."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        result = condition()
+        if result:
+            return result
+        time.sleep(0.02)
+    return condition()
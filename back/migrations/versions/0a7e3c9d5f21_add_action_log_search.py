@@ -0,0 +1,48 @@
+"""Add action log payload and full-text search
+
+Revision ID: 0a7e3c9d5f21
+Revises: f4d8b2c6e937
+Create Date: 2026-10-19 18:47:30.118406
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '0a7e3c9d5f21'
+down_revision = 'f4d8b2c6e937'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    is_postgres = op.get_bind().dialect.name == 'postgresql'
+
+    with op.batch_alter_table('action_logs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('payload', sa.JSON().with_variant(postgresql.JSONB(), 'postgresql'), nullable=True))
+        batch_op.create_index('ix_action_logs_entite', ['entite', 'entite_id', 'timestamp'], unique=False)
+
+    if is_postgres:
+        # Colonne générée : tenue à jour par PostgreSQL à chaque écriture
+        op.execute("""
+            ALTER TABLE action_logs ADD COLUMN search_vector tsvector
+            GENERATED ALWAYS AS (
+                to_tsvector('french', coalesce(action, '') || ' ' || coalesce(entite, '') || ' ' || coalesce(details, ''))
+            ) STORED
+        """)
+        op.create_index('ix_action_logs_search_vector', 'action_logs', ['search_vector'], unique=False, postgresql_using='gin')
+        op.create_index('ix_action_logs_payload', 'action_logs', ['payload'], unique=False,
+                        postgresql_using='gin', postgresql_ops={'payload': 'jsonb_path_ops'})
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_action_logs_payload', table_name='action_logs')
+        op.drop_index('ix_action_logs_search_vector', table_name='action_logs')
+        op.drop_column('action_logs', 'search_vector')
+
+    with op.batch_alter_table('action_logs', schema=None) as batch_op:
+        batch_op.drop_index('ix_action_logs_entite')
+        batch_op.drop_column('payload')
@@ -0,0 +1,27 @@
+"""Index the change feed by entity id for status email dedupe keys
+
+Revision ID: 3a7e1c9d5b62
+Revises: 8b3f5d2e9a14
+Create Date: 2026-10-20 09:12:44.318027
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3a7e1c9d5b62'
+down_revision = '8b3f5d2e9a14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Dernière version d'une entité, lue à chaque changement de statut notifié
+    with op.batch_alter_table('change_feed', schema=None) as batch_op:
+        batch_op.create_index('ix_change_feed_entity_id_seq', ['entity', 'entity_id', 'seq'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('change_feed', schema=None) as batch_op:
+        batch_op.drop_index('ix_change_feed_entity_id_seq')
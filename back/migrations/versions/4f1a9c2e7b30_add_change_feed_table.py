@@ -0,0 +1,36 @@
+"""Add change_feed table
+
+Revision ID: 4f1a9c2e7b30
+Revises: 0dc700efe0b1
+Create Date: 2026-10-19 09:12:31.402117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4f1a9c2e7b30'
+down_revision = '0dc700efe0b1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('change_feed',
+    sa.Column('seq', sa.BigInteger(), autoincrement=True, nullable=False),
+    sa.Column('entity', sa.String(length=50), nullable=False),
+    sa.Column('entity_id', sa.String(), nullable=False),
+    sa.Column('op', sa.String(length=10), nullable=False),
+    sa.Column('changed_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('seq')
+    )
+    with op.batch_alter_table('change_feed', schema=None) as batch_op:
+        batch_op.create_index('ix_change_feed_entity_seq', ['entity', 'seq'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('change_feed', schema=None) as batch_op:
+        batch_op.drop_index('ix_change_feed_entity_seq')
+
+    op.drop_table('change_feed')
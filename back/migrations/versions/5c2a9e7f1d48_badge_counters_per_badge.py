@@ -0,0 +1,30 @@
+"""Sidebar badge counters maintained on write, one row per badge
+
+Revision ID: 5c2a9e7f1d48
+Revises: 3a7e1c9d5b62
+Create Date: 2026-10-20 10:03:51.774209
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c2a9e7f1d48'
+down_revision = '3a7e1c9d5b62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Lignes créées par la première réconciliation (lecture ou tâche planifiée)
+    op.create_table('badge_counters',
+    sa.Column('badge', sa.String(length=20), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('reconciled_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('badge')
+    )
+
+
+def downgrade():
+    op.drop_table('badge_counters')
@@ -0,0 +1,55 @@
+"""Add notification_inbox table
+
+Revision ID: 5c9f7e2d4a18
+Revises: e3a8d0c5f912
+Create Date: 2026-10-19 14:26:51.093417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c9f7e2d4a18'
+down_revision = 'e3a8d0c5f912'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('notification_inbox',
+    sa.Column('user_id', sa.String(), nullable=False),
+    sa.Column('notification_id', sa.String(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('is_read', sa.Boolean(), nullable=False),
+    sa.Column('read_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['notification_id'], ['notifications.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'notification_id')
+    )
+
+    # Reprise de l'existant : destinataires calculés comme l'ancien filtre (rôles exacts),
+    # état de lecture repris de notification_reads
+    op.execute("""
+        INSERT INTO notification_inbox (user_id, notification_id, created_at, is_read, read_at)
+        SELECT u.id, n.id, n.timestamp, r.user_id IS NOT NULL, r.read_at
+        FROM notifications n
+        JOIN users u ON (
+            u.id = n.target_user_id
+            OR (',' || REPLACE(n.target_role, ' ', '') || ',') LIKE ('%,' || u.role || ',%')
+            OR (n.target_role IS NULL AND n.target_user_id IS NULL)
+        )
+        LEFT JOIN notification_reads r ON r.user_id = u.id AND r.notification_id = n.id
+    """)
+
+    with op.batch_alter_table('notification_inbox', schema=None) as batch_op:
+        batch_op.create_index('ix_notification_inbox_user_created', ['user_id', 'created_at'], unique=False)
+        batch_op.create_index('ix_notification_inbox_user_unread', ['user_id', 'is_read'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('notification_inbox', schema=None) as batch_op:
+        batch_op.drop_index('ix_notification_inbox_user_unread')
+        batch_op.drop_index('ix_notification_inbox_user_created')
+
+    op.drop_table('notification_inbox')
@@ -0,0 +1,46 @@
+"""Count sidebar badges on read: partial indexes, drop badge_counters
+
+Revision ID: 6d1b8f3a2c90
+Revises: 9f2c4e7a1b53
+Create Date: 2026-10-19 22:14:06.482913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6d1b8f3a2c90'
+down_revision = '9f2c4e7a1b53'
+branch_labels = None
+depends_on = None
+
+# Index -> (table, condition) : seules les lignes comptées par le badge sont indexées
+PARTIAL_INDEXES = {
+    'ix_missions_nouveau': ('missions', "state = 'nouveau'"),
+    'ix_maintenances_en_attente': ('maintenances', "statut = 'en_attente'"),
+    'ix_planning_en_attente': ('planning', "status = 'en_attente'"),
+}
+
+
+def upgrade():
+    for name, (table, condition) in PARTIAL_INDEXES.items():
+        op.create_index(name, table, ['id'], unique=False,
+                        postgresql_where=sa.text(condition), sqlite_where=sa.text(condition))
+
+    op.drop_table('badge_counters')
+
+
+def downgrade():
+    op.create_table('badge_counters',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('missions', sa.Integer(), nullable=False),
+    sa.Column('maintenance', sa.Integer(), nullable=False),
+    sa.Column('compliance', sa.Integer(), nullable=False),
+    sa.Column('planning', sa.Integer(), nullable=False),
+    sa.Column('reconciled_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+    for name, (table, _) in PARTIAL_INDEXES.items():
+        op.drop_index(name, table_name=table)
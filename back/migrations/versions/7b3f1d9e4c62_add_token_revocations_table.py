@@ -0,0 +1,44 @@
+"""Add token_revocations table and users.last_logout
+
+Revision ID: 7b3f1d9e4c62
+Revises: 0a7e3c9d5f21
+Create Date: 2026-10-19 19:32:08.664120
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7b3f1d9e4c62'
+down_revision = '0a7e3c9d5f21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('token_revocations',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('jti', sa.String(length=64), nullable=True),
+    sa.Column('user_id', sa.String(), nullable=False),
+    sa.Column('not_before', sa.DateTime(), nullable=True),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('jti')
+    )
+    with op.batch_alter_table('token_revocations', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_token_revocations_expires_at'), ['expires_at'], unique=False)
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('last_logout', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('last_logout')
+
+    with op.batch_alter_table('token_revocations', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_token_revocations_expires_at'))
+
+    op.drop_table('token_revocations')
@@ -0,0 +1,29 @@
+"""Track authenticated activity for the online status
+
+Revision ID: 8b3f5d2e9a14
+Revises: 6d1b8f3a2c90
+Create Date: 2026-10-19 23:41:27.105384
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b3f5d2e9a14'
+down_revision = '6d1b8f3a2c90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Dernière requête authentifiée et expiration du token utilisé (statut « en ligne »)
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('last_seen_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('session_expires_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('session_expires_at')
+        batch_op.drop_column('last_seen_at')
@@ -0,0 +1,28 @@
+"""Add planning date window indexes
+
+Revision ID: 8d3e5b1f02c4
+Revises: 4f1a9c2e7b30
+Create Date: 2026-10-19 10:04:52.118305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d3e5b1f02c4'
+down_revision = '4f1a9c2e7b30'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('planning', schema=None) as batch_op:
+        batch_op.create_index('ix_planning_date_debut_date_fin', ['date_debut', 'date_fin'], unique=False)
+        batch_op.create_index('ix_planning_vehicule_date_debut', ['vehicule_id', 'date_debut'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('planning', schema=None) as batch_op:
+        batch_op.drop_index('ix_planning_vehicule_date_debut')
+        batch_op.drop_index('ix_planning_date_debut_date_fin')
@@ -0,0 +1,48 @@
+"""Add users.email_digest and digest_events table
+
+Revision ID: 9f2c4e7a1b53
+Revises: 3e9a6c1b8d47
+Create Date: 2026-10-19 21:02:51.337904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9f2c4e7a1b53'
+down_revision = '3e9a6c1b8d47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('email_digest', sa.String(length=20), server_default='immediate', nullable=False))
+
+    op.create_table('digest_events',
+    sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), autoincrement=True, nullable=False),
+    sa.Column('recipient', sa.String(length=255), nullable=False),
+    sa.Column('frequency', sa.String(length=20), nullable=False),
+    sa.Column('kind', sa.String(length=50), nullable=False),
+    sa.Column('outbox_id', sa.BigInteger(), nullable=False),
+    sa.Column('subject', sa.String(length=255), nullable=False),
+    sa.Column('body', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('digested_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('digest_events', schema=None) as batch_op:
+        batch_op.create_index('ix_digest_events_pending', ['frequency', 'digested_at', 'recipient'], unique=False)
+        batch_op.create_index('ix_digest_events_outbox_id', ['outbox_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('digest_events', schema=None) as batch_op:
+        batch_op.drop_index('ix_digest_events_outbox_id')
+        batch_op.drop_index('ix_digest_events_pending')
+
+    op.drop_table('digest_events')
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('email_digest')
@@ -0,0 +1,33 @@
+"""Add badge_counters table
+
+Revision ID: a41d6c8e3b27
+Revises: 5c9f7e2d4a18
+Create Date: 2026-10-19 15:08:33.560184
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a41d6c8e3b27'
+down_revision = '5c9f7e2d4a18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('badge_counters',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('missions', sa.Integer(), nullable=False),
+    sa.Column('maintenance', sa.Integer(), nullable=False),
+    sa.Column('compliance', sa.Integer(), nullable=False),
+    sa.Column('planning', sa.Integer(), nullable=False),
+    sa.Column('reconciled_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    # La ligne unique est créée et remplie à la première lecture (ou par la réconciliation planifiée)
+
+
+def downgrade():
+    op.drop_table('badge_counters')
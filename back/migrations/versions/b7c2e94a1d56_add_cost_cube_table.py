@@ -0,0 +1,53 @@
+"""Add cost_cube table
+
+Revision ID: b7c2e94a1d56
+Revises: 8d3e5b1f02c4
+Create Date: 2026-10-19 11:12:37.402918
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7c2e94a1d56'
+down_revision = '8d3e5b1f02c4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('cost_cube',
+    sa.Column('vehicle_id', sa.String(), nullable=False),
+    sa.Column('year', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Integer(), nullable=False),
+    sa.Column('category', sa.String(length=20), nullable=False),
+    sa.Column('amount', sa.Float(), nullable=False),
+    sa.Column('quantity', sa.Float(), nullable=False),
+    sa.Column('entries', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('vehicle_id', 'year', 'month', 'category')
+    )
+    with op.batch_alter_table('cost_cube', schema=None) as batch_op:
+        batch_op.create_index('ix_cost_cube_year_month', ['year', 'month'], unique=False)
+
+    with op.batch_alter_table('fuel_entries', schema=None) as batch_op:
+        batch_op.create_index('ix_fuel_entries_vehicule_date', ['vehicule_id', 'date'], unique=False)
+
+    with op.batch_alter_table('maintenances', schema=None) as batch_op:
+        batch_op.create_index('ix_maintenances_vehicule_date_demande', ['vehicule_id', 'date_demande'], unique=False)
+
+    # Le cube est rempli ensuite par : python rebuild_cost_cube.py
+
+
+def downgrade():
+    with op.batch_alter_table('maintenances', schema=None) as batch_op:
+        batch_op.drop_index('ix_maintenances_vehicule_date_demande')
+
+    with op.batch_alter_table('fuel_entries', schema=None) as batch_op:
+        batch_op.drop_index('ix_fuel_entries_vehicule_date')
+
+    with op.batch_alter_table('cost_cube', schema=None) as batch_op:
+        batch_op.drop_index('ix_cost_cube_year_month')
+
+    op.drop_table('cost_cube')
@@ -0,0 +1,62 @@
+"""Add notification archive tables
+
+Revision ID: c6e1f3a9b845
+Revises: a41d6c8e3b27
+Create Date: 2026-10-19 15:52:18.204661
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c6e1f3a9b845'
+down_revision = 'a41d6c8e3b27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('notifications_archive',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('title', sa.String(length=255), nullable=False),
+    sa.Column('message', sa.Text(), nullable=False),
+    sa.Column('type', sa.String(length=50), nullable=True),
+    sa.Column('target_role', sa.String(length=50), nullable=True),
+    sa.Column('target_user_id', sa.String(), nullable=True),
+    sa.Column('link', sa.String(length=255), nullable=True),
+    sa.Column('timestamp', sa.DateTime(), nullable=False),
+    sa.Column('archived_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('notifications_archive', schema=None) as batch_op:
+        batch_op.create_index('ix_notifications_archive_timestamp', ['timestamp'], unique=False)
+
+    op.create_table('notification_inbox_archive',
+    sa.Column('user_id', sa.String(), nullable=False),
+    sa.Column('notification_id', sa.String(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('is_read', sa.Boolean(), nullable=False),
+    sa.Column('read_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('user_id', 'notification_id')
+    )
+    with op.batch_alter_table('notification_inbox_archive', schema=None) as batch_op:
+        batch_op.create_index('ix_notification_inbox_archive_user_created', ['user_id', 'created_at'], unique=False)
+
+    with op.batch_alter_table('notifications', schema=None) as batch_op:
+        batch_op.create_index('ix_notifications_timestamp', ['timestamp'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('notifications', schema=None) as batch_op:
+        batch_op.drop_index('ix_notifications_timestamp')
+
+    with op.batch_alter_table('notification_inbox_archive', schema=None) as batch_op:
+        batch_op.drop_index('ix_notification_inbox_archive_user_created')
+
+    op.drop_table('notification_inbox_archive')
+
+    with op.batch_alter_table('notifications_archive', schema=None) as batch_op:
+        batch_op.drop_index('ix_notifications_archive_timestamp')
+
+    op.drop_table('notifications_archive')
@@ -0,0 +1,26 @@
+"""Add compliance expiry index
+
+Revision ID: d2b7a5e81c69
+Revises: c6e1f3a9b845
+Create Date: 2026-10-19 16:20:44.918372
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2b7a5e81c69'
+down_revision = 'c6e1f3a9b845'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('compliance', schema=None) as batch_op:
+        batch_op.create_index('ix_compliance_date_expiration_statut', ['date_expiration', 'statut'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('compliance', schema=None) as batch_op:
+        batch_op.drop_index('ix_compliance_date_expiration_statut')
@@ -0,0 +1,43 @@
+"""Add report_jobs table
+
+Revision ID: e3a8d0c5f912
+Revises: b7c2e94a1d56
+Create Date: 2026-10-19 13:41:09.775204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3a8d0c5f912'
+down_revision = 'b7c2e94a1d56'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('report_jobs',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('report', sa.String(length=50), nullable=False),
+    sa.Column('params', sa.Text(), nullable=False),
+    sa.Column('params_hash', sa.String(length=64), nullable=False),
+    sa.Column('data_version', sa.BigInteger(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('result', sa.Text(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('requested_by_id', sa.String(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('report_jobs', schema=None) as batch_op:
+        batch_op.create_index('ix_report_jobs_lookup', ['report', 'params_hash', 'data_version'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('report_jobs', schema=None) as batch_op:
+        batch_op.drop_index('ix_report_jobs_lookup')
+
+    op.drop_table('report_jobs')
@@ -0,0 +1,37 @@
+"""Add action log indexes and minute_of_day
+
+Revision ID: f4d8b2c6e937
+Revises: d2b7a5e81c69
+Create Date: 2026-10-19 18:05:12.550214
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4d8b2c6e937'
+down_revision = 'd2b7a5e81c69'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('action_logs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('minute_of_day', sa.SmallInteger(), nullable=True))
+
+    op.execute("""
+        UPDATE action_logs
+        SET minute_of_day = EXTRACT(HOUR FROM "timestamp") * 60 + EXTRACT(MINUTE FROM "timestamp")
+    """)
+
+    with op.batch_alter_table('action_logs', schema=None) as batch_op:
+        batch_op.create_index('ix_action_logs_timestamp_id', ['timestamp', 'id'], unique=False)
+        batch_op.create_index('ix_action_logs_user_timestamp', ['user_id', 'timestamp'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('action_logs', schema=None) as batch_op:
+        batch_op.drop_index('ix_action_logs_user_timestamp')
+        batch_op.drop_index('ix_action_logs_timestamp_id')
+        batch_op.drop_column('minute_of_day')
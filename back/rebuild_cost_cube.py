@@ -0,0 +1,19 @@
+"""
+Maintenance script: Rebuild the cost_cube table
+
+Recomputes every (vehicle, year, month, category) cell from fuel_entries,
+maintenances and compliance. Run after the migration (flask db upgrade creates
+the table), or whenever data was changed outside the application (raw SQL, imports).
+"""
+
+from app import create_app
+from app.utils.cost_cube import rebuild_cost_cube
+
+app = create_app()
+
+with app.app_context():
+    print("Rebuilding cost_cube...")
+
+    cells = rebuild_cost_cube()
+
+    print(f"✅ cost_cube rebuilt: {cells} cells")
@@ -0,0 +1,57 @@
+import queue
+
+from conftest import wait_for
+
+from app import db
+from app.models import ActionLog
+from app.utils import log_action
+from app.utils.audit_log import AuditLogWriter, audit_log
+
+
+def _row(i, **values):
+    return {"id": f"log-{i}", "user_id": "system", "action": "Test", "entite": "Test",
+            "entite_id": str(i), "details": f"entrée {i}", **values}
+
+
+def test_log_action_is_written_by_the_background_thread(app, admin):
+    with app.test_request_context():
+        log_action(user_id=admin.id, action="Création", entite="Véhicule", entite_id="v1", details="d",
+                   payload={"vehicleIds": ["v1"]})
+        # Rien n'est écrit dans la session de la requête
+        assert not db.session.new and not db.session.dirty
+
+    log = wait_for(lambda: db.session.query(ActionLog).first())
+    assert (log.user_id, log.action, log.entite_id, log.payload) == (admin.id, "Création", "v1", {"vehicleIds": ["v1"]})
+    assert log.minute_of_day == log.timestamp.hour * 60 + log.timestamp.minute
+
+
+def test_actions_without_user_are_logged_as_system(app):
+    with app.test_request_context():
+        log_action(action="Purge", entite="Notification", details="d")
+
+    log = wait_for(lambda: db.session.query(ActionLog).first())
+    assert (log.user_id, log.entite_id) == ("system", "N/A")
+
+
+def test_invalid_row_does_not_lose_the_batch(app):
+    written = audit_log.written
+    audit_log._write([_row(1), _row(2, details=None), _row(3)])
+
+    assert sorted(log.id for log in db.session.query(ActionLog)) == ["log-1", "log-3"]
+    assert audit_log.written == written + 2
+
+
+def test_full_buffer_drops_instead_of_blocking(app):
+    writer = AuditLogWriter()
+    writer._app = app
+    writer.flush_interval, writer.batch_size = 0.02, 2
+    writer._queue = queue.Queue(maxsize=3)
+    writer._ensure_started = lambda: None  # Pas de thread d'écriture : la file n'est vidée que par flush()
+
+    for i in range(5):
+        writer.enqueue(_row(i))
+    assert writer.dropped == 2
+
+    writer.flush()
+    assert db.session.query(ActionLog).count() == 3
+    assert writer.written == 3
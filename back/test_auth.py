@@ -0,0 +1,178 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event, update
+
+from app import create_app, db
+from app.config import Config
+from app.models import User
+from app.utils.auth_utils import AuthEntry, auth_cache, authenticate
+
+
+@pytest.fixture(autouse=True)
+def legacy_tokens_accepted(app, monkeypatch):
+    monkeypatch.setitem(app.config, "AUTH_LEGACY_TOKENS_UNTIL", datetime.utcnow() + timedelta(days=1))
+
+
+def _legacy_user(make, **values):
+    return make(User, **{"id": "u1", "email": "u1@test.local", "name": "U1", "role": "technician",
+                         "status": "active", "token": "legacy-token", **values})
+
+
+def _count_user_queries(block):
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        if "FROM users" in statement:
+            statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        block()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
+    return len(statements)
+
+
+def test_legacy_tokens_are_resolved_once(app, make):
+    _legacy_user(make)
+
+    assert authenticate("legacy-token").role == "technician"
+    assert _count_user_queries(lambda: authenticate("legacy-token")) == 0
+    assert authenticate("unknown-token") is None
+
+
+def test_cache_is_invalidated_when_the_user_changes(app, client, make):
+    user = _legacy_user(make)
+    headers = {"Authorization": "Bearer legacy-token"}
+    assert client.get("/api/logs/", headers=headers).status_code == 403
+
+    user.role = "admin"
+    db.session.commit()
+    assert authenticate("legacy-token").role == "admin"
+
+    user.status = "inactive"
+    db.session.commit()
+    assert client.get("/api/logs/", headers=headers).status_code == 403
+    assert client.get("/api/logs/", headers=headers).json["message"].startswith("Compte non approuvé")
+
+
+def test_current_user_loads_other_attributes_lazily(app, make):
+    _legacy_user(make, name="Technicien")
+
+    current = authenticate("legacy-token")
+    assert current._user is None
+    assert current.name == "Technicien"
+    assert current.load() is current._user
+
+
+def test_cache_evicts_least_recently_used_and_expired_entries(app, monkeypatch):
+    monkeypatch.setitem(app.config, "AUTH_CACHE_SIZE", 2)
+    auth_cache.set("t1", AuthEntry("u1", "admin", "active"))
+    auth_cache.set("t2", AuthEntry("u2", "admin", "active"))
+    auth_cache.get("t1")
+    auth_cache.set("t3", AuthEntry("u3", "admin", "active"))
+    assert auth_cache.get("t2") is None
+    assert auth_cache.get("t1").id == "u1"
+
+    monkeypatch.setitem(app.config, "AUTH_CACHE_TTL", 0)
+    auth_cache.set("t4", AuthEntry("u4", "admin", "active"))
+    time.sleep(0.01)
+    assert auth_cache.get("t4") is None
+
+
+def _online(client, headers):
+    return {u["id"]: u["isOnline"] for u in client.get("/api/users/", headers=headers).json}
+
+
+def test_online_status_follows_token_activity(app, client, make, admin, auth_headers):
+    driver = make(User, id="u2", email="u2@test.local", name="D", role="driver", status="active")
+    headers = auth_headers(admin)
+    # Une ancienne connexion sans déconnexion ne suffit plus
+    driver.last_login = datetime.now()
+    db.session.commit()
+    assert _online(client, headers)["u2"] is False
+
+    driver_headers = auth_headers(driver)
+    client.get("/api/notifications/unread-count", headers=driver_headers)
+    assert _online(client, headers)["u2"] is True
+
+    # Activité trop ancienne, ou token utilisé expiré depuis
+    db.session.execute(update(User).where(User.id == "u2").values(
+        last_seen_at=datetime.utcnow() - timedelta(seconds=app.config["USER_ONLINE_WINDOW"] + 1)))
+    db.session.commit()
+    assert _online(client, headers)["u2"] is False
+    db.session.execute(update(User).where(User.id == "u2").values(
+        last_seen_at=datetime.utcnow(), session_expires_at=datetime.utcnow() - timedelta(seconds=1)))
+    db.session.commit()
+    assert _online(client, headers)["u2"] is False
+
+
+def test_logout_and_revocation_put_the_user_offline(app, client, make, admin, auth_headers):
+    driver = make(User, id="u2", email="u2@test.local", name="D", role="driver", status="active")
+    headers = auth_headers(admin)
+    first, second = auth_headers(driver), auth_headers(driver)
+
+    client.get("/api/notifications/unread-count", headers=first)
+    assert client.post("/api/auth/logout", headers=first).status_code == 200
+    assert _online(client, headers)["u2"] is False
+    # L'autre session encore ouverte remet l'utilisateur en ligne dès sa prochaine requête
+    client.get("/api/notifications/unread-count", headers=second)
+    assert _online(client, headers)["u2"] is True
+
+    assert client.put("/api/users/u2/role", headers=headers, json={"role": "technician"}).status_code == 200
+    assert _online(client, headers)["u2"] is False
+    assert client.get("/api/notifications/unread-count", headers=second).status_code == 404
+
+
+def test_activity_is_written_at_most_once_per_interval(app, make, admin, auth_headers, monkeypatch):
+    monkeypatch.setitem(app.config, "USER_ACTIVITY_INTERVAL", 60)
+    token = auth_headers(admin)["Authorization"].split(" ")[1]
+
+    with app.test_request_context():
+        authenticate(token)
+        db.session.expire_all()
+        first = db.session.get(User, "admin-1").last_seen_at
+        assert first is not None
+
+        time.sleep(0.01)
+        assert _count_user_queries(lambda: authenticate(token)) == 0
+        db.session.expire_all()
+        assert db.session.get(User, "admin-1").last_seen_at == first
+
+
+def test_legacy_tokens_are_refused_after_the_cutoff(app, make, monkeypatch):
+    _legacy_user(make)
+    assert authenticate("legacy-token") is not None
+
+    monkeypatch.setitem(app.config, "AUTH_LEGACY_TOKENS_UNTIL", datetime.utcnow())
+    assert authenticate("legacy-token") is None
+    monkeypatch.setitem(app.config, "AUTH_LEGACY_TOKENS_UNTIL", None)
+    assert authenticate("legacy-token") is None
+
+
+def test_deactivation_revokes_signed_sessions(app, client, admin, auth_headers):
+    headers = auth_headers(admin)
+    assert client.get("/api/logs/", headers=headers).status_code == 200
+
+    admin.status = "inactive"
+    db.session.commit()
+    assert client.get("/api/logs/", headers=headers).status_code == 401
+
+    # Réactivé : les anciens tokens restent révoqués, une nouvelle connexion fonctionne
+    admin.status = "active"
+    db.session.commit()
+    time.sleep(0.01)
+    assert client.get("/api/logs/", headers=headers).status_code == 401
+    assert client.get("/api/logs/", headers=auth_headers(admin)).status_code == 200
+
+
+@pytest.mark.parametrize("secret", [None, "", "dev-secret-key-change-me"])
+def test_app_refuses_to_start_without_a_secret_key(secret):
+    class ProdConfig(Config):
+        SECRET_KEY = secret
+        SCHEDULER_ENABLED = False
+
+    with pytest.raises(RuntimeError, match="SECRET_KEY"):
+        create_app(ProdConfig)
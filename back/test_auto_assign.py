@@ -0,0 +1,89 @@
+from datetime import date, datetime
+
+import pytest
+
+from app import db
+from app.models import Driver, Maintenance, Mission, Planning, Vehicle
+from app.utils.planning_solver import AutoAssignSolver
+
+
+def _request(id, vehicle, start, end, priorite=3, **kw):
+    return {"id": id, "vehicule_id": vehicle, "conducteur_id": None, "start": start, "end": end,
+            "priorite": priorite, "zone": "ville", "numero_om": None, "type": "reserve", **kw}
+
+
+def test_solver_moves_conflicting_requests_to_a_free_vehicle():
+    day = datetime(2026, 3, 2, 8), datetime(2026, 3, 2, 18)
+    vehicles = [{"id": "v1", "type_vehicule": "4x4", "statut": "principale"},
+                {"id": "v2", "type_vehicule": "4x4", "statut": "principale"},
+                {"id": "v3", "type_vehicule": "4x4", "statut": "en_maintenance"}]
+    solver = AutoAssignSolver([_request("a", "v1", *day, priorite=1), _request("b", "v1", *day, priorite=2)],
+                              vehicles, [])
+    assignments, unassigned = solver.solve()
+    assert {a["planningId"]: a["vehiculeId"] for a in assignments} == {"a": "v1", "b": "v2"}
+    assert unassigned == []
+
+
+@pytest.fixture
+def setup(make, admin, vehicle):
+    make(Vehicle, id="v2", immatriculation="5678 TBB", marque="x", modele="x", type_vehicule="4x4", statut="principale")
+    make(Driver, id="d1", nom="Rakoto", prenom="Jean", telephone="x", email="d1@test.local", permis="B", statut="actif")
+    mission = make(Mission, id="m1", reference="OM-1", vehicule_id="v1", conducteur_id="d1", lieu_destination="Toamasina",
+                   date_debut=date(2026, 3, 2))
+    return make(Planning, id="p1", vehicule_id="v1", conducteur_id="d1", mission_id=mission.id, type="mission",
+                description="d", status="en_attente", created_by_id=admin.id,
+                date_debut=datetime(2026, 3, 2, 8), date_fin=datetime(2026, 3, 2, 18))
+
+
+def _commit(client, headers, **assignment):
+    return client.post("/api/planning/auto-assign/commit", headers=headers,
+                       json={"assignments": [{"planningId": "p1", **assignment}]})
+
+
+def test_commit_keeps_the_requested_driver(client, admin, auth_headers, setup):
+    response = _commit(client, auth_headers(admin), vehiculeId="v2", conducteurId=None)
+    assert response.status_code == 200
+    p = db.session.get(Planning, "p1")
+    assert (p.status, p.vehicule_id, p.conducteur_id) == ("acceptee", "v2", "d1")
+    assert p.mission.conducteur_id == "d1" and p.mission.vehicule_id == "v2"
+
+
+def test_commit_rejects_unknown_vehicle_or_driver(client, admin, auth_headers, setup):
+    assert _commit(client, auth_headers(admin), vehiculeId="nope").status_code == 400
+    assert _commit(client, auth_headers(admin), conducteurId="nope").status_code == 400
+    assert db.session.get(Planning, "p1").status == "en_attente"
+
+
+def test_commit_rejects_unavailable_vehicles(client, admin, auth_headers, setup, make):
+    db.session.get(Vehicle, "v2").statut = "technique"
+    db.session.commit()
+    response = _commit(client, auth_headers(admin), vehiculeId="v2")
+    assert response.status_code == 409
+    assert response.json["conflicts"][0]["reason"] == "Véhicule indisponible"
+
+    make(Maintenance, id="mt1", vehicule_id="v1", type="vidange", description="d", kilometrage="1000",
+         statut="accepte", demandeur_id=admin.id, date_demande=date(2026, 2, 1), date_prevue=date(2026, 3, 2))
+    response = _commit(client, auth_headers(admin), vehiculeId="v1")
+    assert response.status_code == 409
+    assert response.json["conflicts"][0]["reason"] == "Véhicule en maintenance sur ce créneau"
+    assert db.session.get(Planning, "p1").status == "en_attente"
+
+
+def test_commit_rejects_slots_taken_in_the_meantime(client, admin, auth_headers, setup, make):
+    make(Planning, id="p2", vehicule_id="v2", type="reserve", description="d", status="acceptee",
+         date_debut=datetime(2026, 3, 2, 12), date_fin=datetime(2026, 3, 3, 8))
+    response = _commit(client, auth_headers(admin), vehiculeId="v2")
+    assert response.status_code == 409
+
+
+def test_commit_rolls_back_on_error(client, admin, auth_headers, setup, monkeypatch):
+    from app.routes import planning
+
+    def fail(p):
+        raise RuntimeError("outbox unavailable")
+
+    monkeypatch.setattr(planning, "send_planning_status_notification", fail)
+    response = _commit(client, auth_headers(admin), vehiculeId="v2")
+    assert response.status_code == 500 and "error" in response.json
+    db.session.expire_all()
+    assert db.session.get(Planning, "p1").status == "en_attente"
@@ -0,0 +1,114 @@
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import event
+
+from app import db
+from app.models import BadgeCounter, Compliance, Maintenance, Mission, Planning, User
+from app.utils.badge_counters import count_badges, read_badge_counters, reconcile_badge_counters
+from app.utils.event_hub import hub
+
+
+def _pending_requests(make, vehicle):
+    make(Mission, id="m1", reference="OM-1", state="nouveau")
+    make(Mission, id="m2", reference="OM-2", state="terminee")
+    make(Maintenance, id="mt1", vehicule_id=vehicle.id, statut="en_attente")
+    make(Maintenance, id="mt2", vehicule_id=vehicle.id, statut="terminee")
+    make(Planning, id="p1", vehicule_id=vehicle.id, status="en_attente",
+         date_debut=datetime(2026, 3, 2, 8), date_fin=datetime(2026, 3, 2, 12))
+    make(Planning, id="p2", vehicule_id=vehicle.id, status="en_attente",
+         date_debut=datetime(2026, 3, 3, 8), date_fin=datetime(2026, 3, 3, 12))
+
+
+def test_counts_pending_requests(make, vehicle):
+    _pending_requests(make, vehicle)
+
+    assert count_badges() == {"missions": 1, "maintenance": 1, "compliance": 0, "planning": 2}
+
+
+def test_compliance_counts_active_documents_within_window(make, vehicle):
+    today = date.today()
+    make(Compliance, id="c1", vehicule_id=vehicle.id, type="assurance", statut="valide",
+         date_expiration=today + timedelta(days=10))
+    make(Compliance, id="c2", vehicule_id=vehicle.id, type="vignette", statut="à_renouveler",
+         date_expiration=today - timedelta(days=3))
+    make(Compliance, id="c3", vehicule_id=vehicle.id, type="visite_technique", statut="valide",
+         date_expiration=today + timedelta(days=90))
+    make(Compliance, id="c4", vehicule_id=vehicle.id, type="carte_rose", statut="expiré",
+         date_expiration=today - timedelta(days=3))
+
+    assert count_badges()["compliance"] == 2
+
+
+def _statements(block):
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        block()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
+    return statements
+
+
+def test_counters_follow_writes_without_recounting(make, vehicle):
+    _pending_requests(make, vehicle)
+    assert read_badge_counters() == reconcile_badge_counters()
+
+    def accept_maintenance():
+        db.session.get(Maintenance, "mt1").statut = "accepte"
+        db.session.commit()
+
+    # Seule la ligne du badge modifié est mise à jour, par un incrément atomique
+    updates = [s for s in _statements(accept_maintenance) if s.startswith("UPDATE badge_counters")]
+    assert len(updates) == 1 and "count + " in updates[0]
+
+    make(Mission, id="m3", reference="OM-3", state="nouveau")
+    db.session.delete(db.session.get(Planning, "p1"))
+    db.session.commit()
+    db.session.get(Planning, "p2").status = "acceptee"
+    db.session.rollback()
+
+    statements = _statements(lambda: read_badge_counters())
+    assert len(statements) == 1 and "FROM badge_counters" in statements[0]
+    assert read_badge_counters() == {"missions": 2, "maintenance": 0, "compliance": 0, "planning": 1}
+
+
+def test_bulk_updates_are_caught_up_by_the_reconciliation(make, vehicle):
+    _pending_requests(make, vehicle)
+    reconcile_badge_counters()
+
+    # Mise à jour en masse hors ORM : aucun écouteur de session ne la voit
+    db.session.execute(Planning.__table__.update().values(status="acceptee"))
+    db.session.commit()
+    assert read_badge_counters()["planning"] == 2
+
+    assert reconcile_badge_counters()["planning"] == 0
+    assert read_badge_counters()["planning"] == 0
+    assert BadgeCounter.query.count() == 4
+
+
+def test_badges_route_by_role(client, make, vehicle, admin, auth_headers):
+    _pending_requests(make, vehicle)
+    driver = make(User, id="u2", email="driver@test.local", name="Driver", role="driver", status="active")
+
+    res = client.get("/api/notifications/badges", headers=auth_headers(admin))
+    assert res.status_code == 200
+    assert res.get_json() == {"missions": 1, "maintenance": 1, "compliance": 0, "planning": 2}
+
+    res = client.get("/api/notifications/badges", headers=auth_headers(driver))
+    assert res.get_json()["planning"] == 0
+
+
+def test_badge_event_after_commit(make, vehicle):
+    sub = hub.subscribe("admin-1", "admin", ["badges"])
+    try:
+        make(Maintenance, id="mt1", vehicule_id=vehicle.id, statut="en_attente")
+
+        event = sub.get(timeout=5)
+        assert event["roles"] == ["admin", "technician"]
+        assert event["data"]["maintenance"] == 1
+    finally:
+        hub.unsubscribe(sub)
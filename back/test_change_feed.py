@@ -0,0 +1,49 @@
+from app import db
+from app.models import ChangeFeedEntry, Vehicle
+
+
+def test_writes_are_recorded_in_commit_order(vehicle):
+    vehicle.statut = "reserve"
+    db.session.commit()
+    db.session.delete(vehicle)
+    db.session.commit()
+
+    rows = ChangeFeedEntry.query.order_by(ChangeFeedEntry.seq).all()
+    assert [(r.entity, r.entity_id, r.op) for r in rows] == [
+        ("vehicles", "v1", "upsert"),
+        ("vehicles", "v1", "upsert"),
+        ("vehicles", "v1", "delete"),
+    ]
+
+
+def test_rolled_back_writes_are_not_recorded(make):
+    make(Vehicle, commit=False, id="v2", immatriculation="5678 TBB", marque="x", modele="x", type_vehicule="x")
+    db.session.flush()
+    db.session.rollback()
+
+    assert ChangeFeedEntry.query.count() == 0
+
+
+def test_changes_since_cursor(client, admin, auth_headers, make):
+    headers = auth_headers(admin)
+    cursor = client.get("/api/changes", headers=headers).json["cursor"]
+
+    v = make(Vehicle, id="v2", immatriculation="5678 TBB", marque="x", modele="x", type_vehicule="x")
+    v.marque = "Nissan"
+    db.session.commit()
+    make(Vehicle, id="v3", immatriculation="9999 TCC", marque="x", modele="x", type_vehicule="x")
+    db.session.delete(db.session.get(Vehicle, "v3"))
+    db.session.commit()
+
+    body = client.get(f"/api/changes?since={cursor}&entities=vehicles", headers=headers).json
+    changes = {c["id"]: c for c in body["changes"]}
+    # Une ligne modifiée plusieurs fois n'apparaît qu'une fois, avec son état courant
+    assert len(body["changes"]) == 2
+    assert changes["v2"]["op"] == "upsert" and changes["v2"]["data"]["marque"] == "Nissan"
+    assert changes["v3"]["op"] == "delete" and changes["v3"]["data"] is None
+    assert body["cursor"] > cursor and body["hasMore"] is False
+
+    page = client.get(f"/api/changes?since={cursor}&limit=1", headers=headers).json
+    assert page["hasMore"] is True and len(page["changes"]) == 1
+
+    assert client.get("/api/changes?entities=unknown", headers=headers).status_code == 400
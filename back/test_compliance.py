@@ -0,0 +1,121 @@
+import json
+from datetime import date, timedelta
+
+from app.models import Compliance, EmailOutbox, Notification, User
+from app.routes.compliance import add_years
+from app.utils.email_utils import EMAIL_BUILDERS
+from app.utils.scheduler import check_expiring_documents
+
+
+def _doc(make, doc_id, days, statut="valide", vehicule_id="v1", type="assurance", **values):
+    return make(Compliance, id=doc_id, vehicule_id=vehicule_id, type=type, statut=statut,
+                date_expiration=date.today() + timedelta(days=days), **values)
+
+
+def test_alerts_are_filtered_and_counted_in_sql(client, make, vehicle, admin, auth_headers):
+    _doc(make, "c-soon", 5)
+    _doc(make, "c-today", 0, statut="à_renouveler")
+    _doc(make, "c-later", 45)
+    _doc(make, "c-past", -1)
+    _doc(make, "c-orphan", 10, vehicule_id="v-missing")
+    headers = auth_headers(admin)
+
+    alerts = client.get("/api/compliance/alerts", headers=headers).json
+    assert [(a["id"], a["daysRemaining"]) for a in alerts] == [("c-today", 0), ("c-soon", 5), ("c-orphan", 10)]
+    assert alerts[1]["vehicule_immatriculation"] == "1234 TAA"
+    assert alerts[2]["vehicule_immatriculation"] == "N/A"
+
+    alerts = client.get("/api/compliance/alerts?days=60&statut=valide", headers=headers).json
+    assert [a["id"] for a in alerts] == ["c-soon", "c-orphan", "c-later"]
+
+
+def test_alerts_reject_an_invalid_window(client, admin, auth_headers):
+    headers = auth_headers(admin)
+    assert client.get("/api/compliance/alerts?days=-1", headers=headers).status_code == 400
+    assert client.get("/api/compliance/alerts?days=99999", headers=headers).status_code == 400
+    assert client.get("/api/compliance/alerts").status_code == 401
+
+
+def test_expiry_sweep_sends_one_digest_per_recipient(app, make, vehicle):
+    make(User, id="u-admin", email="a@test.local", name="A", role="admin", status="active", profile_email="a@fleet.local")
+    make(User, id="u-tech", email="t@test.local", name="T", role="technician", status="active", profile_email="t@fleet.local")
+    make(User, id="u-driver", email="d@test.local", name="D", role="driver", status="active", profile_email="d@fleet.local")
+    _doc(make, "c1", 2, type="assurance")
+    _doc(make, "c2", -3, type="vignette")
+    _doc(make, "c3", 20, type="visite_technique")
+
+    assert check_expiring_documents(app) == 2
+
+    flagged = {c.id for c in Compliance.query.filter_by(expiry_alert_sent=True)}
+    assert flagged == {"c1", "c2"}
+    assert [n.title for n in Notification.query.all()] == ["Échéances proches"]
+    (row,) = EmailOutbox.query.all()
+    params = json.loads(row.params)
+    assert row.kind == "document_expiry" and params["complianceIds"] == ["c1", "c2"]
+
+    messages = EMAIL_BUILDERS["document_expiry"](params)
+    assert sorted(msg.recipients[0] for msg in messages) == ["a@fleet.local", "t@fleet.local"]
+    assert messages[0].subject == "ALERTE ÉCHÉANCES : 2 document(s) sur 1 véhicule(s)"
+    assert "Expiré depuis 3 jours" in messages[0].html and "Expire dans 2 jours" in messages[0].html
+
+    # Documents déjà signalés : le passage suivant n'envoie rien
+    assert check_expiring_documents(app) == 0
+    assert EmailOutbox.query.count() == 1
+
+
+def test_bulk_renew_continues_each_vehicle_document(client, make, vehicle, admin, auth_headers):
+    from app.models import Vehicle
+    make(Vehicle, id="v2", immatriculation="5678 TBB", marque="Nissan", modele="Patrol",
+         type_vehicule="4x4", statut="principale")
+    _doc(make, "c1", 10, type="vignette", cout=150.0, prestataire="Trésor")
+    _doc(make, "c2", 40, type="vignette", vehicule_id="v2", cout=90.0)
+    _doc(make, "c3", 10, type="assurance")
+
+    res = client.post("/api/compliance/bulk-renew", headers=auth_headers(admin), json={"type": "vignette"})
+    assert res.status_code == 201 and res.json["renewed"] == 2
+
+    items = {item["vehiculeId"]: item for item in res.json["items"]}
+    previous = date.today() + timedelta(days=10)
+    assert items["v1"]["dateEmission"] == (previous + timedelta(days=1)).isoformat()
+    assert items["v1"]["dateExpiration"] == add_years(previous).isoformat()
+    assert (items["v1"]["cout"], items["v1"]["prestataire"]) == (150.0, "Trésor")
+    assert items["v2"]["vehicule_immatriculation"] == "5678 TBB"
+    statuses = {c.id: c.statut for c in Compliance.query.filter(Compliance.id.in_(["c1", "c2", "c3"]))}
+    assert statuses == {"c1": "expiré", "c2": "expiré", "c3": "valide"}
+
+
+def test_bulk_renew_validates_the_request(client, make, vehicle, admin, auth_headers):
+    headers = auth_headers(admin)
+    driver = make(User, id="u-driver", email="d@test.local", name="D", role="driver", status="active")
+
+    assert client.post("/api/compliance/bulk-renew", headers=auth_headers(driver), json={"type": "vignette"}).status_code == 403
+    assert client.post("/api/compliance/bulk-renew", headers=headers, json={}).status_code == 400
+    assert client.post("/api/compliance/bulk-renew", headers=headers,
+                       json={"type": "vignette", "vehiculeIds": ["v-missing"]}).status_code == 404
+    # Pas de document précédent : la date d'expiration doit être fournie
+    assert client.post("/api/compliance/bulk-renew", headers=headers,
+                       json={"type": "vignette", "vehiculeIds": ["v1"]}).status_code == 400
+    assert Compliance.query.count() == 0
+
+
+def test_forecast_groups_costs_by_month_and_type(client, make, vehicle, admin, auth_headers):
+    today = date.today()
+    next_month = (today.replace(day=1) + timedelta(days=32)).replace(day=1)
+    make(Compliance, id="c1", vehicule_id="v1", type="assurance", statut="valide", cout=100.0,
+         date_expiration=next_month)
+    make(Compliance, id="c2", vehicule_id="v1", type="vignette", statut="à_renouveler", cout=40.0,
+         date_expiration=next_month + timedelta(days=3))
+    make(Compliance, id="c3", vehicule_id="v1", type="vignette", statut="valide", cout=25.0,
+         date_expiration=today.replace(day=1) - timedelta(days=1))
+    make(Compliance, id="c4", vehicule_id="v1", type="vignette", statut="expiré", cout=999.0,
+         date_expiration=next_month)
+
+    res = client.get("/api/compliance/forecast?months=3", headers=auth_headers(admin)).json
+    assert [(m["year"], m["month"]) for m in res["months"]][1] == (next_month.year, next_month.month)
+    month = res["months"][1]
+    assert (month["count"], month["total"]) == (2, 140.0)
+    assert month["byType"] == {"assurance": {"count": 1, "total": 100.0}, "vignette": {"count": 1, "total": 40.0}}
+    assert (res["overdue"]["count"], res["overdue"]["total"]) == (1, 25.0)
+    assert res["total"] == 140.0
+
+    assert client.get("/api/compliance/forecast?months=0", headers=auth_headers(admin)).status_code == 400
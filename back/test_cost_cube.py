@@ -0,0 +1,79 @@
+from datetime import date
+
+from app import db
+from app.models import Compliance, CostCube, FuelEntry, Maintenance
+from app.utils import cost_cube
+from app.utils.cost_cube import rebuild_cost_cube, refresh_cells
+
+
+def _cells():
+    return {(c.vehicle_id, c.year, c.month, c.category): (c.amount, c.quantity, c.entries)
+            for c in CostCube.query.all()}
+
+
+def test_cells_follow_writes(make, vehicle):
+    fuel = make(FuelEntry, id="f1", vehicule_id="v1", date=date(2026, 3, 5), quantite_achetee=10, total_achete=100)
+    make(FuelEntry, id="f2", vehicule_id="v1", date=date(2026, 3, 20), quantite_achetee=5, total_achete=50)
+    make(Compliance, id="c1", vehicule_id="v1", type="assurance", cout=80, date_emission=date(2026, 3, 1),
+         date_expiration=date(2027, 3, 1))
+    assert _cells() == {
+        ("v1", 2026, 3, "fuel"): (150, 15, 2),
+        ("v1", 2026, 3, "compliance"): (80, 0, 1),
+    }
+
+    # Déplacée vers avril : l'ancienne cellule et la nouvelle sont recalculées
+    fuel.date = date(2026, 4, 1)
+    db.session.commit()
+    assert _cells()[("v1", 2026, 3, "fuel")] == (50, 5, 1)
+    assert _cells()[("v1", 2026, 4, "fuel")] == (100, 10, 1)
+
+    db.session.delete(fuel)
+    db.session.commit()
+    assert ("v1", 2026, 4, "fuel") not in _cells()
+
+
+def test_rolled_back_writes_leave_the_cube_unchanged(make, vehicle):
+    make(Maintenance, commit=False, id="m1", vehicule_id="v1", type="vidange", description="d", kilometrage="1",
+         statut="en_attente", demandeur_id="x", date_demande=date(2026, 3, 2), date_prevue=date(2026, 3, 2), cout=70)
+    db.session.flush()
+    db.session.rollback()
+    assert _cells() == {}
+
+
+def test_refresh_overwrites_an_existing_cell(make, vehicle):
+    make(FuelEntry, id="f1", vehicule_id="v1", date=date(2026, 3, 5), quantite_achetee=10, total_achete=100)
+    # Cellule déjà écrite par une autre transaction : mise à jour, pas de violation de clé
+    db.session.execute(CostCube.__table__.update().values(amount=999))
+    refresh_cells(db.session, {("v1", 2026, 3, "fuel")})
+    db.session.commit()
+    assert _cells() == {("v1", 2026, 3, "fuel"): (100, 10, 1)}
+
+
+def test_rebuild_matches_incremental_cells(make, vehicle):
+    make(FuelEntry, id="f1", vehicule_id="v1", date=date(2026, 3, 5), quantite_achetee=10, total_achete=100)
+    make(Maintenance, id="m1", vehicule_id="v1", type="vidange", description="d", kilometrage="1",
+         statut="en_attente", demandeur_id="x", date_demande=date(2026, 5, 2), date_prevue=date(2026, 5, 2), cout=70)
+    incremental = _cells()
+    # Écriture hors ORM : seul le rebuild la voit
+    db.session.execute(FuelEntry.__table__.update().where(FuelEntry.id == "f1").values(total_achete=300))
+    db.session.commit()
+    assert _cells()[("v1", 2026, 3, "fuel")] == (100, 10, 1)
+    assert rebuild_cost_cube() == 2
+    rebuilt = _cells()
+    assert rebuilt[("v1", 2026, 5, "maintenance")] == incremental[("v1", 2026, 5, "maintenance")]
+    assert rebuilt[("v1", 2026, 3, "fuel")] == (300, 10, 1)
+
+
+def test_cells_are_locked_in_a_fixed_order():
+    class Recorder:
+        def __init__(self):
+            self.cells = []
+
+        def execute(self, statement, params):
+            assert "pg_advisory_xact_lock" in str(statement)
+            assert params["ns"] == cost_cube.CUBE_LOCK_KEY
+            self.cells.append(params["cell"])
+
+    session = Recorder()
+    cost_cube._lock_cells(session, {("v2", 2026, 1, "fuel"), ("v1", 2026, 12, "fuel"), ("v1", 2026, 3, "compliance")})
+    assert session.cells == ["v1:2026:3:compliance", "v1:2026:12:fuel", "v2:2026:1:fuel"]
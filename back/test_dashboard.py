@@ -0,0 +1,53 @@
+from datetime import date
+
+from sqlalchemy import event
+
+from app import db
+from app.models import Driver, Mission, User, Vehicle
+
+
+def _count_queries(app):
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", record)
+    return statements, lambda: event.remove(db.engine, "before_cursor_execute", record)
+
+
+def test_driver_kpis_come_from_one_query(app, client, make, vehicle, auth_headers):
+    user = make(User, id="u-driver", email="Jean@Test.local", name="Jean", role="driver", status="active")
+    make(Driver, id="d1", nom="Rakoto", prenom="Jean", telephone="x", email="jean@test.local", permis="B",
+         statut="actif", vehicule_assigne_id="v1")
+    for i, state in enumerate(["en_cours", "planifie", "planifie", "terminee"]):
+        make(Mission, id=f"m{i}", reference=f"OM-{i}", vehicule_id="v1", conducteur_id="d1",
+             lieu_destination="x", date_debut=date(2026, 3, 2), state=state)
+    headers = auth_headers(user)
+    client.get("/api/dashboard/stats", headers=headers)  # graphiques mis en cache
+
+    statements, stop = _count_queries(app)
+    try:
+        body = client.get("/api/dashboard/stats", headers=headers).json
+    finally:
+        stop()
+
+    assert (body["myVehicle"], body["vehicleStatus"]) == ("1234 TAA", "principale")
+    assert (body["activeMissions"], body["upcomingMissions"]) == (1, 2)
+    # Hors authentification : conducteur, véhicule, missions et carburant en une requête
+    kpi_statements = [s for s in statements if "token_revocations" not in s and "FROM users" not in s]
+    assert len(kpi_statements) == 1 and "drivers" in kpi_statements[0]
+
+
+def test_driver_without_driver_record(client, make, auth_headers):
+    user = make(User, id="u-driver", email="nobody@test.local", name="N", role="driver", status="active")
+    body = client.get("/api/dashboard/stats", headers=auth_headers(user)).json
+    assert (body["myVehicle"], body["vehicleStatus"], body["activeMissions"]) == ("N/A", "Non assigné", 0)
+
+
+def test_admin_kpis(client, admin, make, vehicle, auth_headers):
+    make(Vehicle, id="v2", immatriculation="5678 TBB", marque="x", modele="x", type_vehicule="x", statut="en_maintenance")
+    body = client.get("/api/dashboard/stats", headers=auth_headers(admin)).json
+    assert (body["totalVehicules"], body["vehiculesEnMaintenance"]) == (2, 1)
+    assert client.get("/api/dashboard/stats").status_code == 401
@@ -0,0 +1,252 @@
+import json
+import smtplib
+import threading
+from datetime import date
+
+import pytest
+from flask_mail import Message
+from sqlalchemy import event
+
+from conftest import wait_for
+
+from app import db
+from app.models import Compliance, DigestEvent, EmailOutbox, Maintenance, Mission, User
+from app.utils import mail_pool as mail_pool_module
+from app.utils.email_outbox import queue_email
+from app.utils.email_utils import (
+    EMAIL_BUILDERS, STAFF_ROLES, get_role_recipients, queue_email_digests, send_mission_status_notification,
+    send_status_update_notification, split_digest_recipients,
+)
+from app.utils.mail_pool import MailPool
+from app.utils.scheduler import check_expiring_documents
+
+
+class FakeSMTP:
+    """Connexions SMTP simulées : `failures` = erreurs levées par les prochains envois."""
+
+    def __init__(self, failures=()):
+        self.failures = list(failures)
+        self.opened = 0
+        self.closed = 0
+        self.sent = []
+        self._lock = threading.Lock()
+
+    def connect(self):
+        fake = self
+
+        class Connection:
+            def __enter__(self):
+                with fake._lock:
+                    fake.opened += 1
+                return self
+
+            def __exit__(self, *exc):
+                with fake._lock:
+                    fake.closed += 1
+
+            def send(self, msg):
+                with fake._lock:
+                    if fake.failures:
+                        raise fake.failures.pop(0)
+                    fake.sent.append(msg.recipients[0])
+
+        return Connection()
+
+
+@pytest.fixture
+def smtp(monkeypatch):
+    fake = FakeSMTP()
+    monkeypatch.setattr(mail_pool_module, "mail", fake)
+    return fake
+
+
+@pytest.fixture
+def pool(app, monkeypatch):
+    monkeypatch.setitem(app.config, "MAIL_WORKERS", 1)
+    monkeypatch.setitem(app.config, "MAIL_RETRY_ATTEMPTS", 2)
+    monkeypatch.setitem(app.config, "MAIL_RETRY_BACKOFF", 0)
+    pool = MailPool()
+    pool.init_app(app)
+    yield pool
+    pool.shutdown(timeout=5)
+
+
+def _message(i):
+    return Message(f"Sujet {i}", recipients=[f"user{i}@fleet.local"], body="corps")
+
+
+def _submit(pool, count):
+    results = []
+    for i in range(count):
+        pool.submit(_message(i), results.append)
+    return results
+
+
+def test_worker_reuses_its_connection(pool, smtp):
+    results = _submit(pool, 5)
+
+    assert wait_for(lambda: len(results) == 5)
+    assert results == [None] * 5
+    assert smtp.sent == [f"user{i}@fleet.local" for i in range(5)]
+    assert (smtp.opened, pool.sent) == (1, 5)
+
+
+def test_temporary_errors_are_retried_on_a_new_connection(pool, smtp):
+    smtp.failures = [smtplib.SMTPServerDisconnected("lost"), smtplib.SMTPResponseException(421, b"busy")]
+    results = _submit(pool, 1)
+
+    assert wait_for(lambda: results)
+    assert results == [None] and smtp.sent == ["user0@fleet.local"]
+    assert smtp.opened == 3
+
+
+def test_permanent_errors_are_reported_without_retry(pool, smtp):
+    smtp.failures = [smtplib.SMTPResponseException(550, b"no such user")]
+    results = _submit(pool, 2)
+
+    assert wait_for(lambda: len(results) == 2)
+    assert isinstance(results[0], smtplib.SMTPResponseException) and results[1] is None
+    assert (pool.failed, pool.sent) == (1, 1)
+
+
+def test_idle_connection_is_closed(pool, smtp):
+    pool.idle_timeout = 0
+    results = _submit(pool, 1)
+
+    assert wait_for(lambda: results and smtp.closed == 1, timeout=3)
+    assert smtp.opened == 1
+
+
+def test_full_queue_drops_and_reports(app, smtp, monkeypatch):
+    monkeypatch.setitem(app.config, "MAIL_QUEUE_SIZE", 2)
+    pool = MailPool()
+    pool.init_app(app)
+    pool._ensure_started = lambda: None  # Pas de worker : la file reste pleine
+
+    results = _submit(pool, 3)
+    assert pool.dropped == 1
+    assert len(results) == 1 and str(results[0]) == "mail queue full"
+
+
+def _outbox():
+    return [(row.kind, row.status) for row in EmailOutbox.query.order_by(EmailOutbox.id)]
+
+
+def test_outbox_row_follows_the_transaction(app):
+    queue_email("reminder", "reminder:1", {"id": 1})
+    db.session.rollback()
+    assert _outbox() == []
+
+    queue_email("reminder", "reminder:1", {"id": 1})
+    queue_email("reminder", "reminder:1", {"id": 1})
+    db.session.commit()
+    assert len(_outbox()) == 1
+
+
+def test_repeated_status_transitions_each_send_an_email(app, make, vehicle, admin):
+    maintenance = make(Maintenance, id="mt1", vehicule_id=vehicle.id, statut="en_attente", demandeur_id=admin.id)
+
+    for statut in ("accepte", "rejete", "accepte"):
+        old_status, maintenance.statut = maintenance.statut, statut
+        send_status_update_notification(maintenance, old_status)
+        # Requête rejouée depuis la même version : même transition, aucun second email
+        send_status_update_notification(maintenance, old_status)
+        db.session.commit()
+
+    rows = EmailOutbox.query.order_by(EmailOutbox.id).all()
+    assert [json.loads(row.params)["status"] for row in rows] == ["accepte", "rejete", "accepte"]
+    assert len({row.dedupe_key for row in rows}) == 3
+    assert rows[0].dedupe_key.startswith("maintenance_status:mt1:en_attente->accepte:")
+
+
+def test_committed_alert_is_built_and_sent_after_commit(app, make, vehicle):
+    make(User, id="u-tech", email="t@test.local", name="T", role="technician", status="active", profile_email="t@fleet.local")
+    mission = make(Mission, id="m1", reference="OM-1", vehicule_id=vehicle.id, state="en_cours")
+
+    send_mission_status_notification(mission, "planifiee")
+    db.session.commit()
+
+    row = wait_for(lambda: EmailOutbox.query.filter(EmailOutbox.status.in_(["sent", "failed"])).first())
+    assert (row.kind, row.status, row.recipients) == ("mission_status", "sent", "t@fleet.local")
+
+
+def test_expiry_sweep_logs_its_recipients(app, make, vehicle, capsys):
+    make(User, id="u-admin", email="a@test.local", name="A", role="admin", status="active", profile_email="a@fleet.local")
+    make(User, id="u-tech", email="t@test.local", name="T", role="technician", status="active", profile_email="t@fleet.local")
+    make(Compliance, id="c1", vehicule_id=vehicle.id, type="assurance", date_expiration=date.today())
+
+    check_expiring_documents(app)
+    assert "1 document(s), 1 vehicle(s), 2 recipient(s)" in capsys.readouterr().out
+
+
+def _staff(make):
+    make(User, id="u-admin", email="a@test.local", name="A", role="admin", status="active", profile_email="a@fleet.local")
+    make(User, id="u-tech", email="t@test.local", name="T", role="technician", status="active", profile_email="t@fleet.local")
+    make(User, id="u-driver", email="d@test.local", name="D", role="driver", status="active", profile_email="d@fleet.local")
+    make(User, id="u-new", email="n@test.local", name="N", role="admin", status="active", profile_email="")
+
+
+def _count_queries(block):
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        block()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
+    return len(statements)
+
+
+def test_role_recipients_are_cached_until_users_change(app, make):
+    _staff(make)
+
+    assert get_role_recipients(STAFF_ROLES) == ["a@fleet.local", "t@fleet.local"]
+    # Même ensemble de rôles dans un autre ordre : même entrée de cache
+    assert _count_queries(lambda: get_role_recipients(("technician", "admin"))) == 0
+
+    db.session.get(User, "u-tech").profile_email = "tech@fleet.local"
+    db.session.commit()
+    assert get_role_recipients(STAFF_ROLES) == ["a@fleet.local", "tech@fleet.local"]
+    assert get_role_recipients(["driver"]) == ["d@fleet.local"]
+
+
+def test_digest_readers_get_alerts_grouped(app, make, vehicle):
+    _staff(make)
+    db.session.get(User, "u-tech").email_digest = "hourly"
+    db.session.commit()
+    mission = make(Mission, id="m1", reference="OM-1", vehicule_id=vehicle.id, state="en_cours")
+
+    for old_state, state in (("planifiee", "en_cours"), ("en_cours", "terminee")):
+        mission.state = state
+        send_mission_status_notification(mission, old_state)
+        db.session.commit()
+
+    # L'admin reçoit chaque alerte, le technicien les retrouve dans son récapitulatif
+    assert wait_for(lambda: EmailOutbox.query.filter_by(status="sent").count() == 2)
+    assert {row.recipients for row in EmailOutbox.query} == {"a@fleet.local"}
+    events = DigestEvent.query.order_by(DigestEvent.id).all()
+    assert [(e.recipient, e.frequency, e.kind) for e in events] == [("t@fleet.local", "hourly", "mission_status")] * 2
+
+    assert queue_email_digests("daily") == 0
+    assert queue_email_digests("hourly") == 1
+    assert queue_email_digests("hourly") == 0
+    digest = EmailOutbox.query.filter_by(kind="digest").one()
+    (msg,) = EMAIL_BUILDERS["digest"](json.loads(digest.params))
+    assert msg.recipients == ["t@fleet.local"]
+    assert msg.subject == "Récapitulatif horaire : 2 alerte(s)"
+    assert "EN_COURS" in msg.html and "TERMINEE" in msg.html
+
+
+def test_critical_alerts_skip_the_digest(app, make):
+    _staff(make)
+    db.session.get(User, "u-tech").email_digest = "daily"
+    db.session.commit()
+    msg = Message("Alerte", recipients=["a@fleet.local", "t@fleet.local"])
+
+    assert split_digest_recipients("abnormal_fuel", [msg]) == ([msg], [])
+    immediate, deferred = split_digest_recipients("mission_status", [msg])
+    assert immediate == [msg] and msg.recipients == ["a@fleet.local"]
+    assert [(recipient, frequency) for recipient, frequency, _ in deferred] == [("t@fleet.local", "daily")]
@@ -0,0 +1,90 @@
+import queue
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from app import db
+from app.models import Notification
+from app.utils import event_hub
+from app.utils.event_hub import hub
+
+
+@pytest.fixture
+def subscription():
+    sub = hub.subscribe("admin-1", "admin", ["planning", "notifications", "badges"])
+    yield sub
+    hub.unsubscribe(sub)
+
+
+def _events(sub, count, timeout=5):
+    return [sub.get(timeout=timeout) for _ in range(count)]
+
+
+def test_notification_commit_reaches_subscribers(make, subscription):
+    make(Notification, id="n1", title="Réservation acceptée", message="m", type="success", target_role="admin")
+
+    event = subscription.get(timeout=5)
+    assert event["event"] == "notifications"
+    assert event["data"]["id"] == "n1" and event["roles"] == ["admin"]
+
+
+def test_events_are_filtered_by_role_and_user(make):
+    driver = hub.subscribe("u2", "driver", ["notifications"])
+    try:
+        make(Notification, id="n1", title="t", message="m", type="info", target_role="admin")
+        make(Notification, id="n2", title="t", message="m", type="info", target_user_id="u2")
+        assert driver.get(timeout=5)["data"]["id"] == "n2"
+        with pytest.raises(queue.Empty):
+            driver.get(timeout=0.3)
+    finally:
+        hub.unsubscribe(driver)
+
+
+def test_publishing_runs_on_the_hub_thread(make, monkeypatch, subscription):
+    threads = []
+    publish = event_hub.publish_changes
+    monkeypatch.setattr(event_hub, "publish_changes", lambda changes: (
+        threads.append(threading.current_thread().name), publish(changes)))
+
+    make(Notification, id="n1", title="t", message="m", type="info", target_role="admin")
+
+    assert subscription.get(timeout=5)["data"]["id"] == "n1"
+    assert threads == ["event-hub-publisher"]
+
+
+def test_unrelated_commits_are_not_queued(vehicle, monkeypatch):
+    queued = []
+    monkeypatch.setattr(hub, "enqueue_changes", queued.append)
+    vehicle.marque = "Nissan"
+    db.session.commit()
+    assert queued == []
+
+
+def test_listener_closes_detached_connection_before_reconnecting(app, monkeypatch):
+    class Stop(Exception):
+        pass
+
+    class FakeRaw:
+        closed = False
+
+        def detach(self):
+            pass
+
+        @property
+        def driver_connection(self):
+            raise OSError("server closed the connection")
+
+        def close(self):
+            self.closed = True
+
+    raw = FakeRaw()
+    monkeypatch.setattr(type(db.engine), "raw_connection", lambda engine: raw)
+
+    def stop(seconds):
+        raise Stop()
+
+    monkeypatch.setattr(event_hub, "time", SimpleNamespace(sleep=stop))
+    with pytest.raises(Stop):
+        hub._listen()
+    assert raw.closed
@@ -0,0 +1,37 @@
+import io
+import json
+from datetime import date
+
+import openpyxl
+
+from app.models import FuelEntry, Maintenance
+from app.routes.reports import build_global_summary, summary_years, write_global_summary_xlsx
+
+
+def test_workbook_has_a_summary_and_one_sheet_per_year(make, vehicle):
+    make(FuelEntry, id="f1", vehicule_id="v1", date=date(2025, 3, 5), quantite_achetee=10, total_achete=100)
+    make(Maintenance, id="m1", vehicule_id="v1", type="vidange", description="d", kilometrage="1",
+         statut="termine", demandeur_id="x", date_demande=date(2025, 3, 9), date_prevue=date(2025, 3, 9), cout=70)
+    summary_data, year_range = build_global_summary()
+    # Comme servi par report_jobs : après un aller-retour JSON
+    summary_data = json.loads(json.dumps(summary_data))
+    assert summary_years(summary_data) == year_range
+
+    output = write_global_summary_xlsx(summary_data, year_range)
+    workbook = openpyxl.load_workbook(io.BytesIO(output.read()))
+
+    assert workbook.sheetnames == ["Récapitulatif", *[str(y) for y in year_range]]
+    summary = list(workbook["Récapitulatif"].iter_rows(values_only=True))
+    assert summary[0][0] == "Immatriculation" and summary[0][-1] == "Coût Global"
+    assert summary[1][0] == "1234 TAA" and summary[1][-3:] == (70, 100, 170)
+
+    year = list(workbook["2025"].iter_rows(values_only=True))
+    assert year[0][2] == "Jan"
+    assert year[1][:2] == ("1234 TAA", "Toyota Hilux") and year[1][4] == 170 and year[1][-1] == 170
+
+
+def test_empty_fleet():
+    output = write_global_summary_xlsx([], summary_years([]))
+    workbook = openpyxl.load_workbook(io.BytesIO(output.read()))
+    assert list(workbook["Récapitulatif"].iter_rows(values_only=True))[1:] == []
+    assert str(date.today().year) in workbook.sheetnames
@@ -0,0 +1,148 @@
+import csv
+import gzip
+import io
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from app.models import ActionLog, User
+from app.routes import logs as logs_routes
+from app.routes.logs import EXPORT_COLUMNS, encode_chunks
+
+
+def _log(i, when, user_id="admin-1", **values):
+    values = {"action": "Modification", "entite": "Véhicule", "entite_id": "v1", "details": f"entrée {i}", **values}
+    db.session.add(ActionLog(id=f"log-{i:02d}", user_id=user_id, timestamp=when, **values))
+
+
+@pytest.fixture
+def logs(admin):
+    start = datetime(2026, 3, 2, 8, 0)
+    for i in range(7):
+        _log(i, start + timedelta(hours=i))
+    # Même horodatage : l'id départage
+    _log(7, start + timedelta(hours=6))
+    db.session.commit()
+
+
+def test_logs_are_paginated_by_cursor(client, logs, admin, auth_headers):
+    headers = auth_headers(admin)
+
+    seen, cursor = [], None
+    while True:
+        res = client.get("/api/logs/", headers=headers, query_string={"limit": 3, **({"cursor": cursor} if cursor else {})})
+        assert res.status_code == 200
+        seen += [log["id"] for log in res.json]
+        cursor = res.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+
+    assert seen == ["log-07", "log-06", "log-05", "log-04", "log-03", "log-02", "log-01", "log-00"]
+    assert res.json[0]["user"] == {"name": "Admin", "avatar": None}
+    assert client.get("/api/logs/?cursor=bad", headers=headers).status_code == 400
+
+
+def test_logs_are_filtered_by_hour_and_user(client, make, logs, admin, auth_headers):
+    make(User, id="u2", email="u2@test.local", name="U2", role="technician", status="active")
+    _log(8, datetime(2026, 3, 2, 10, 30), user_id="u2")
+    _log(9, datetime(2026, 3, 2, 11, 0), user_id="deleted-user")
+    db.session.commit()
+    headers = auth_headers(admin)
+
+    res = client.get("/api/logs/?startHour=10:00&endHour=11:00", headers=headers)
+    assert [log["id"] for log in res.json] == ["log-09", "log-03", "log-08", "log-02"]
+    assert res.json[0]["user"]["name"] == "Utilisateur supprimé"
+
+    res = client.get("/api/logs/?userId=u2", headers=headers)
+    assert [log["id"] for log in res.json] == ["log-08"]
+
+
+def test_logs_are_admin_only(client, make, auth_headers):
+    tech = make(User, id="u2", email="u2@test.local", name="U2", role="technician", status="active")
+    assert client.get("/api/logs/", headers=auth_headers(tech)).status_code == 403
+
+
+def test_search_matches_text_entity_and_vehicle_payload(client, admin, auth_headers):
+    when = datetime(2026, 3, 2, 8)
+    _log(1, when, details="Vidange moteur effectuée", entite="Maintenance", entite_id="mt1", payload={"vehicleIds": ["v1"]})
+    _log(2, when + timedelta(hours=1), details="Plein de gasoil", entite="Carburant", entite_id="f1", payload={"vehicleIds": ["v2"]})
+    _log(3, when + timedelta(hours=2), details="Véhicule modifié", entite="Véhicule", entite_id="v1")
+    _log(4, when + timedelta(hours=3), details="vidange planifiée", entite="Planning", entite_id="p1", payload={"vehicleIds": ["v10"]})
+    db.session.commit()
+    headers = auth_headers(admin)
+
+    def search(**args):
+        res = client.get("/api/logs/search", headers=headers, query_string=args)
+        assert res.status_code == 200
+        return [log["id"] for log in res.json]
+
+    assert search(q="vidange") == ["log-04", "log-01"]
+    assert search(entite="Carburant") == ["log-02"]
+    assert search(vehicleId="v1") == ["log-03", "log-01"]
+    assert search(q="vidange", vehicleId="v1") == ["log-01"]
+    assert search(q="vidange", endDate="2026-03-02T09:00:00") == ["log-01"]
+
+
+def test_search_requires_a_criterion(client, admin, auth_headers):
+    headers = auth_headers(admin)
+    assert client.get("/api/logs/search", headers=headers).status_code == 400
+    assert client.get("/api/logs/search?q=x&startDate=bad", headers=headers).status_code == 400
+
+
+def _export(client, headers, **args):
+    res = client.get("/api/logs/export", headers=headers, query_string=args)
+    assert res.status_code == 200
+    return res
+
+
+def test_export_streams_gzip_csv_oldest_first(client, logs, admin, auth_headers):
+    res = _export(client, auth_headers(admin))
+    assert res.mimetype == "application/gzip"
+    assert res.headers["Content-Disposition"].endswith('.csv.gz"')
+
+    rows = list(csv.reader(io.StringIO(gzip.decompress(res.data).decode("utf-8-sig"))))
+    assert rows[0] == EXPORT_COLUMNS
+    assert [row[0] for row in rows[1:]] == ["log-00", "log-01", "log-02", "log-03", "log-04", "log-05", "log-06", "log-07"]
+    assert rows[1][3] == "Admin"
+
+
+def test_export_ndjson_applies_the_list_filters(client, logs, admin, auth_headers):
+    res = _export(client, auth_headers(admin), format="ndjson", gzip="0", startHour="10:00", endHour="11:00")
+    assert res.mimetype == "application/x-ndjson"
+
+    records = [json.loads(line) for line in res.data.decode("utf-8").splitlines()]
+    assert [r["id"] for r in records] == ["log-02", "log-03"]
+    assert set(records[0]) == set(EXPORT_COLUMNS)
+
+
+def test_export_chunks_are_compressed_on_the_fly(monkeypatch):
+    monkeypatch.setattr(logs_routes, "EXPORT_CHUNK_BYTES", 100)
+    lines = [f"ligne {i:04d} " * 5 + "\n" for i in range(200)]
+
+    chunks = list(encode_chunks(iter(lines), compress=True))
+    assert len(chunks) > 1
+    assert gzip.decompress(b"".join(chunks)).decode() == "".join(lines)
+    assert b"".join(encode_chunks(iter(lines), compress=False)).decode() == "".join(lines)
+
+
+def test_export_rejects_an_unknown_format(client, admin, auth_headers):
+    assert client.get("/api/logs/export?format=xml", headers=auth_headers(admin)).status_code == 400
+
+
+def test_vehicle_search_treats_wildcards_literally(client, admin, auth_headers):
+    when = datetime(2026, 3, 2, 8)
+    _log(1, when, entite="Maintenance", entite_id="mt1", payload={"vehicleIds": ["v1"]})
+    _log(2, when, entite="Maintenance", entite_id="mt2", payload={"vehicleIds": ["v_2"]})
+    db.session.commit()
+    headers = auth_headers(admin)
+
+    def search(vehicle_id):
+        return [log["id"] for log in client.get("/api/logs/search", headers=headers,
+                                                query_string={"vehicleId": vehicle_id}).json]
+
+    assert search("%") == []
+    assert search("v_") == []
+    assert search("v%2") == []
+    assert search("v_2") == ["log-02"]
@@ -0,0 +1,135 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from app import db
+from app.models import Notification, NotificationArchive, NotificationInbox, NotificationInboxArchive, User
+from app.utils.notification_utils import archive_old_notifications, create_notification, create_notifications
+
+
+def _users(make):
+    return {
+        "admin": make(User, id="u-admin", email="a@test.local", name="A", role="admin", status="active"),
+        "tech": make(User, id="u-tech", email="t@test.local", name="T", role="technician", status="active"),
+        "driver": make(User, id="u-driver", email="d@test.local", name="D", role="driver", status="active"),
+    }
+
+
+def _inbox():
+    return sorted((row.user_id, row.notification_id) for row in NotificationInbox.query.all())
+
+
+def test_notifications_are_fanned_out_to_their_recipients(make):
+    _users(make)
+    roles = create_notification("t", "m", target_role="admin, technician")
+    user = create_notification("t", "m", target_user_id="u-driver")
+    everyone = create_notification("t", "m")
+
+    assert _inbox() == sorted([
+        ("u-admin", roles.id), ("u-tech", roles.id),
+        ("u-driver", user.id),
+        ("u-admin", everyone.id), ("u-tech", everyone.id), ("u-driver", everyone.id),
+    ])
+
+
+def test_roles_match_exactly(make):
+    _users(make)
+    make(User, id="u-tech2", email="t2@test.local", name="T2", role="tech", status="active")
+    notif = create_notification("t", "m", target_role="technician")
+    assert _inbox() == [("u-tech", notif.id)]
+
+
+def test_inbox_rows_share_the_caller_transaction(make):
+    _users(make)
+    create_notifications([{"title": "t", "message": "m", "target_role": "admin"}])
+    db.session.rollback()
+    assert _inbox() == []
+
+
+def test_user_reads_only_their_inbox(client, make, auth_headers):
+    users = _users(make)
+    create_notification("Pour l'admin", "m", target_role="admin")
+    mine = create_notification("Pour le conducteur", "m", target_user_id="u-driver")
+    headers = auth_headers(users["driver"])
+
+    assert [n["id"] for n in client.get("/api/notifications/", headers=headers).json] == [mine.id]
+    assert client.get("/api/notifications/unread-count", headers=headers).json == {"unread": 1}
+    client.post(f"/api/notifications/{mine.id}/read", headers=headers)
+    assert client.get("/api/notifications/unread-count", headers=headers).json == {"unread": 0}
+    assert client.get("/api/notifications/").status_code == 401
+
+
+def test_bulk_creation_gives_unique_ids(make):
+    _users(make)
+    created = create_notifications([{"title": f"t{i}", "message": "m", "target_role": "admin"} for i in range(20)])
+    db.session.commit()
+
+    assert len({n.id for n in created}) == 20
+    assert len(_inbox()) == 20
+    assert create_notifications([]) == []
+
+
+def test_mark_all_as_read_only_touches_the_user_inbox(client, make, auth_headers):
+    users = _users(make)
+    for i in range(3):
+        create_notification(f"t{i}", "m", target_role="admin,driver")
+    headers = auth_headers(users["driver"])
+
+    res = client.post("/api/notifications/read-all", headers=headers)
+    assert res.status_code == 200 and res.json == {"success": True, "updated": 3}
+    assert client.post("/api/notifications/read-all", headers=headers).json["updated"] == 0
+
+    unread = {row.user_id for row in NotificationInbox.query.filter_by(is_read=False)}
+    assert unread == {"u-admin"}
+    assert client.post("/api/notifications/read-all").status_code == 401
+
+
+def _age(notification, days):
+    """Vieillit une notification et ses lignes de boîte de réception."""
+    when = datetime.utcnow() - timedelta(days=days)
+    notification_id = notification.id
+    db.session.execute(update(Notification).where(Notification.id == notification_id).values(timestamp=when))
+    db.session.execute(update(NotificationInbox).where(NotificationInbox.notification_id == notification_id)
+                       .values(created_at=when))
+    db.session.commit()
+
+
+def test_old_notifications_are_archived_in_batches(make):
+    _users(make)
+    old = [create_notification(f"old{i}", "m", target_user_id="u-driver") for i in range(5)]
+    recent = create_notification("recent", "m", target_user_id="u-driver").id
+    for i, notif in enumerate(old):
+        _age(notif, 100 + 10 * i)
+
+    assert archive_old_notifications(90, batch_size=2) == (5, 0)
+    assert [n.id for n in Notification.query.all()] == [recent]
+    assert _inbox() == [("u-driver", recent)]
+    assert NotificationArchive.query.count() == 5
+    assert NotificationInboxArchive.query.count() == 5
+
+    # Purge des archives au-delà de archive_days
+    assert archive_old_notifications(90, archive_days=125) == (0, 2)
+    assert NotificationArchive.query.count() == 3
+
+
+def test_archive_is_paginated_by_cursor(client, make, auth_headers):
+    users = _users(make)
+    old = [create_notification(f"old{i}", "m", target_user_id="u-driver") for i in range(5)]
+    for i, notif in enumerate(old):
+        _age(notif, 100 + 10 * i)
+    old_ids = [n.id for n in old]
+    archive_old_notifications(90)
+    headers = auth_headers(users["driver"])
+
+    seen, cursor = [], None
+    while True:
+        page = client.get("/api/notifications/archive", headers=headers,
+                          query_string={"limit": 2, **({"cursor": cursor} if cursor else {})}).json
+        seen += [item["id"] for item in page["items"]]
+        cursor = page["nextCursor"]
+        if not cursor:
+            break
+
+    assert seen == old_ids
+    assert client.get("/api/notifications/archive", headers=auth_headers(users["admin"])).json["items"] == []
+    assert client.get("/api/notifications/archive?cursor=bad", headers=headers).status_code == 400
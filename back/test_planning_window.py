@@ -0,0 +1,43 @@
+from datetime import datetime
+
+import pytest
+
+from app.models import Planning
+
+
+@pytest.fixture
+def bookings(make, vehicle):
+    make(Planning, id="p1", vehicule_id="v1", type="reserve", description="d", status="acceptee",
+         date_debut=datetime(2026, 3, 2, 8), date_fin=datetime(2026, 3, 4, 18))
+    make(Planning, id="p2", vehicule_id="v1", type="reserve", description="d", status="en_attente",
+         date_debut=datetime(2026, 3, 10, 8), date_fin=datetime(2026, 3, 10, 12))
+    make(Planning, id="p3", vehicule_id="v1", type="reserve", description="d", status="acceptee",
+         date_debut=datetime(2026, 4, 1, 8), date_fin=datetime(2026, 4, 1, 12))
+
+
+def test_window_returns_overlapping_bookings(client, bookings):
+    body = client.get("/api/planning/?from=2026-03-03&to=2026-03-10").json
+    assert sorted(p["id"] for p in body) == ["p1", "p2"]
+
+    body = client.get("/api/planning/?from=2026-03-01&to=2026-03-31&status=acceptee").json
+    assert [p["id"] for p in body] == ["p1"]
+
+
+def test_day_buckets_split_multi_day_bookings(client, bookings):
+    body = client.get("/api/planning/?from=2026-03-03&to=2026-03-04&group=day").json
+    assert [b["key"] for b in body["buckets"]] == ["2026-03-03", "2026-03-04"]
+    assert all([i["id"] for i in b["items"]] == ["p1"] for b in body["buckets"])
+
+
+def test_week_buckets(client, bookings):
+    body = client.get("/api/planning/?from=2026-03-01&to=2026-03-15&group=week").json
+    assert {b["key"]: [i["id"] for i in b["items"]] for b in body["buckets"]} == {
+        "2026-W10": ["p1"],
+        "2026-W11": ["p2"],
+    }
+    assert body["buckets"][0]["start"] == "2026-03-02"
+
+
+def test_invalid_parameters(client):
+    assert client.get("/api/planning/?group=month").status_code == 400
+    assert client.get("/api/planning/?from=03/03/2026").status_code == 400
@@ -0,0 +1,127 @@
+import io
+import threading
+from datetime import datetime, timedelta
+
+import openpyxl
+import pytest
+from sqlalchemy import update
+
+from app import db
+from app.models import ReportJob, Vehicle
+from app.utils import report_jobs
+from app.utils.report_jobs import REPORTS, register_report
+
+from conftest import wait_for
+
+
+@pytest.fixture
+def gated_report():
+    """Rapport dont le calcul attend le feu vert du test."""
+    release = threading.Event()
+    calls = []
+
+    @register_report("test_gated", entities=("vehicles",))
+    def compute(params):
+        calls.append(threading.current_thread().name)
+        release.wait(5)
+        return {"vehicles": Vehicle.query.count()}
+
+    yield release, calls
+    release.set()
+    REPORTS.pop("test_gated", None)
+
+
+def _job(client, headers, job_id):
+    return client.get(f"/api/reports/jobs/{job_id}", headers=headers)
+
+
+def test_get_returns_a_job_then_the_stored_result(client, admin, auth_headers, vehicle, gated_report):
+    release, calls = gated_report
+    headers = auth_headers(admin)
+
+    first = client.post("/api/reports/jobs", headers=headers, json={"report": "test_gated"})
+    assert first.status_code == 202 and first.json["status"] == "pending"
+    # Même rapport, mêmes données : le job en cours est réutilisé, suivi dès la demande
+    again = client.post("/api/reports/jobs", headers=headers, json={"report": "test_gated"})
+    assert again.json["id"] == first.json["id"]
+    assert _job(client, headers, first.json["id"]).status_code == 200
+
+    release.set()
+    done = wait_for(lambda: _job(client, headers, first.json["id"]).json["status"] == "done")
+    assert done
+    assert _job(client, headers, first.json["id"]).json["result"] == {"vehicles": 1}
+    assert calls == [calls[0]] and calls[0].startswith("report-job")
+
+
+def test_report_routes_never_compute_in_the_request(client, vehicle, monkeypatch):
+    computed = threading.Event()
+    compute, entities = REPORTS["stats"]
+    monkeypatch.setitem(REPORTS, "stats", (lambda params: (computed.set(), compute(params))[1], entities))
+
+    response = client.get("/api/reports/stats")
+    assert response.status_code == 202 and "id" in response.json
+    assert wait_for(computed.is_set)
+    assert wait_for(lambda: client.get("/api/reports/stats").status_code == 200)
+    assert client.get("/api/reports/stats").json["summary"]["totalVehicles"] == 1
+
+
+def test_new_data_version_starts_a_new_job(client, vehicle, make):
+    assert client.get("/api/reports/global_summary").status_code == 202
+    assert wait_for(lambda: client.get("/api/reports/global_summary").status_code == 200)
+
+    make(Vehicle, id="v2", immatriculation="5678 TBB", marque="x", modele="x", type_vehicule="x")
+    assert client.get("/api/reports/global_summary").status_code == 202
+    rows = wait_for(lambda: (r := client.get("/api/reports/global_summary")).status_code == 200 and r.json)
+    assert sorted(row["immatriculation"] for row in rows) == ["1234 TAA", "5678 TBB"]
+    # Le résultat de la version précédente est purgé
+    assert wait_for(lambda: ReportJob.query.filter_by(report="global_summary").count() == 1)
+
+
+def test_excel_export_waits_for_the_summary(client, vehicle):
+    assert client.get("/api/reports/global_summary.xlsx").status_code == 202
+    response = wait_for(lambda: (r := client.get("/api/reports/global_summary.xlsx")).status_code == 200 and r)
+    workbook = openpyxl.load_workbook(io.BytesIO(response.data))
+    assert "Récapitulatif" in workbook.sheetnames
+
+
+def test_failed_job(client, admin, auth_headers, monkeypatch):
+    def fail(params):
+        raise ValueError("boom")
+
+    monkeypatch.setitem(REPORTS, "stats", (fail, REPORTS["stats"][1]))
+    job_id = client.get("/api/reports/stats").json["id"]
+    headers = auth_headers(admin)
+    job = wait_for(lambda: (j := _job(client, headers, job_id).json)["status"] == "failed" and j)
+    assert job["error"] == "boom"
+    assert report_jobs._inflight == {}
+
+
+class _QueuedExecutor:
+    """Exécuteur saturé : les jobs soumis restent en file."""
+
+    def __init__(self):
+        self.queued = []
+
+    def submit(self, fn, *args):
+        self.queued.append(args)
+
+
+def test_queued_job_is_visible_to_every_worker_then_reported_lost(client, admin, auth_headers, monkeypatch):
+    executor = _QueuedExecutor()
+    monkeypatch.setattr(report_jobs, "_get_executor", lambda: executor)
+    headers = auth_headers(admin)
+
+    job_id = client.post("/api/reports/jobs", headers=headers, json={"report": "stats"}).json["id"]
+    # Ligne écrite à la demande : un autre worker (sans _inflight) suit le job
+    monkeypatch.setattr(report_jobs, "_inflight", {})
+    assert _job(client, headers, job_id).json["status"] == "pending"
+    assert len(executor.queued) == 1
+
+    # Worker arrêté avant d'avoir calculé : le job est signalé en échec, une nouvelle demande relance
+    db.session.execute(update(ReportJob).where(ReportJob.id == job_id).values(
+        created_at=datetime.utcnow() - report_jobs.STALE_AFTER - timedelta(seconds=1)))
+    db.session.commit()
+    job = _job(client, headers, job_id).json
+    assert job["status"] == "failed" and job["error"]
+    assert client.post("/api/reports/jobs", headers=headers, json={"report": "stats"}).json["id"] != job_id
+    assert _job(client, headers, "unknown").status_code == 404
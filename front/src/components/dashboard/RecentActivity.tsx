@@ -26,7 +26,7 @@ export const RecentActivity: React.FC = () => {
   const { data: logs = [] } = useQuery({
     queryKey: ['recentLogs'],
     queryFn: async () => {
-      const res = await apiClient.get<any[]>('/logs');
+      const res = await apiClient.get<any[]>('/logs?limit=5');
       return res.data;
     },
   });
@@ -18,6 +18,7 @@ import {
   DropdownMenuTrigger,
 } from '@/components/ui/dropdown-menu';
 import { UserRole, ROLE_LABELS } from '@/types';
+import { NOTIFICATION_EVENT } from '@/hooks/use-event-stream';
 
 interface HeaderProps {
   onMenuToggle: () => void;
@@ -29,6 +30,7 @@ export const Header: React.FC<HeaderProps> = ({ onMenuToggle }) => {
   const navigate = useNavigate();
   const location = useLocation();
   const [notifications, setNotifications] = React.useState<AppNotification[]>([]);
+  const [unreadCount, setUnreadCount] = React.useState(0);
   const [loading, setLoading] = React.useState(false);
   const [mounted, setMounted] = useState(false);
 
@@ -40,8 +42,12 @@ export const Header: React.FC<HeaderProps> = ({ onMenuToggle }) => {
 
   const fetchNotifications = async () => {
     try {
-      const data = await notificationsService.getAll();
+      const [data, unread] = await Promise.all([
+        notificationsService.getAll(),
+        notificationsService.getUnreadCount(),
+      ]);
       setNotifications(data);
+      setUnreadCount(unread);
     } catch (error) {
       console.error("Failed to fetch notifications", error);
     }
@@ -49,11 +55,24 @@ export const Header: React.FC<HeaderProps> = ({ onMenuToggle }) => {
 
   React.useEffect(() => {
     fetchNotifications();
-    const interval = setInterval(fetchNotifications, 30000); // Poll every 30s
-    return () => clearInterval(interval);
+    // New notifications are pushed through /api/stream; polling is only a safety net
+    window.addEventListener(NOTIFICATION_EVENT, fetchNotifications);
+    const interval = setInterval(fetchNotifications, 300000);
+    return () => {
+      window.removeEventListener(NOTIFICATION_EVENT, fetchNotifications);
+      clearInterval(interval);
+    };
   }, []);
 
-  const unreadCount = notifications.filter(n => !n.isRead).length;
+  const handleMarkAllAsRead = async (e: React.MouseEvent) => {
+    e.preventDefault();
+    try {
+      await notificationsService.markAllAsRead();
+      fetchNotifications();
+    } catch (error) {
+      console.error("Failed to mark notifications as read", error);
+    }
+  };
 
   const handleNotificationClick = async (notif: AppNotification) => {
     if (!notif.isRead) {
@@ -147,7 +166,18 @@ export const Header: React.FC<HeaderProps> = ({ onMenuToggle }) => {
             <DropdownMenuContent align="end" className="w-80">
               <DropdownMenuLabel className="flex items-center justify-between">
                 Notifications
-                <Badge variant="muted">{unreadCount} non lues</Badge>
+                <div className="flex items-center gap-2">
+                  {unreadCount > 0 && (
+                    <button
+                      type="button"
+                      className="text-[10px] font-normal text-primary hover:underline"
+                      onClick={handleMarkAllAsRead}
+                    >
+                      Tout marquer comme lu
+                    </button>
+                  )}
+                  <Badge variant="muted">{unreadCount} non lues</Badge>
+                </div>
               </DropdownMenuLabel>
               <DropdownMenuSeparator />
               <div className="max-h-[400px] overflow-y-auto">
@@ -4,9 +4,15 @@ import { cn } from '@/lib/utils';
 import { Sidebar } from './Sidebar';
 import { Header } from './Header';
 import { AIAssistant } from '@/components/assistant/AIAssistant';
+import { useAuth } from '@/contexts/AuthContext';
+import { useEventStream } from '@/hooks/use-event-stream';
 
 export const MainLayout: React.FC = () => {
   const [sidebarCollapsed, setSidebarCollapsed] = useState(false);
+  const { user } = useAuth();
+
+  // Push channel: planning, notifications and badges are refreshed on write instead of polled
+  useEventStream(!!user);
 
   return (
     <div className="min-h-screen bg-background flex">
@@ -125,8 +125,8 @@ export const Sidebar: React.FC<SidebarProps> = ({ isCollapsed, onToggle }) => {
       const res = await apiClient.get<any>('/notifications/badges');
       return res.data;
     },
-    // Refresh every 30 seconds
-    refetchInterval: 30000,
+    // Pushed through /api/stream; polling is only a safety net
+    refetchInterval: 300000,
   });
 
   if (!user) return null;
@@ -5,10 +5,9 @@ import { Table, TableBody, TableCell, TableHead, TableHeader, TableRow } from '@
 import { FileText, Download, Plus, Minus } from 'lucide-react';
 import { Button } from '@/components/ui/button';
 import { StatusBadge } from '@/components/common/StatusBadge';
-import { formatDateFr, formatCurrency } from '@/lib/utils';
-import * as XLSX from 'xlsx';
+import { formatCurrency } from '@/lib/utils';
 import { ScrollArea, ScrollBar } from '@/components/ui/scroll-area';
-import { apiClient } from '@/lib/api';
+import { reportsService } from '@/services/reports';
 
 // Interface matching the backend response
 interface GlobalSummaryRow {
@@ -53,34 +52,18 @@ export const GlobalSummaryTable: React.FC = () => {
 
     const { data: rows = [], isLoading } = useQuery<GlobalSummaryRow[]>({
         queryKey: ['global-summary'],
-        queryFn: async () => {
-            const res = await apiClient.get<GlobalSummaryRow[]>('/reports/global_summary');
-            return res.data;
-        }
+        queryFn: () => reportsService.get<GlobalSummaryRow[]>('/reports/global_summary')
     });
 
-    const exportToExcel = () => {
-        // Prep data for export (flatten/translate headers if needed)
-        const ws = XLSX.utils.json_to_sheet(rows.map(r => ({
-            "Immatriculation": r.immatriculation,
-            "Type": r.type_vehicule,
-            "Marque": r.marque,
-            "Mise en circulation": r.annee_mise_circulation ? formatDateFr(r.annee_mise_circulation) : '',
-            "Statut": r.statut,
-            "Valeur Acquisition": r.valeur_acquisition,
-            "Année Acquisition": r.annee_acquisition,
-            "Ancienneté": r.anciennete,
-            ...validYears.reduce((acc, year) => ({
-                ...acc,
-                [year.toString()]: r[`cost_${year}`] || 0
-            }), {}),
-            "Coût Total Maintenance": r.total_maintenance,
-            "Coût Total Carburant": r.total_fuel,
-            "Coût Global": r.total_global
-        })));
-        const wb = XLSX.utils.book_new();
-        XLSX.utils.book_append_sheet(wb, ws, "Recapitulatif");
-        XLSX.writeFile(wb, "recapitulatif_flotte.xlsx");
+    const exportToExcel = async () => {
+        // Le classeur (récapitulatif + une feuille par année) est généré côté serveur
+        const blob = await reportsService.download('/reports/global_summary.xlsx');
+        const url = URL.createObjectURL(blob);
+        const link = document.createElement('a');
+        link.href = url;
+        link.download = "recapitulatif_flotte.xlsx";
+        link.click();
+        URL.revokeObjectURL(url);
     };
 
     if (isLoading) return <div className="p-4 text-center">Chargement du rapport...</div>;
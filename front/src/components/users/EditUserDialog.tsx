@@ -16,7 +16,7 @@ import {
 } from '@/components/ui/select';
 import { Button } from '@/components/ui/button';
 import { Label } from '@/components/ui/label';
-import { User, UserRole, ROLE_LABELS } from '@/types';
+import { User, UserRole, ROLE_LABELS, EmailDigest, EMAIL_DIGEST_LABELS } from '@/types';
 import { userService } from '@/services/users';
 import { toast } from 'sonner';
 
@@ -34,12 +34,14 @@ export const EditUserDialog: React.FC<EditUserDialogProps> = ({
     onSuccess,
 }) => {
     const [role, setRole] = useState<UserRole | ''>(user?.role || '');
+    const [emailDigest, setEmailDigest] = useState<EmailDigest>(user?.emailDigest || 'immediate');
     const [loading, setLoading] = useState(false);
 
     // Update local state when user prop changes
     React.useEffect(() => {
         if (user) {
             setRole(user.role);
+            setEmailDigest(user.emailDigest || 'immediate');
         }
     }, [user]);
 
@@ -49,13 +51,19 @@ export const EditUserDialog: React.FC<EditUserDialogProps> = ({
 
         try {
             setLoading(true);
-            await userService.updateRole(user.id, role);
-            toast.success('Rôle mis à jour avec succès');
+            // Un changement de rôle ferme les sessions de l'utilisateur : seulement si le rôle change
+            if (role !== user.role) {
+                await userService.updateRole(user.id, role);
+            }
+            if (emailDigest !== (user.emailDigest || 'immediate')) {
+                await userService.updateEmailDigest(user.id, emailDigest);
+            }
+            toast.success('Utilisateur mis à jour avec succès');
             onSuccess();
             onOpenChange(false);
         } catch (error) {
-            console.error('Failed to update role', error);
-            toast.error('Erreur lors de la mise à jour du rôle');
+            console.error('Failed to update user', error);
+            toast.error("Erreur lors de la mise à jour de l'utilisateur");
         } finally {
             setLoading(false);
         }
@@ -67,9 +75,9 @@ export const EditUserDialog: React.FC<EditUserDialogProps> = ({
         <Dialog open={open} onOpenChange={onOpenChange}>
             <DialogContent className="sm:max-w-[425px]">
                 <DialogHeader>
-                    <DialogTitle>Modifier le rôle</DialogTitle>
+                    <DialogTitle>Modifier l'utilisateur</DialogTitle>
                     <DialogDescription>
-                        Modifier le rôle de l'utilisateur {user.name} ({user.email}).
+                        Modifier le rôle et la fréquence des emails de {user.name} ({user.email}).
                     </DialogDescription>
                 </DialogHeader>
                 <form onSubmit={handleSubmit} className="space-y-4">
@@ -91,6 +99,27 @@ export const EditUserDialog: React.FC<EditUserDialogProps> = ({
                             </SelectContent>
                         </Select>
                     </div>
+                    <div className="space-y-2">
+                        <Label htmlFor="emailDigest">Emails d'alerte</Label>
+                        <Select
+                            value={emailDigest}
+                            onValueChange={(value) => setEmailDigest(value as EmailDigest)}
+                        >
+                            <SelectTrigger id="emailDigest">
+                                <SelectValue placeholder="Sélectionner une fréquence" />
+                            </SelectTrigger>
+                            <SelectContent>
+                                {Object.entries(EMAIL_DIGEST_LABELS).map(([value, label]) => (
+                                    <SelectItem key={value} value={value}>
+                                        {label}
+                                    </SelectItem>
+                                ))}
+                            </SelectContent>
+                        </Select>
+                        <p className="text-sm text-muted-foreground">
+                            Les alertes critiques (carburant anormal, budget dépassé) sont toujours envoyées immédiatement.
+                        </p>
+                    </div>
                     <DialogFooter>
                         <Button type="button" variant="outline" onClick={() => onOpenChange(false)}>
                             Annuler
@@ -0,0 +1,32 @@
+import { useEffect } from 'react';
+import { useQueryClient } from '@tanstack/react-query';
+import { API_BASE_URL, apiClient } from '@/lib/api';
+
+export const NOTIFICATION_EVENT = 'fiara:notification';
+
+/**
+ * Opens the server push channel (/api/stream) once per tab and refreshes
+ * the matching queries when planning rows, notifications or badges change.
+ */
+export function useEventStream(enabled: boolean) {
+  const queryClient = useQueryClient();
+
+  useEffect(() => {
+    const token = apiClient.getAuthToken();
+    if (!enabled || !token || typeof EventSource === 'undefined') return;
+
+    const source = new EventSource(`${API_BASE_URL}/stream?token=${encodeURIComponent(token)}`);
+
+    source.addEventListener('planning', () => {
+      queryClient.invalidateQueries({ queryKey: ['planning'] });
+    });
+    source.addEventListener('badges', (event) => {
+      queryClient.setQueryData(['badges'], JSON.parse((event as MessageEvent).data));
+    });
+    source.addEventListener('notifications', (event) => {
+      window.dispatchEvent(new CustomEvent(NOTIFICATION_EVENT, { detail: JSON.parse((event as MessageEvent).data) }));
+    });
+
+    return () => source.close();
+  }, [enabled, queryClient]);
+}
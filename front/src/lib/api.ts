@@ -1,6 +1,6 @@
 import axios, { AxiosInstance, AxiosRequestConfig, AxiosResponse } from 'axios';
 
-const API_BASE_URL = 'http://192.168.1.22:5000/api';
+export const API_BASE_URL = 'http://192.168.1.22:5000/api';
 
 class ApiClient {
   private axiosInstance: AxiosInstance;
@@ -69,6 +69,10 @@ class ApiClient {
     this.authToken = null;
   }
 
+  public getAuthToken(): string | null {
+    return this.authToken;
+  }
+
   public async get<T>(url: string, config?: AxiosRequestConfig): Promise<AxiosResponse<T>> {
     return this.axiosInstance.get<T>(url, config);
   }
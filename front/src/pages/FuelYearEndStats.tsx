@@ -1,6 +1,7 @@
 import React, { useState } from 'react';
 import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query';
 import { apiClient } from '@/lib/api';
+import { reportsService } from '@/services/reports';
 import { PageHeader } from '@/components/common/PageHeader';
 import { TrendingUp, Calendar, Car, Download, ArrowLeft, AlertTriangle, Edit2, Check, X } from 'lucide-react';
 import { Button } from '@/components/ui/button';
@@ -139,10 +140,7 @@ const FuelYearEndStats: React.FC = () => {
 
     const { data: yearEndData, isLoading } = useQuery<YearEndResponse>({
         queryKey: ['yearEndBalanceWithBudgets', selectedYear],
-        queryFn: async () => {
-            const response = await apiClient.get<YearEndResponse>(`/fuel/year-end-balance-with-budgets?year=${selectedYear}`);
-            return response.data;
-        },
+        queryFn: () => reportsService.get<YearEndResponse>(`/fuel/year-end-balance-with-budgets?year=${selectedYear}`),
     });
 
     const handleBudgetUpdate = () => {
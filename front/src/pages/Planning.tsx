@@ -125,7 +125,7 @@ const Planning: React.FC = () => {
   const { data: planningItems = [], isFetching: isPlanningFetching, refetch: refetchPlanning } = useQuery({
     queryKey: ['planning'],
     queryFn: async () => (await apiClient.get<any[]>(`/planning?t=${Date.now()}`)).data,
-    refetchInterval: 5000, // Reduced to 5s for better responsiveness
+    refetchInterval: 120000, // Safety net: changes are pushed through /api/stream
     refetchOnWindowFocus: true,
     staleTime: 0
   });
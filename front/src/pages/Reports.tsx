@@ -27,19 +27,19 @@ import {
   Line,
 } from 'recharts';
 import { useQuery } from '@tanstack/react-query';
-import { apiClient } from '@/lib/api';
 import { jsPDF } from 'jspdf';
 import autoTable from 'jspdf-autotable';
 import { toast } from '@/hooks/use-toast';
 
 import { GlobalSummaryTable } from '@/components/reports/GlobalSummaryTable';
+import { reportsService } from '@/services/reports';
 import { formatDateFr } from '@/lib/utils';
 import { StatsCard } from '@/components/dashboard/StatsCard';
 
 const Reports: React.FC = () => {
   const { data: reportsStats, isLoading } = useQuery({
     queryKey: ['reports-stats'],
-    queryFn: async () => (await apiClient.get<any>('/reports/stats')).data
+    queryFn: () => reportsService.get<any>('/reports/stats')
   });
 
   const summary = reportsStats?.summary || {
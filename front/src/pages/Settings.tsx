@@ -31,6 +31,7 @@ import {
   XCircle,
   Filter,
   X,
+  Download,
 } from 'lucide-react';
 import {
   Popover,
@@ -70,18 +71,20 @@ const Settings: React.FC = () => {
   // Logs state
   const [loadingLogs, setLoadingLogs] = useState(false);
   const [logFilters, setLogFilters] = useState({ start: '', end: '', startHour: '', endHour: '', userId: '' });
+  const [logsCursor, setLogsCursor] = useState<string | null>(null);
 
-  const fetchLogs = async () => {
+  const fetchLogs = async (cursor: string | null = null) => {
     try {
       setLoadingLogs(true);
-      const data = await logsService.getAll({
+      const page = await logsService.getPage({
         startDate: logFilters.start ? new Date(logFilters.start).toISOString() : undefined,
         endDate: logFilters.end ? new Date(logFilters.end).toISOString() : undefined,
         startHour: logFilters.startHour || undefined,
         endHour: logFilters.endHour || undefined,
         userId: logFilters.userId || undefined
-      });
-      setLogs(data);
+      }, cursor);
+      setLogs(prev => cursor ? [...prev, ...page.logs] : page.logs);
+      setLogsCursor(page.nextCursor);
     } catch (error) {
       console.error("Failed to fetch logs", error);
       toast.error("Erreur lors du chargement des logs");
@@ -94,6 +97,32 @@ const Settings: React.FC = () => {
     fetchLogs();
   }, [logFilters]);
 
+  const [exportingLogs, setExportingLogs] = useState(false);
+
+  const handleExportLogs = async () => {
+    try {
+      setExportingLogs(true);
+      const blob = await logsService.exportFile({
+        startDate: logFilters.start ? new Date(logFilters.start).toISOString() : undefined,
+        endDate: logFilters.end ? new Date(logFilters.end).toISOString() : undefined,
+        startHour: logFilters.startHour || undefined,
+        endHour: logFilters.endHour || undefined,
+        userId: logFilters.userId || undefined
+      });
+      const url = URL.createObjectURL(blob);
+      const link = document.createElement('a');
+      link.href = url;
+      link.download = `logs_${new Date().toISOString().slice(0, 10)}.csv.gz`;
+      link.click();
+      URL.revokeObjectURL(url);
+    } catch (error) {
+      console.error("Failed to export logs", error);
+      toast.error("Erreur lors de l'export des logs");
+    } finally {
+      setExportingLogs(false);
+    }
+  };
+
   // Filter states
   const [statusFilter, setStatusFilter] = useState<'all' | 'active' | 'pending'>('all');
   const [roleFilter, setRoleFilter] = useState<UserRole | 'all'>('all');
@@ -516,6 +545,16 @@ const Settings: React.FC = () => {
             </CardHeader>
             <CardContent>
               <div className="flex items-center gap-3 mb-6">
+                <Button
+                  variant="outline"
+                  size="sm"
+                  className="rounded-full border-primary/10 gap-2 px-4 h-10 order-last"
+                  disabled={exportingLogs}
+                  onClick={handleExportLogs}
+                >
+                  <Download className="h-4 w-4 text-primary" />
+                  <span className="text-sm font-medium">{exportingLogs ? 'Export...' : 'Exporter (CSV)'}</span>
+                </Button>
                 <Popover>
                   <PopoverTrigger asChild>
                     <Button variant="outline" size="sm" className={cn(
@@ -653,6 +692,13 @@ const Settings: React.FC = () => {
                     );
                   })
                 )}
+                {logsCursor && (
+                  <div className="flex justify-center pt-2">
+                    <Button variant="outline" size="sm" disabled={loadingLogs} onClick={() => fetchLogs(logsCursor)}>
+                      {loadingLogs ? 'Chargement...' : 'Charger plus'}
+                    </Button>
+                  </div>
+                )}
               </div>
             </CardContent>
           </Card>
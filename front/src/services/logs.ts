@@ -6,6 +6,7 @@ export interface Log {
     entite: string;
     entiteId: string;
     details: string;
+    payload?: Record<string, unknown> | null;
     timestamp: string;
     userId: string;
     user: {
@@ -14,15 +15,73 @@ export interface Log {
     };
 }
 
+export interface LogFilters {
+    startDate?: string;
+    endDate?: string;
+    startHour?: string;
+    endHour?: string;
+    userId?: string;
+}
+
+export interface LogSearchResult extends Log {
+    rank: number | null;
+}
+
+export interface LogSearchFilters {
+    q?: string;
+    entite?: string;
+    entiteId?: string;
+    vehicleId?: string;
+    startDate?: string;
+    endDate?: string;
+}
+
 export const logsService = {
-    async getAll(filters?: { startDate?: string; endDate?: string, startHour?: string, endHour?: string, userId?: string }) {
+    async getAll(filters?: LogFilters) {
+        const { logs } = await logsService.getPage(filters);
+        return logs;
+    },
+
+    // Page suivante : passer le nextCursor retourné par l'appel précédent (null = dernière page)
+    async getPage(filters?: LogFilters, cursor?: string | null, limit?: number) {
         const params = new URLSearchParams();
         if (filters?.startDate) params.append('startDate', filters.startDate);
         if (filters?.endDate) params.append('endDate', filters.endDate);
         if (filters?.startHour) params.append('startHour', filters.startHour);
         if (filters?.endHour) params.append('endHour', filters.endHour);
         if (filters?.userId) params.append('userId', filters.userId);
+        if (cursor) params.append('cursor', cursor);
+        if (limit) params.append('limit', String(limit));
         const response = await apiClient.get<Log[]>(`/logs?${params.toString()}`);
+        return {
+            logs: response.data,
+            nextCursor: (response.headers['x-next-cursor'] as string | undefined) ?? null,
+        };
+    },
+
+    // Recherche plein texte / structurée, triée par pertinence quand q est fourni
+    async search(filters: LogSearchFilters, limit?: number) {
+        const params = new URLSearchParams();
+        if (filters.q) params.append('q', filters.q);
+        if (filters.entite) params.append('entite', filters.entite);
+        if (filters.entiteId) params.append('entite_id', filters.entiteId);
+        if (filters.vehicleId) params.append('vehicleId', filters.vehicleId);
+        if (filters.startDate) params.append('startDate', filters.startDate);
+        if (filters.endDate) params.append('endDate', filters.endDate);
+        if (limit) params.append('limit', String(limit));
+        const response = await apiClient.get<LogSearchResult[]>(`/logs/search?${params.toString()}`);
+        return response.data;
+    },
+
+    // Export complet (mêmes filtres que la liste), compressé en gzip par le serveur
+    async exportFile(filters?: LogFilters, format: 'csv' | 'ndjson' = 'csv') {
+        const params = new URLSearchParams({ format });
+        if (filters?.startDate) params.append('startDate', filters.startDate);
+        if (filters?.endDate) params.append('endDate', filters.endDate);
+        if (filters?.startHour) params.append('startHour', filters.startHour);
+        if (filters?.endHour) params.append('endHour', filters.endHour);
+        if (filters?.userId) params.append('userId', filters.userId);
+        const response = await apiClient.get<Blob>(`/logs/export?${params.toString()}`, { responseType: 'blob' });
         return response.data;
     },
 };
@@ -16,6 +16,16 @@ export const notificationsService = {
         return response.data;
     },
 
+    async getUnreadCount() {
+        const response = await apiClient.get<{ unread: number }>('/notifications/unread-count');
+        return response.data.unread;
+    },
+
+    async markAllAsRead() {
+        const response = await apiClient.post<{ success: boolean; updated: number }>('/notifications/read-all');
+        return response.data;
+    },
+
     async markAsRead(id: string) {
         const response = await apiClient.post<{ success: boolean }>(`/notifications/${id}/read`);
         return response.data;
@@ -0,0 +1,72 @@
+import axios, { AxiosRequestConfig, AxiosResponse } from 'axios';
+import { apiClient } from '@/lib/api';
+
+export interface ReportJob<T = unknown> {
+    id: string;
+    report: string;
+    status: 'pending' | 'running' | 'done' | 'failed';
+    error: string | null;
+    result?: T;
+}
+
+const POLL_INTERVAL_MS = 1000;
+// Au-delà, le suivi est abandonné (le serveur signale un job perdu après 10 min)
+const MAX_WAIT_MS = 5 * 60 * 1000;
+// Job introuvable ou en échec (worker arrêté) : la demande est relancée au plus une fois
+const MAX_RESUBMITS = 1;
+
+const sleep = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms));
+
+// Job inconnu du serveur (404) ou en échec : une nouvelle demande lance un nouveau calcul
+class ReportJobLostError extends Error {}
+
+export const reportsService = {
+    // Suit un job de rapport jusqu'à la fin du calcul, au plus MAX_WAIT_MS
+    async waitForJob<T>(jobId: string): Promise<ReportJob<T>> {
+        const deadline = Date.now() + MAX_WAIT_MS;
+        while (Date.now() < deadline) {
+            let job: ReportJob<T>;
+            try {
+                job = (await apiClient.get<ReportJob<T>>(`/reports/jobs/${jobId}`)).data;
+            } catch (error) {
+                if (axios.isAxiosError(error) && error.response?.status === 404) {
+                    throw new ReportJobLostError('Job de rapport introuvable');
+                }
+                throw error;
+            }
+            if (job.status === 'done') return job;
+            if (job.status === 'failed') {
+                throw new ReportJobLostError(job.error || 'Le calcul du rapport a échoué');
+            }
+            await sleep(POLL_INTERVAL_MS);
+        }
+        throw new Error('Le calcul du rapport prend trop de temps, réessayez plus tard');
+    },
+
+    // Réponse de `url` une fois le rapport calculé : le job (202) est suivi, puis la demande relancée
+    async resolve<R>(url: string, config?: AxiosRequestConfig): Promise<AxiosResponse<R>> {
+        let resubmits = 0;
+        for (;;) {
+            const res = await apiClient.get<R>(url, config);
+            if (res.status !== 202) return res;
+            const body = res.data instanceof Blob ? await res.data.text() : res.data;
+            const job: ReportJob = typeof body === 'string' ? JSON.parse(body) : (body as unknown as ReportJob);
+            try {
+                await this.waitForJob(job.id);
+            } catch (error) {
+                if (!(error instanceof ReportJobLostError) || resubmits >= MAX_RESUBMITS) throw error;
+                resubmits++;
+            }
+        }
+    },
+
+    // Résultat stocké (200), ou job calculé en arrière-plan (202) puis son résultat
+    async get<T>(url: string): Promise<T> {
+        return (await this.resolve<T>(url)).data;
+    },
+
+    // Fichier généré à partir d'un rapport : relancé une fois le rapport calculé
+    async download(url: string): Promise<Blob> {
+        return (await this.resolve<Blob>(url, { responseType: 'blob' })).data;
+    },
+};
@@ -1,5 +1,5 @@
 import { apiClient } from '@/lib/api';
-import { User, UserRole } from '@/types';
+import { User, UserRole, EmailDigest } from '@/types';
 
 export const userService = {
     async getAll() {
@@ -15,5 +15,9 @@ export const userService = {
         await apiClient.put(`/users/${id}/role`, { role });
     },
 
+    async updateEmailDigest(id: string, emailDigest: EmailDigest) {
+        await apiClient.put(`/users/${id}/email-digest`, { emailDigest });
+    },
+
     // Future methods for update etc.
 };
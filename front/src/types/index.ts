@@ -1,5 +1,7 @@
 export type UserRole = 'admin' | 'technician' | 'driver' | 'direction' | 'collaborator';
 
+export type EmailDigest = 'immediate' | 'hourly' | 'daily';
+
 export interface User {
   id: string;
   email: string;
@@ -8,6 +10,7 @@ export interface User {
   status: 'active' | 'pending';
   avatar?: string;
   profileEmail?: string;
+  emailDigest?: EmailDigest;
   createdAt: string;
   lastLogin?: string;
 }
@@ -336,6 +339,12 @@ export const ROLE_LABELS: Record<UserRole, string> = {
   collaborator: 'Collaborateur',
 };
 
+export const EMAIL_DIGEST_LABELS: Record<EmailDigest, string> = {
+  immediate: 'À chaque alerte',
+  hourly: 'Récapitulatif horaire',
+  daily: 'Récapitulatif quotidien',
+};
+
 export const VEHICLE_STATUS_LABELS: Record<Vehicle['statut'], string> = {
   en_service: 'En Service',
   en_maintenance: 'En Maintenance',